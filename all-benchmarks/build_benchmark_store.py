@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Building the benchmark store
+#
+# This script collects the benchmark profiles generated within each benchmark folder
+# and stores them into a single partitioned parquet store (`benchmark_store/`).
+# All profiles share the same typed schema and are partitioned by dataset, process
+# and run date, allowing cross dataset comparisons to only load the required data.
+
+import pathlib
+import sys
+
+import pandas as pd
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))
+from src.benchmark_store import BenchmarkStore  # noqa
+
+# inputs
+ALL_BENCHMARKS_DIR = pathlib.Path(__file__).parent.resolve(strict=True)
+
+# outputs
+STORE_DIR = ALL_BENCHMARKS_DIR / "benchmark_store"
+
+# dataset names and the location of their benchmark profiles
+PROFILE_PATHS = {
+    "cell-health_cp-features": pathlib.Path(
+        "cell-health_cp-features_benchmarks", "complete_benchmark.csv"
+    ),
+    "CFReT_cp-process-singlecells": pathlib.Path(
+        "CFReT_cp-process-singlecells_benchmarks",
+        "CFReT_cp_processing_singlecells_benchmark_profile.csv",
+    ),
+    "nf1_sc_cp-process-singlecells": pathlib.Path(
+        "nf1_sc_cp-process-singlecells_benchmarks",
+        "nf1_cp_processing_singlecells_benchmark_profile.csv",
+    ),
+    "CFReT_control": pathlib.Path(
+        "control", "CFReT_benchmarks", "CFReT_complete_benchmark.csv"
+    ),
+    "nf1_control": pathlib.Path(
+        "control", "nf1_benchmarks", "nf1_complete_benchmark.csv"
+    ),
+}
+
+# the cell-health profile does not contain file sizes, these are obtained from the
+# workflow performance table
+CELL_HEALTH_SIZES_PATH = (
+    "cell-health_cp-features_benchmarks/workflow_per_input_performance.csv"
+)
+
+store = BenchmarkStore(STORE_DIR)
+for dataset, profile_path in PROFILE_PATHS.items():
+    profile_df = pd.read_csv(ALL_BENCHMARKS_DIR / profile_path)
+
+    # adding file sizes into the cell-health profile
+    if "file_size" not in profile_df.columns:
+        sizes_df = pd.read_csv(ALL_BENCHMARKS_DIR / CELL_HEALTH_SIZES_PATH)
+        sizes_df = sizes_df[["input_name", "file_size"]].rename(
+            columns={"input_name": "input_data_name"}
+        )
+        profile_df = profile_df.merge(sizes_df, on="input_data_name", how="left")
+
+    # overwriting the dataset partitions makes this script idempotent
+    n_records = store.append(profile_df, dataset=dataset, overwrite=True)
+    print(f"{profile_path}: {n_records} records stored as '{dataset}'")
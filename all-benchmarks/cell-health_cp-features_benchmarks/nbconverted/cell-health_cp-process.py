@@ -8,25 +8,23 @@
 # Development of this notebook has been heavily influced by `CytoTable-Benchmark` [repo](https://github.com/cytomining/CytoTable-benchmarks/blob/main/notebooks/cytotable_and_pycytominer_analysis.ipynb) developed by [Dave Bunten](https://github.com/d33bs)
 
 # In[1]:
-import json
 import pathlib
-import shutil
-import subprocess
 import sys
 import warnings
-from datetime import datetime
 
 import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
-sys.path.append("..")
+sys.path.append("../..")
 warnings.filterwarnings("ignore")
 
 from src.benchmark_utils import (  # noqa
-    create_filename_path_mapping,
+    InputSizeIndex,
+    convert_bin_files,
     get_benchmark_files,
+    load_benchmark_metadata,
 )
 
 # ## Parameters
@@ -51,39 +49,21 @@ IMAGE_DIR.mkdir(exist_ok=True)
 # ## Converting binary files into json files
 #
 # In this section, we will focus on converting the memory output files from binary (`.bin`) format to JSON files.
-# These files hold the raw calculations generated during the benchmarking process. To begin, we use the `get_all_bin_files()` to locate all binarized files. The we use the `memray stats` process to convert the `.bin` files into `.json` files iteratively.
+# These files hold the raw calculations generated during the benchmarking process. To begin, we use the `get_all_bin_files()` to locate all binarized files. Then we use `convert_bin_files()` to convert the `.bin` files into `.json` files with concurrent `memray stats` processes.
 # The resulting JSON file will provide a structured representation of the data, making it more accessible and suitable for analysis.
 
 # In[3]:
 
 
-# check if memray is installed
-if shutil.which("memray") is None:
-    raise FileNotFoundError("Unable to locate 'memray' executable")
-
-
-# iterate all bin files an convert to json files
-for bin_path in get_benchmark_files(BENCHMARK_DIR_PATH, ext="bin"):
-    json_out = BENCHMARK_DIR_PATH / f"{bin_path.stem}.json"
-
-    # # executing memray to convert bin files into json files
-    memray_stats = subprocess.run(
-        [
-            "memray",
-            "stats",
-            "--json",
-            "--output",
-            str(json_out),
-            "--force",
-            str(bin_path),
-        ],
-        capture_output=True,
-        check=True,
-    )
+# converting all bin files into json files, json files that are already newer
+# than their bin file are skipped
+for result in convert_bin_files(BENCHMARK_DIR_PATH):
+    if result.status == "failed":
+        raise RuntimeError(f"Unable to convert {result.bin_path}: {result.error}")
 
     # stdout message
     print(
-        f"{bin_path.relative_to(CWD_PATH)} was successfully converted into {json_out.relative_to(CWD_PATH)}"
+        f"{result.bin_path.relative_to(CWD_PATH)} {result.status} into {result.json_path.relative_to(CWD_PATH)} ({result.duration:.2f}s)"
     )
 
 
@@ -96,52 +76,49 @@ for bin_path in get_benchmark_files(BENCHMARK_DIR_PATH, ext="bin"):
 # In[4]:
 
 
-# format for memray time strings
-tformat = "%Y-%m-%d %H:%M:%S.%f"
-
-# creating a list where all the data will be stored
-raw_benchmark_data = []
-
-# create a for loop iterating all json files and extract data
-for json_file in get_benchmark_files(BENCHMARK_DIR_PATH, ext="json"):
-    # open json file
-    with open(json_file, mode="r", encoding="utf-8") as contents:
-        memray_data = json.load(contents)
+# loading the metadata of all json files into a single dataframe
+json_files = get_benchmark_files(BENCHMARK_DIR_PATH, ext="json")
+metadata_df = load_benchmark_metadata(
+    json_files, extra_fields=["command_line"], decimals=None
+)
 
-    # get name of sqlite file or input file
+# get name of sqlite file or input file
+input_names = []
+for json_file in json_files:
     json_file_name = json_file.name.split("_")
 
     # this assumes that all file were used as an input
     if len(json_file_name) == 2 or json_file_name[0] == "feature":
-        name = "all_inputs"
-    elif len(json_file_name) >= 3:
+        input_names.append("all_inputs")
+    else:
         # get the input file name from {inputname}_{script_name}_benchmark.json
-        name = json_file.name.rsplit("_", 2)[0]
-
-    # extract required data
-    meta_data = memray_data["metadata"]
-    script_name = pathlib.Path(meta_data["command_line"]).name.split(".", 1)[1]
-    selected_data = {
-        "pid": meta_data["pid"],
-        "script": script_name,
-        "input_data_name": f"{name}_{script_name.split('.')[0]}"
-        if name == "all_inputs"
-        else name,
-        "start_time": datetime.strptime(meta_data["start_time"], tformat),
-        "end_time": datetime.strptime(meta_data["end_time"], tformat),
-        "time_duration": (
-            datetime.strptime(meta_data["end_time"], tformat)
-            - datetime.strptime(meta_data["start_time"], tformat)
-        ).total_seconds(),
-        "total_allocations": int(meta_data["total_allocations"]),
-        "peak_memory": int(meta_data["peak_memory"]) / 1024**2,
-    }
-
-    # append to list
-    raw_benchmark_data.append(selected_data)
+        input_names.append(json_file.name.rsplit("_", 2)[0])
+
+# extract script names from the executed command
+script_names = [
+    pathlib.Path(command_line).name.split(".", 1)[1]
+    for command_line in metadata_df["command_line"]
+]
 
 # create dataframe
-benchmark_df = pd.DataFrame(raw_benchmark_data)
+benchmark_df = pd.concat(
+    [
+        pd.DataFrame(
+            {
+                "pid": metadata_df["pid"],
+                "script": script_names,
+                "input_data_name": [
+                    f"{name}_{script_name.split('.')[0]}"
+                    if name == "all_inputs"
+                    else name
+                    for name, script_name in zip(input_names, script_names)
+                ],
+            }
+        ),
+        metadata_df.drop(columns=["pid", "command_line"]),
+    ],
+    axis=1,
+)
 benchmark_df.to_csv("complete_benchmark.csv", index=False)
 benchmark_df
 
@@ -149,43 +126,12 @@ benchmark_df
 # In[5]:
 
 
-# next step is to add file size data into the benchmark DF
-def get_file_size(fname: str, f_mapping: dict) -> float | None:
-    """Gets file size when given a file path
-
-    Parameters
-    ----------
-    fname : str
-        file_name
-    f_mapping : dict
-        dict containing absolute path of the file
-
-    Returns
-    -------
-    float|None
-        returns the file size of the file.
-    """
-    # search in map
-    path = f_mapping[fname]
-
-    # return None if not found
-    if path is None:
-        return None
-
-    # return file size
-    return round((pathlib.Path(path).stat().st_size / 1024**2), 3)
+# indexing all sqlite files, collecting their file size (MB) and shape
+size_index = InputSizeIndex("input_sizes.json")
+size_index.update(DATA_DIR, data_ext="sqlite")
 
-
-# create mapping
-input_names = benchmark_df["input_data_name"].unique()
-mapping = create_filename_path_mapping(
-    input_names, data_dir=DATA_DIR, data_ext="sqlite"
-)
-
-# adding file file size information into dataframe
-benchmark_df["file_size"] = benchmark_df["input_data_name"].apply(
-    get_file_size, f_mapping=mapping
-)
+# adding file size information into dataframe
+benchmark_df = size_index.merge(benchmark_df, on="input_data_name", match_prefix=True)
 benchmark_df
 
 
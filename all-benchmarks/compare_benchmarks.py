@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# # Comparing benchmark runs
+#
+# This script compares the benchmark profile of a new run against a baseline
+# profile (e.g. the previously committed `complete_benchmark.csv`) and writes a
+# json report with the regressions and improvements of each step. The script exits
+# with a non-zero status if a regression is found, allowing it to be used as a
+# check before new benchmark profiles are committed.
+#
+# Usage:
+#   python compare_benchmarks.py baseline.csv candidate.csv --report report.json
+
+import argparse
+import pathlib
+import sys
+
+import pandas as pd
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent))
+from src.benchmark_compare import compare_runs, regression_report  # noqa
+
+parser = argparse.ArgumentParser(description="Detects regressions between runs")
+parser.add_argument("baseline", type=pathlib.Path, help="baseline profile (csv)")
+parser.add_argument("candidate", type=pathlib.Path, help="candidate profile (csv)")
+parser.add_argument(
+    "--report", type=pathlib.Path, default=None, help="path of the json report"
+)
+parser.add_argument(
+    "--rel-threshold",
+    type=float,
+    default=0.1,
+    help="smallest relative change that is flagged (default: 0.1)",
+)
+args = parser.parse_args()
+
+comparison_df = compare_runs(
+    pd.read_csv(args.baseline),
+    pd.read_csv(args.candidate),
+    rel_threshold=args.rel_threshold,
+)
+report = regression_report(comparison_df, path=args.report)
+
+print(f"Records per status: {report['summary']}")
+for record in report["regressions"]:
+    print(
+        f"REGRESSION {record['process_name']} ({record['input_data_name']}) "
+        f"{record['metric']}: {record['baseline']:.3f} -> {record['candidate']:.3f} "
+        f"({record['rel_change']:+.1%})"
+    )
+
+sys.exit(1 if report["has_regressions"] else 0)
@@ -14,7 +14,10 @@
 
 import json
 import pathlib
-import subprocess
+import sys
+
+sys.path.append("../../../")
+from src.benchmark_utils import InputSizeIndex, convert_bin_files  # noqa
 
 # ## Setting parameters
 #
@@ -33,7 +36,7 @@ BENCHMARK_DIR = pathlib.Path("./benchmarks/").resolve(strict=True)
 
 # ## Benchmarking Preparation
 #
-# In this section, we collect information in  regards to file sizes and store it JSON file. Next, we utilize `Memray's` [stats](https://bloomberg.github.io/memray/stats.html) command line tool, leveraging the `subprocess` module, to convert all binary files (bin files) into JSON files.
+# In this section, we collect information in  regards to file sizes and store it JSON file. Next, we utilize `Memray's` [stats](https://bloomberg.github.io/memray/stats.html) command line tool, through `convert_bin_files()`, to convert all binary files (bin files) into JSON files.
 #
 # All processed files are systematically stored within their respective benchmark folders.
 
@@ -44,21 +47,15 @@ BENCHMARK_DIR = pathlib.Path("./benchmarks/").resolve(strict=True)
 # In[3]:
 
 
-# get all data files
-plate_files = DATA_DIR.glob("*.parquet")
-
-# create a dictionary that contains the plate name and file size in MB
-file_size_map = {}
-for plate_name in plate_files:
-    name = plate_name.stem.split("_converted")[0]
-    file_size = plate_name.stat().st_size
-
-    # converting bytes to MegaBytes
-    file_size_map[name] = round(file_size / 1024**2, 3)
+# indexing all data files, collecting their file size (MB) and shape
+size_index = InputSizeIndex("input_sizes.json")
+size_index.update(
+    DATA_DIR, data_ext="parquet", name_fn=lambda path: path.stem.split("_converted")[0]
+)
 
 # writing out json file containing file size info
 with open("file_size.json", encoding="utf-8", mode="w") as stream:
-    json.dump(file_size_map, stream, indent=4)
+    json.dump(size_index.file_sizes(), stream, indent=4)
 
 
 # ### Converting all `.bin` into `.json` files
@@ -68,39 +65,13 @@ with open("file_size.json", encoding="utf-8", mode="w") as stream:
 # In[4]:
 
 
-# converting all single benchmark files into json
-for bin_path in BENCHMARK_DIR.glob("*.bin"):
-    json_out = BENCHMARK_DIR / f"{bin_path.stem}.json"
-
-    # # executing memray to convert bin files into json files
-    print(
-        " ".join(
-            [
-                "memray",
-                "stats",
-                "--json",
-                "--output",
-                str(json_out),
-                "--force",
-                str(bin_path),
-            ],
-        )
-    )
-    memray_stats = subprocess.run(
-        [
-            "memray",
-            "stats",
-            "--json",
-            "--output",
-            str(json_out),
-            "--force",
-            str(bin_path),
-        ],
-        capture_output=True,
-        check=True,
-    )
+# converting all benchmark files into json files, json files that are already
+# newer than their bin file are skipped
+for result in convert_bin_files(BENCHMARK_DIR):
+    if result.status == "failed":
+        raise RuntimeError(f"Unable to convert {result.bin_path}: {result.error}")
 
     # stdout message
     print(
-        f"{bin_path.relative_to(CWD_PATH)} was successfully converted into {json_out.relative_to(CWD_PATH)}"
+        f"{result.bin_path.relative_to(CWD_PATH)} {result.status} into {result.json_path.relative_to(CWD_PATH)} ({result.duration:.2f}s)"
     )
@@ -15,12 +15,9 @@
 import json
 import pathlib
 import sys
-from datetime import datetime
-
-import pandas as pd
 
 sys.path.append("../../../")
-from src.benchmark_utils import get_benchmark_files  # noqa
+from src.benchmark_utils import get_benchmark_files, load_benchmark_metadata  # noqa
 
 # # Parameters Used in this Notebook
 #
@@ -56,48 +53,22 @@ with open("./file_size.json", encoding="utf-8", mode="r") as content:
 # In[4]:
 
 
-# applying time format
-tformat = "%Y-%m-%d %H:%M:%S.%f"
-
-# collecting all data
-raw_benchmark_data = []
-
-# iterating each json file and extract data
-for single_json_file in single_json_files:
-    # collecting data from just file name
-    plate_name = single_json_file.stem.split("_CFReT_")[0]
-    file_size = plate_size[plate_name]
-    process_name = single_json_file.stem.split("_CFReT_")[1].split("_benchmark")[0]
-
-    # opening json file to extract benchmark information
-    with open(single_json_file, encoding="utf-8", mode="r") as contents:
-        benchmark_data = json.load(contents)
-
-        # accessing to all metadata from benchmarks
-        meta_data = benchmark_data["metadata"]
-        selected_data = {
-            "pid": meta_data["pid"],
-            "process_name": process_name,
-            "input_data_name": plate_name,
-            "start_time": datetime.strptime(meta_data["start_time"], tformat),
-            "end_time": datetime.strptime(meta_data["end_time"], tformat),
-            "time_duration": (
-                datetime.strptime(meta_data["end_time"], tformat)
-                - datetime.strptime(meta_data["start_time"], tformat)
-            ).total_seconds(),
-            "total_allocations": int(meta_data["total_allocations"]),
-            "peak_memory": round(int(meta_data["peak_memory"]) / 1024**2, 3),
-            "file_size": plate_size[plate_name],
-        }
-
-    # append to list
-    raw_benchmark_data.append(selected_data)
+# loading the metadata of all json files into a single dataframe
+benchmark_df = load_benchmark_metadata(single_json_files)
+
+# collecting data from just file name
+plate_names = [path.stem.split("_CFReT_")[0] for path in single_json_files]
+process_names = [
+    path.stem.split("_CFReT_")[1].split("_benchmark")[0] for path in single_json_files
+]
+benchmark_df.insert(1, "process_name", process_names)
+benchmark_df.insert(2, "input_data_name", plate_names)
+benchmark_df["file_size"] = [plate_size[plate_name] for plate_name in plate_names]
 
 
 # In[5]:
 
 
-# create to dataframe
-benchmark_df = pd.DataFrame(raw_benchmark_data)
+# saving benchmark profile
 benchmark_df.to_csv(profile_out, index=False)
 benchmark_df
@@ -0,0 +1,444 @@
+"""
+Module: allocation_profiles.py
+
+Description:
+The `allocation_profiles.py` module analyzes the allocation statistics that memray
+stores in its json stats files next to the `metadata` block. Allocation locations
+from `top_allocations_by_size` and `top_allocations_by_count` are normalized into
+`package/module:function:line` and aggregated across plates and steps into a
+ranked hotspot table, showing which functions dominate the allocations of each
+step.
+
+Allocation size histograms and allocator type distributions are loaded into
+arrays, allowing captures with different histogram buckets to be compared and
+summarized into a per-step small-object churn score and REALLOC ratio.
+"""
+
+import pathlib
+import re
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .benchmark_utils import load_benchmark_metadata, load_json
+
+# directories where third-party packages are installed
+_PACKAGE_DIRS = ["site-packages", "dist-packages"]
+
+# standard library directory, e.g. `.../lib/python3.10/`
+_STDLIB_PATTERN = re.compile(r"/lib/python\d+(?:\.\d+)?/")
+
+# allocations up to this size (bytes) are served by pymalloc's small object pools
+SMALL_OBJECT_THRESHOLD = 512
+
+
+def normalize_location(location: str) -> str:
+    """Normalizes a memray allocation location `function:path:line` into
+    `package/module:function:line`.
+
+    Environment specific prefixes are removed: third-party modules are named from
+    their `site-packages` directory (e.g. `pandas/io/parsers/c_parser_wrapper`),
+    standard library modules from the python library directory (e.g. `gzip`) and
+    other scripts by their file name. Locations without a file path (e.g.
+    `<__array_function__ internals>`) are kept as they are.
+
+    Parameters
+    ----------
+    location : str
+        memray location, e.g.
+        `read:/home/user/.../site-packages/pandas/io/parsers/c_parser_wrapper.py:234`
+
+    Returns
+    -------
+    str
+        normalized location, e.g. `pandas/io/parsers/c_parser_wrapper:read:234`
+    """
+    function, _, rest = location.partition(":")
+    path, _, line = rest.rpartition(":")
+    if not line.isdigit():
+        path, line = rest, ""
+
+    module = path.replace("\\", "/")
+    if not module.startswith("<"):
+        package_dir = next(
+            (name for name in _PACKAGE_DIRS if f"/{name}/" in module), None
+        )
+        stdlib_match = _STDLIB_PATTERN.search(module)
+        if package_dir is not None:
+            module = module.rsplit(f"/{package_dir}/", 1)[1]
+        elif stdlib_match is not None:
+            module = module[stdlib_match.end() :]
+        else:
+            module = module.rsplit("/", 1)[-1]
+        module = module.removesuffix(".py")
+
+    return f"{module}:{function}:{line}"
+
+
+def load_allocation_locations(
+    paths: list[str | pathlib.Path],
+    label_fn: Optional[Callable[[pathlib.Path], dict]] = None,
+) -> pd.DataFrame:
+    """Loads the top allocation locations of memray json files, one row per
+    normalized location and file.
+
+    Memray only stores the top locations of each capture, therefore a location
+    found in `top_allocations_by_size` might be missing from
+    `top_allocations_by_count` (and vice versa), where the missing value is NaN.
+
+    Parameters
+    ----------
+    paths : list[str | pathlib.Path]
+        paths to memray json files
+    label_fn : Optional[Callable[[pathlib.Path], dict]]
+        function that returns additional columns of a json file, e.g.
+        `lambda path: {"process_name": path.stem.split("_")[1]}`. Default only
+        adds the `benchmark_file` column
+
+    Returns
+    -------
+    pd.DataFrame
+        benchmark_file, label columns, location, bytes, count and the totals of
+        the capture (capture_bytes, capture_allocations)
+    """
+
+    records = []
+    for path in paths:
+        path = pathlib.Path(path)
+        stats = load_json(path)
+        labels = {"benchmark_file": path.name}
+        if label_fn is not None:
+            labels.update(label_fn(path))
+
+        # different raw locations can have the same normalized location
+        by_size, by_count = {}, {}
+        for entry in stats["top_allocations_by_size"]:
+            location = normalize_location(entry["location"])
+            by_size[location] = by_size.get(location, 0) + entry["size"]
+        for entry in stats["top_allocations_by_count"]:
+            location = normalize_location(entry["location"])
+            by_count[location] = by_count.get(location, 0) + entry["count"]
+
+        for location in list(by_size) + [loc for loc in by_count if loc not in by_size]:
+            records.append(
+                {
+                    **labels,
+                    "location": location,
+                    "bytes": by_size.get(location, np.nan),
+                    "count": by_count.get(location, np.nan),
+                    "capture_bytes": stats["total_bytes_allocated"],
+                    "capture_allocations": stats["total_num_allocations"],
+                }
+            )
+
+    return pd.DataFrame(records)
+
+
+def rank_hotspots(
+    locations_df: pd.DataFrame,
+    by: Optional[list[str]] = None,
+    top_n: Optional[int] = None,
+) -> pd.DataFrame:
+    """Aggregates allocation locations across captures into a ranked hotspot
+    table. Shares are computed against all the bytes and allocations of the
+    captures within each group (e.g. all plates of a step).
+
+    Parameters
+    ----------
+    locations_df : pd.DataFrame
+        allocation locations, see `load_allocation_locations`
+    by : Optional[list[str]]
+        columns that define a step. Default is `process_name` if found, otherwise
+        `benchmark_file`
+    top_n : Optional[int]
+        number of hotspots kept per group. Default keeps all of them
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per group and location with the bytes, count, bytes_share,
+        count_share, number of captures where the location was found and the rank
+        by bytes (1 is the largest)
+    """
+
+    if by is None:
+        by = (
+            ["process_name"]
+            if "process_name" in locations_df.columns
+            else ["benchmark_file"]
+        )
+
+    # totals of each group are counted once per capture
+    totals_df = (
+        locations_df.drop_duplicates("benchmark_file")
+        .groupby(by, as_index=False)
+        .agg(
+            step_bytes=("capture_bytes", "sum"),
+            step_allocations=("capture_allocations", "sum"),
+        )
+    )
+
+    hotspots_df = (
+        locations_df.groupby(by + ["location"], as_index=False)
+        .agg(
+            bytes=("bytes", lambda values: values.sum(min_count=1)),
+            count=("count", lambda values: values.sum(min_count=1)),
+            n_captures=("benchmark_file", "nunique"),
+        )
+        .merge(totals_df, on=by, how="left")
+    )
+    hotspots_df["bytes_share"] = hotspots_df["bytes"] / hotspots_df["step_bytes"]
+    hotspots_df["count_share"] = hotspots_df["count"] / hotspots_df["step_allocations"]
+    hotspots_df["rank"] = (
+        hotspots_df.groupby(by)["bytes"]
+        .rank(method="min", ascending=False, na_option="bottom")
+        .astype(int)
+    )
+
+    hotspots_df = hotspots_df.sort_values(
+        by + ["rank", "count"], ascending=[True] * (len(by) + 1) + [False]
+    )
+    if top_n is not None:
+        hotspots_df = hotspots_df.loc[hotspots_df["rank"] <= top_n]
+
+    return hotspots_df.drop(columns=["step_bytes", "step_allocations"]).reset_index(
+        drop=True
+    )
+
+
+@dataclass
+class AllocationHistograms:
+    """Allocation size histograms of memray captures stored as arrays, one row per
+    capture. Memray chooses the histogram buckets of each capture from its
+    allocation sizes, therefore rows are padded to the largest number of buckets
+    (NaN bounds, zero counts) and `rebin` is used to compare captures.
+
+    Attributes
+    ----------
+    captures : pd.DataFrame
+        one row per capture with the benchmark_file, label columns,
+        time_duration (secs), peak_memory (MB) and the number of allocations of
+        each allocator type (e.g. `malloc`, `realloc`)
+    min_bytes : np.ndarray
+        lower bound (inclusive) of each bucket, shape (captures, buckets)
+    max_bytes : np.ndarray
+        upper bound (inclusive) of each bucket, shape (captures, buckets)
+    counts : np.ndarray
+        number of allocations within each bucket, shape (captures, buckets)
+    """
+
+    captures: pd.DataFrame
+    min_bytes: np.ndarray
+    max_bytes: np.ndarray
+    counts: np.ndarray
+
+    def rebin(self, edges: list[float] | np.ndarray) -> np.ndarray:
+        """Redistributes the histograms into common buckets. Allocations are
+        assumed to be uniformly distributed within each bucket in log scale, the
+        scale used by memray to build the buckets.
+
+        Parameters
+        ----------
+        edges : list[float] | np.ndarray
+            increasing bucket edges in bytes, bucket `i` contains the sizes within
+            `[edges[i], edges[i + 1])`. The last edge can be `np.inf`
+
+        Returns
+        -------
+        np.ndarray
+            number of allocations within each bucket, shape (captures, buckets)
+        """
+        edges = np.asarray(edges, dtype=np.float64)
+
+        # bounds in log scale, shape (captures, buckets, 1)
+        lower = np.log1p(self.min_bytes)[..., np.newaxis]
+        upper = np.log1p(self.max_bytes + 1)[..., np.newaxis]
+
+        # share of each bucket that overlaps with each new bucket
+        overlap = np.minimum(upper, np.log1p(edges[1:])) - np.maximum(
+            lower, np.log1p(edges[:-1])
+        )
+        share = np.nan_to_num(np.clip(overlap, 0, None) / (upper - lower))
+
+        return (self.counts[..., np.newaxis] * share).sum(axis=1)
+
+    def churn_score(
+        self, threshold: Optional[int] = SMALL_OBJECT_THRESHOLD
+    ) -> np.ndarray:
+        """Computes the small-object churn score of each capture, the share of
+        allocations that are at most `threshold` bytes. Scores close to 1 point to
+        per-object Python allocations (e.g. boxing values one at a time)
+
+        Parameters
+        ----------
+        threshold : Optional[int]
+            largest size (bytes) of a small object. Default is 512
+
+        Returns
+        -------
+        np.ndarray
+            churn score of each capture
+        """
+        small, large = self.rebin([0, threshold + 1, np.inf]).T
+        total = small + large
+        return np.divide(small, total, out=np.full_like(total, np.nan), where=total > 0)
+
+    def realloc_ratio(self) -> np.ndarray:
+        """Computes the share of allocations performed with REALLOC, where high
+        ratios point to containers that are grown instead of being preallocated
+
+        Returns
+        -------
+        np.ndarray
+            REALLOC ratio of each capture
+        """
+        allocator_cols = [col for col in self.captures.columns if col in _ALLOCATORS]
+        total = self.captures[allocator_cols].sum(axis=1).to_numpy(dtype=np.float64)
+        realloc = (
+            self.captures["realloc"].to_numpy(dtype=np.float64)
+            if "realloc" in self.captures.columns
+            else np.zeros_like(total)
+        )
+        return np.divide(
+            realloc, total, out=np.full_like(total, np.nan), where=total > 0
+        )
+
+
+# allocator types reported by memray, used as column names in lower case
+_ALLOCATORS = [
+    "malloc",
+    "calloc",
+    "realloc",
+    "posix_memalign",
+    "aligned_alloc",
+    "memalign",
+    "valloc",
+    "pvalloc",
+    "mmap",
+]
+
+
+def load_allocation_histograms(
+    paths: list[str | pathlib.Path],
+    label_fn: Optional[Callable[[pathlib.Path], dict]] = None,
+) -> AllocationHistograms:
+    """Loads the `allocation_size_histogram` and `allocator_type_distribution`
+    blocks of memray json files into arrays
+
+    Parameters
+    ----------
+    paths : list[str | pathlib.Path]
+        paths to memray json files
+    label_fn : Optional[Callable[[pathlib.Path], dict]]
+        function that returns additional columns of a json file, see
+        `load_allocation_locations`
+
+    Returns
+    -------
+    AllocationHistograms
+        histograms and allocator counts of every capture
+    """
+
+    paths = [pathlib.Path(path) for path in paths]
+    histograms, records = [], []
+    for path in paths:
+        stats = load_json(path)
+        record = {"benchmark_file": path.name}
+        if label_fn is not None:
+            record.update(label_fn(path))
+        for allocator, count in stats["allocator_type_distribution"].items():
+            record[allocator.lower()] = count
+        records.append(record)
+        histograms.append(stats["allocation_size_histogram"])
+
+    # histograms are padded to the largest number of buckets
+    n_buckets = max((len(histogram) for histogram in histograms), default=0)
+    min_bytes = np.full((len(paths), n_buckets), np.nan)
+    max_bytes = np.full((len(paths), n_buckets), np.nan)
+    counts = np.zeros((len(paths), n_buckets))
+    for idx, histogram in enumerate(histograms):
+        for bucket, entry in enumerate(histogram):
+            min_bytes[idx, bucket] = entry["min_bytes"]
+            max_bytes[idx, bucket] = entry["max_bytes"]
+            counts[idx, bucket] = entry["count"]
+
+    captures_df = pd.DataFrame(records)
+    allocator_cols = [col for col in captures_df.columns if col in _ALLOCATORS]
+    captures_df[allocator_cols] = captures_df[allocator_cols].fillna(0).astype(int)
+
+    # time and peak memory are reported next to the allocation statistics
+    if len(paths) > 0:
+        metadata_df = load_benchmark_metadata(paths)
+        captures_df["time_duration"] = metadata_df["time_duration"].to_numpy()
+        captures_df["peak_memory"] = metadata_df["peak_memory"].to_numpy()
+
+    return AllocationHistograms(captures_df, min_bytes, max_bytes, counts)
+
+
+def summarize_allocations(
+    histograms: AllocationHistograms,
+    by: Optional[list[str]] = None,
+    threshold: Optional[int] = SMALL_OBJECT_THRESHOLD,
+) -> pd.DataFrame:
+    """Summarizes the allocation behaviour of each step, e.g. to compare steps,
+    datasets or runs (`by=["dataset", "process_name"]`)
+
+    Parameters
+    ----------
+    histograms : AllocationHistograms
+        loaded histograms, see `load_allocation_histograms`
+    by : Optional[list[str]]
+        columns that define a group. Default is `process_name` if found, otherwise
+        `benchmark_file`
+    threshold : Optional[int]
+        largest size (bytes) of a small object. Default is 512
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per group with the number of captures, the small-object churn
+        score and REALLOC ratio computed from all the group's allocations, and
+        the median time_duration (secs) and peak_memory (MB)
+    """
+
+    captures_df = histograms.captures
+    if by is None:
+        by = (
+            ["process_name"]
+            if "process_name" in captures_df.columns
+            else ["benchmark_file"]
+        )
+
+    # group scores are computed from the summed allocations of all captures
+    small, large = histograms.rebin([0, threshold + 1, np.inf]).T
+    allocator_cols = [col for col in captures_df.columns if col in _ALLOCATORS]
+    summary_df = (
+        captures_df.assign(
+            _small=small,
+            _total=small + large,
+            _allocator_total=captures_df[allocator_cols].sum(axis=1),
+            _realloc=captures_df.get("realloc", 0),
+        )
+        .groupby(by, as_index=False)
+        .agg(
+            n_captures=("benchmark_file", "count"),
+            _small=("_small", "sum"),
+            _total=("_total", "sum"),
+            _realloc=("_realloc", "sum"),
+            _allocator_total=("_allocator_total", "sum"),
+            time_duration=("time_duration", "median"),
+            peak_memory=("peak_memory", "median"),
+        )
+    )
+    summary_df.insert(
+        len(by) + 1, "churn_score", summary_df["_small"] / summary_df["_total"]
+    )
+    summary_df.insert(
+        len(by) + 2,
+        "realloc_ratio",
+        summary_df["_realloc"] / summary_df["_allocator_total"],
+    )
+
+    return summary_df.drop(columns=["_small", "_total", "_realloc", "_allocator_total"])
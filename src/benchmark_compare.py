@@ -0,0 +1,276 @@
+"""
+Module: benchmark_compare.py
+
+Description:
+The `benchmark_compare.py` module detects performance regressions between two
+benchmark runs. Records of both runs are matched on dataset, input and process,
+and the change of each metric is flagged when it exceeds both a relative and an
+absolute threshold. When a run contains repeated samples of a record, a bootstrap
+confidence interval of the relative change is computed and only changes whose
+interval excludes zero are flagged.
+"""
+
+import json
+import pathlib
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .benchmark_store import normalize_columns
+
+# columns used to match the records of both runs
+MATCH_COLUMNS = ["dataset", "input_data_name", "process_name"]
+
+# compared metrics and the smallest absolute change that is flagged
+# time_duration is in seconds, peak_memory is in MB
+DEFAULT_ABS_THRESHOLDS = {
+    "time_duration": 0.5,
+    "peak_memory": 10.0,
+    "total_allocations": 10_000,
+}
+
+# columns of a comparison following the matched columns
+COMPARISON_COLUMNS = [
+    "metric",
+    "baseline_n",
+    "candidate_n",
+    "baseline",
+    "candidate",
+    "abs_change",
+    "rel_change",
+    "ci_lower",
+    "ci_upper",
+    "status",
+]
+
+
+def _bootstrap_ci(
+    baseline: np.ndarray,
+    candidate: np.ndarray,
+    n_resamples: int,
+    confidence: float,
+    rng: np.random.Generator,
+) -> tuple[float, float]:
+    """Computes the bootstrap confidence interval of the relative change between
+    the medians of two samples"""
+    baseline_medians = np.median(
+        rng.choice(baseline, size=(n_resamples, len(baseline))), axis=1
+    )
+    candidate_medians = np.median(
+        rng.choice(candidate, size=(n_resamples, len(candidate))), axis=1
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        changes = (candidate_medians - baseline_medians) / baseline_medians
+
+    alpha = (1 - confidence) / 2
+    lower, upper = np.nanquantile(changes, [alpha, 1 - alpha])
+    return float(lower), float(upper)
+
+
+def compare_runs(
+    baseline: pd.DataFrame,
+    candidate: pd.DataFrame,
+    rel_threshold: Optional[float] = 0.1,
+    abs_thresholds: Optional[dict[str, float]] = None,
+    n_resamples: Optional[int] = 2000,
+    confidence: Optional[float] = 0.95,
+    seed: Optional[int] = 0,
+) -> pd.DataFrame:
+    """Compares the benchmark profile of a candidate run against a baseline run.
+
+    Records are matched on `MATCH_COLUMNS` (dataset is ignored if one of the
+    profiles does not contain it) and repeated samples of a record are summarized
+    by their median. A change is a regression if the candidate is higher than the
+    baseline by more than `rel_threshold` and by more than the metric's absolute
+    threshold, and an improvement in the opposite case. If both runs contain at
+    least two samples of a record, the change must also be significant: its
+    bootstrap confidence interval must not contain zero.
+
+    Parameters
+    ----------
+    baseline : pd.DataFrame
+        benchmark profile of the reference run
+    candidate : pd.DataFrame
+        benchmark profile of the new run
+    rel_threshold : Optional[float]
+        smallest relative change that is flagged. Default is 0.1 (10%)
+    abs_thresholds : Optional[dict[str, float]]
+        compared metrics mapped to the smallest absolute change that is flagged.
+        Default is `DEFAULT_ABS_THRESHOLDS`, metrics missing from a profile are
+        skipped
+    n_resamples : Optional[int]
+        number of bootstrap resamples
+    confidence : Optional[float]
+        confidence level of the bootstrap intervals
+    seed : Optional[int]
+        seed of the bootstrap resampling
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per record and metric with the number of samples and median of
+        each run, the absolute and relative change, the confidence interval of the
+        relative change (NaN without repeated samples) and the status:
+        "regression", "improvement", "unchanged", "missing_baseline" or
+        "missing_candidate"
+
+    Raises
+    ------
+    ValueError
+        Raised if the profiles do not contain the input and process columns
+    """
+
+    abs_thresholds = (
+        DEFAULT_ABS_THRESHOLDS if abs_thresholds is None else dict(abs_thresholds)
+    )
+    baseline = normalize_columns(baseline)
+    candidate = normalize_columns(candidate)
+
+    # dataset is only used when both profiles contain it
+    keys = [
+        col
+        for col in MATCH_COLUMNS
+        if col in baseline.columns and col in candidate.columns
+    ]
+    missing_keys = set(MATCH_COLUMNS[1:]) - set(keys)
+    if len(missing_keys) > 0:
+        raise ValueError(
+            f"Both profiles must contain the columns: {sorted(missing_keys)}"
+        )
+    metrics = [
+        metric
+        for metric in abs_thresholds
+        if metric in baseline.columns and metric in candidate.columns
+    ]
+
+    baseline_groups = {
+        key: group for key, group in baseline.groupby(keys, dropna=False, sort=False)
+    }
+    candidate_groups = {
+        key: group for key, group in candidate.groupby(keys, dropna=False, sort=False)
+    }
+
+    rng = np.random.default_rng(seed)
+    records = []
+    for key in sorted(set(baseline_groups) | set(candidate_groups), key=str):
+        baseline_group = baseline_groups.get(key)
+        candidate_group = candidate_groups.get(key)
+        for metric in metrics:
+            baseline_values = (
+                np.array([])
+                if baseline_group is None
+                else baseline_group[metric].dropna().to_numpy(dtype=np.float64)
+            )
+            candidate_values = (
+                np.array([])
+                if candidate_group is None
+                else candidate_group[metric].dropna().to_numpy(dtype=np.float64)
+            )
+            record = dict(zip(keys, key))
+            record.update(
+                {
+                    "metric": metric,
+                    "baseline_n": len(baseline_values),
+                    "candidate_n": len(candidate_values),
+                    "baseline": np.nan,
+                    "candidate": np.nan,
+                    "abs_change": np.nan,
+                    "rel_change": np.nan,
+                    "ci_lower": np.nan,
+                    "ci_upper": np.nan,
+                }
+            )
+            if len(baseline_values) == 0:
+                record["status"] = "missing_baseline"
+                records.append(record)
+                continue
+            if len(candidate_values) == 0:
+                record["status"] = "missing_candidate"
+                records.append(record)
+                continue
+
+            baseline_median = np.median(baseline_values)
+            candidate_median = np.median(candidate_values)
+            abs_change = candidate_median - baseline_median
+            rel_change = (
+                abs_change / baseline_median if baseline_median != 0 else np.nan
+            )
+            record.update(
+                {
+                    "baseline": baseline_median,
+                    "candidate": candidate_median,
+                    "abs_change": abs_change,
+                    "rel_change": rel_change,
+                }
+            )
+
+            # repeated samples are required to assess significance
+            significant = True
+            if len(baseline_values) > 1 and len(candidate_values) > 1:
+                ci_lower, ci_upper = _bootstrap_ci(
+                    baseline_values, candidate_values, n_resamples, confidence, rng
+                )
+                record.update({"ci_lower": ci_lower, "ci_upper": ci_upper})
+                significant = ci_lower > 0 or ci_upper < 0
+
+            exceeds = (
+                abs(abs_change) > abs_thresholds[metric]
+                and not np.isnan(rel_change)
+                and abs(rel_change) > rel_threshold
+            )
+            if exceeds and significant:
+                record["status"] = "regression" if abs_change > 0 else "improvement"
+            else:
+                record["status"] = "unchanged"
+            records.append(record)
+
+    return pd.DataFrame(records, columns=keys + COMPARISON_COLUMNS)
+
+
+def regression_report(
+    comparison_df: pd.DataFrame,
+    path: Optional[str | pathlib.Path] = None,
+) -> dict:
+    """Creates a machine-readable report from the output of `compare_runs`
+
+    Parameters
+    ----------
+    comparison_df : pd.DataFrame
+        comparison between two runs
+    path : Optional[str | pathlib.Path]
+        if provided, the report is written into this json file
+
+    Returns
+    -------
+    dict
+        number of records of each status, whether any regression was found and
+        the regressions, improvements and missing records
+    """
+
+    # comparisons without records may not contain any column
+    if len(comparison_df) == 0:
+        comparison_df = pd.DataFrame(columns=["status"])
+
+    report = {
+        "has_regressions": bool((comparison_df["status"] == "regression").any()),
+        "summary": {
+            status: int(count)
+            for status, count in comparison_df["status"].value_counts().items()
+        },
+    }
+    for status, name in [
+        ("regression", "regressions"),
+        ("improvement", "improvements"),
+        ("missing_baseline", "missing_baseline"),
+        ("missing_candidate", "missing_candidate"),
+    ]:
+        # converted through json, NaN values and numpy types are not valid json
+        selected_df = comparison_df.loc[comparison_df["status"] == status]
+        report[name] = json.loads(selected_df.to_json(orient="records"))
+
+    if path is not None:
+        with open(path, mode="w", encoding="utf-8") as stream:
+            json.dump(report, stream, indent=4)
+
+    return report
@@ -0,0 +1,230 @@
+"""
+Module: benchmark_ingest.py
+
+Description:
+The `benchmark_ingest.py` module contains the `BenchmarkIngestor`, which
+incrementally merges benchmark files into a profile table. A manifest containing
+the size, modification time and sha256 hash of every ingested benchmark file is
+stored next to the profile table, therefore only new or changed benchmark files
+are parsed when the profile is refreshed.
+"""
+
+import hashlib
+import json
+import pathlib
+from typing import Callable, Optional
+
+import pandas as pd
+
+from .benchmark_utils import (
+    get_benchmark_files,
+    load_benchmark_metadata,
+    validate_path,
+)
+
+# column that links each record to the benchmark file it was parsed from
+SOURCE_COLUMN = "benchmark_file"
+
+
+def file_sha256(path: str | pathlib.Path, chunk_size: Optional[int] = 2**20) -> str:
+    """Computes the sha256 hash of a file by reading it in chunks
+
+    Parameters
+    ----------
+    path : str | pathlib.Path
+        path to file
+    chunk_size : Optional[int]
+        number of bytes read at a time. Default is 1 MB
+
+    Returns
+    -------
+    str
+        hex digest of the file's sha256 hash
+    """
+    digest = hashlib.sha256()
+    with open(path, mode="rb") as stream:
+        while chunk := stream.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BenchmarkIngestor:
+    """Incrementally ingests benchmark files into a profile table.
+
+    Each benchmark file is fingerprinted with its size, modification time and
+    sha256 hash. Files whose size and modification time did not change are not
+    read at all, files that were touched but have the same hash are not parsed
+    again. Records from deleted files are removed from the profile table. If the
+    profile table is missing or does not contain one record per file of the
+    manifest, all files are parsed again.
+
+    Parameters
+    ----------
+    benchmark_path : str | pathlib.Path
+        path to benchmark directory
+    profile_path : str | pathlib.Path
+        path to the csv file containing the profile table. It is created on the
+        first refresh
+    parser : Optional[Callable[[list[pathlib.Path]], pd.DataFrame]]
+        function that parses a list of benchmark files into a DataFrame with one
+        row per file, in the same order. Default is `load_benchmark_metadata`,
+        which reads json files and the metadata of `.bin` captures
+    manifest_path : Optional[str | pathlib.Path]
+        path to the manifest. Default is `{profile_name}_manifest.json` next to the
+        profile table
+    ext : Optional[str]
+        extension of the benchmark files, "bin" or "json". Default is "json"
+
+    Raises
+    ------
+    ValueError
+        Raised if the extension is not supported
+    """
+
+    def __init__(
+        self,
+        benchmark_path: str | pathlib.Path,
+        profile_path: str | pathlib.Path,
+        parser: Optional[Callable[[list[pathlib.Path]], pd.DataFrame]] = None,
+        manifest_path: Optional[str | pathlib.Path] = None,
+        ext: Optional[str] = "json",
+    ) -> None:
+        self.benchmark_path = pathlib.Path(benchmark_path).resolve()
+        self.profile_path = pathlib.Path(profile_path).resolve()
+        self.parser = load_benchmark_metadata if parser is None else parser
+        self.manifest_path = (
+            self.profile_path.with_name(f"{self.profile_path.stem}_manifest.json")
+            if manifest_path is None
+            else pathlib.Path(manifest_path).resolve()
+        )
+        self.ext = ext.replace(".", "").strip()
+        if self.ext not in ["bin", "json"]:
+            raise ValueError(f"'ext' must be 'bin' or 'json'. Provided: {ext}")
+
+        # changes detected on the latest refresh
+        self.added: list[str] = []
+        self.modified: list[str] = []
+        self.removed: list[str] = []
+
+    def load_manifest(self) -> dict:
+        """Loads the manifest, an empty manifest is returned if it does not exist
+
+        Returns
+        -------
+        dict
+            file names mapped to their size, mtime and sha256 hash
+        """
+        if not self.manifest_path.exists():
+            return {}
+        with open(self.manifest_path, mode="r", encoding="utf-8") as contents:
+            return json.load(contents)
+
+    def load_profile(self) -> pd.DataFrame:
+        """Loads the current profile table, an empty table is returned if it does
+        not exist or does not contain the source column
+
+        Returns
+        -------
+        pd.DataFrame
+            current profile table
+        """
+        if not self.profile_path.exists() or self.profile_path.stat().st_size == 0:
+            return pd.DataFrame(columns=[SOURCE_COLUMN])
+
+        profile_df = pd.read_csv(self.profile_path)
+        if SOURCE_COLUMN not in profile_df.columns:
+            return pd.DataFrame(columns=[SOURCE_COLUMN])
+        for col in ["start_time", "end_time"]:
+            if col in profile_df.columns:
+                profile_df[col] = pd.to_datetime(profile_df[col])
+        return profile_df
+
+    def benchmark_files(self) -> list[pathlib.Path]:
+        """Lists the benchmark files, an empty list is returned if the benchmark
+        directory does not contain any
+
+        Returns
+        -------
+        list[pathlib.Path]
+            sorted paths to the benchmark files
+        """
+        benchmark_path = validate_path(self.benchmark_path, check_dir=True)
+        if not any(benchmark_path.glob(f"*.{self.ext}")):
+            return []
+        return sorted(get_benchmark_files(benchmark_path, ext=self.ext))
+
+    def refresh(self) -> pd.DataFrame:
+        """Parses new or changed benchmark files and merges them into the profile
+        table. Both the profile table and the manifest are written to disk.
+
+        Returns
+        -------
+        pd.DataFrame
+            updated profile table
+        """
+
+        manifest = self.load_manifest()
+        profile_df = self.load_profile()
+
+        # a profile that does not match the manifest is rebuilt from all files
+        if set(profile_df[SOURCE_COLUMN]) != set(manifest):
+            manifest = {}
+            profile_df = profile_df.iloc[0:0]
+
+        updated_manifest = {}
+        to_parse = []
+        self.added, self.modified = [], []
+
+        # fingerprinting benchmark files
+        for path in self.benchmark_files():
+            stat = path.stat()
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            previous = manifest.get(path.name)
+
+            # unchanged size and mtime, the file is not read
+            if (
+                previous is not None
+                and previous["size"] == entry["size"]
+                and previous["mtime_ns"] == entry["mtime_ns"]
+            ):
+                updated_manifest[path.name] = previous
+                continue
+
+            # the file is only parsed if its contents have changed
+            entry["sha256"] = file_sha256(path)
+            updated_manifest[path.name] = entry
+            if previous is None:
+                self.added.append(path.name)
+                to_parse.append(path)
+            elif previous["sha256"] != entry["sha256"]:
+                self.modified.append(path.name)
+                to_parse.append(path)
+
+        self.removed = sorted(set(manifest) - set(updated_manifest))
+
+        # removing outdated records and merging the new ones
+        outdated = set(self.modified) | set(self.removed)
+        profile_df = profile_df.loc[~profile_df[SOURCE_COLUMN].isin(outdated)]
+        if len(to_parse) > 0:
+            new_df = self.parser(to_parse)
+            if len(new_df) != len(to_parse):
+                raise ValueError(
+                    "parser must return one record per benchmark file. "
+                    f"Expected: {len(to_parse)}, Returned: {len(new_df)}"
+                )
+            new_df.insert(0, SOURCE_COLUMN, [path.name for path in to_parse])
+            profile_df = (
+                new_df
+                if len(profile_df) == 0
+                else pd.concat([profile_df, new_df], ignore_index=True)
+            )
+
+        profile_df = profile_df.sort_values(SOURCE_COLUMN, ignore_index=True)
+
+        # writing profile before manifest, a failure leaves the manifest outdated
+        # which only leads into files being parsed again
+        profile_df.to_csv(self.profile_path, index=False)
+        with open(self.manifest_path, mode="w", encoding="utf-8") as stream:
+            json.dump(updated_manifest, stream, indent=4)
+
+        return profile_df
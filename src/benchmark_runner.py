@@ -0,0 +1,969 @@
+"""
+Module: benchmark_runner.py
+
+Description:
+The `benchmark_runner.py` module contains the `BenchmarkRunner`, which executes a
+graph of pipeline steps (e.g. aggregate -> annotate -> normalize -> feature_select)
+on every plate while tracking each step with `memray`. The results of each
+tracked step are collected into a benchmark profile that follows the schema of the
+`BenchmarkStore`, therefore new datasets can be benchmarked by only defining their
+steps.
+"""
+
+import multiprocessing
+import pathlib
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .benchmark_store import BENCHMARK_SCHEMA, BenchmarkStore
+from .benchmark_utils import (
+    MEMRAY_TIME_FORMAT,
+    open_arrow,
+    parquet_to_arrow,
+    read_bin_metadata,
+    read_peak_rss,
+    read_table_shape,
+    reset_peak_rss,
+)
+from .cpu_profiles import CPU_PROFILERS, CPUProfiler
+from .resource_sampler import ResourceSampler
+
+# variant of steps that do not specify an implementation
+DEFAULT_VARIANT = "default"
+
+# labels that can be compared with `compare_variants` and their defaults
+_COMPARISON_DEFAULTS = {"variant": DEFAULT_VARIANT, "input_format": "parquet"}
+
+
+@dataclass
+class StepContext:
+    """Information passed to a step when it is executed.
+
+    Attributes
+    ----------
+    plate : str
+        name of the plate that is processed
+    info : dict
+        plate information, e.g. the path to the profile and platemap
+    profiles : str | pd.DataFrame | pa.Table
+        input of the step, either a path to a parquet file, a loaded DataFrame or
+        a memory-mapped Arrow table
+    output_file : Optional[str]
+        path where the step writes its output. None if the runner passes
+        DataFrames between steps, where the step must return its output
+    """
+
+    plate: str
+    info: dict
+    profiles: str | pd.DataFrame | pa.Table
+    output_file: Optional[str]
+
+    def profiles_input(self, columns: Optional[list[str]] = None) -> str | pd.DataFrame:
+        """Returns the input of the step as a path or a DataFrame, which are the
+        inputs accepted by pycytominer.
+
+        Memory-mapped Arrow tables are converted with one block per column, where
+        numerical columns without missing values point into the mapped file
+        instead of being copied.
+
+        Parameters
+        ----------
+        columns : Optional[list[str]]
+            columns to select. Default is all columns
+
+        Returns
+        -------
+        str | pd.DataFrame
+            path to the input if it was not loaded and no columns are selected,
+            otherwise a DataFrame
+        """
+        if isinstance(self.profiles, pa.Table):
+            table = self.profiles if columns is None else self.profiles.select(columns)
+            return table.to_pandas(split_blocks=True)
+        if isinstance(self.profiles, str):
+            if columns is None:
+                return self.profiles
+            return pd.read_parquet(self.profiles, columns=columns)
+        return self.profiles if columns is None else self.profiles[columns]
+
+
+@dataclass
+class BenchmarkStep:
+    """Single step of a benchmarked pipeline.
+
+    Attributes
+    ----------
+    name : str
+        name of the step, used as the process name in the benchmark profile
+    func : Callable[[StepContext], Optional[pd.DataFrame]]
+        function that executes the step and writes its output into
+        `StepContext.output_file`
+    depends_on : Optional[str]
+        name of the step whose output is used as input. If None, the plate's
+        profile is used
+    output_suffix : Optional[str]
+        suffix of the output file `{plate}_{output_suffix}.parquet`. Default is
+        the step name
+    preload : bool
+        load the input into a DataFrame before tracking starts
+    tracked : bool
+        track the step with memray. Untracked steps (e.g. renaming columns) are
+        executed but not included in the benchmark profile
+    variant : str
+        implementation of the step (e.g. "streaming"), recorded in the profile.
+        Non-default variants are added to the names of the captures and outputs,
+        allowing implementations of the same step to be benchmarked side by side
+    requires_files : bool
+        the step reads its input from and returns the path of its output file
+        (e.g. streaming steps), therefore it cannot be chained in memory mode
+    returns_output : bool
+        the step returns its output instead of writing it, also in file mode.
+        The returned DataFrame is passed to the dependent steps, which write it
+        (e.g. an untracked step that reorders columns before saving)
+    prepare : Optional[Callable[[StepContext], StepContext]]
+        function executed before tracking starts that returns the context passed
+        to the step, e.g. with the platemap loaded into `StepContext.info`
+    """
+
+    name: str
+    func: Callable[[StepContext], Optional[pd.DataFrame]]
+    depends_on: Optional[str] = None
+    output_suffix: Optional[str] = None
+    preload: bool = False
+    tracked: bool = True
+    variant: str = DEFAULT_VARIANT
+    requires_files: bool = False
+    returns_output: bool = False
+    prepare: Optional[Callable[[StepContext], StepContext]] = None
+
+
+@dataclass
+class BenchmarkRunner:
+    """Executes a graph of pipeline steps on every plate, tracking each step with
+    `memray.Tracker`.
+
+    Memray captures are named `{plate}_{dataset}_{step}_benchmarks.bin`, or
+    `{plate}_{dataset}_{step}_{variant}_benchmarks.bin` for non-default step
+    variants, and are stored in the benchmark directory.
+
+    Attributes
+    ----------
+    steps : list[BenchmarkStep]
+        steps of the pipeline
+    dataset : str
+        name of the benchmarked dataset
+    output_dir : str | pathlib.Path
+        directory where the outputs of each step are written
+    benchmark_dir : str | pathlib.Path
+        directory where the memray captures are written
+    profile_key : str
+        key of the plate information containing the path to the plate's profile
+    follow_fork : bool
+        track child processes created by the steps
+    memory_factor : float
+        ratio between the memory required to process a plate and the size of its
+        profile, used to estimate memory when running plates in parallel
+    chain_mode : str
+        "file": steps write their outputs and dependent steps read them back.
+        "memory": steps return DataFrames that are passed to dependent steps
+        without parquet round-trips
+    write_outputs : str
+        outputs written in memory mode, outside of tracking: "all", "last" (steps
+        without dependents) or "none". The time spent writing is recorded as
+        `serialization_time`
+    input_format : str
+        "parquet": steps without dependencies read the plate's parquet profile.
+        "arrow": the profile is converted once into an Arrow IPC file
+        (`{output_dir}/{plate}.arrow`) and steps without dependencies receive it
+        memory-mapped instead of a loaded DataFrame. The peak resident set size
+        of each step is recorded as `peak_rss` in both formats
+    sample_interval : Optional[float]
+        if provided, RSS, USS, CPU usage and I/O bytes are sampled every
+        `sample_interval` seconds while a step is tracked. Samples are written
+        next to the capture as `{capture_name}_samples.parquet` and the file
+        name is recorded as `samples_file`, see `load_samples`
+    repetitions : int
+        number of untracked timing runs of each tracked step, executed before
+        the memray tracked run so timings do not include memray's overhead. The
+        median, interquartile range and minimum of the wall and CPU times are
+        recorded (e.g. `wall_time_median`). Steps must not modify their input
+    warmup : int
+        number of untracked runs of each tracked step executed and discarded
+        before the timing runs
+    calibrate : bool
+        measure memray's overhead: each tracked step is also executed untracked
+        (unless timing runs are available, whose median is used) and tracked with
+        `trace_python_allocators=True`. The overhead ratio of the tracked run
+        (`overhead_ratio`) is used to report a `corrected_time` next to the raw
+        `time_duration`
+    cpu_profiler : Optional[str]
+        if provided, "cprofile" or "pyinstrument" profiles the CPU time of each
+        tracked step in an additional untracked run (both profilers and memray
+        install the interpreter's profile hook, which cannot be shared). The
+        collapsed stacks are written next to the capture as
+        `{capture_name}_cpu.collapsed` and the file name is recorded as
+        `cpu_profile_file`, see `load_cpu_profiles`. cProfile's per-call tracing
+        inflates the profiled times, see `CPUProfiler`
+    cpu_interval : float
+        sampling interval (secs) of "pyinstrument". Default is 0.001
+    """
+
+    steps: list[BenchmarkStep]
+    dataset: str
+    output_dir: str | pathlib.Path
+    benchmark_dir: str | pathlib.Path
+    profile_key: str = "profile_path"
+    follow_fork: bool = True
+    memory_factor: float = 3.0
+    chain_mode: str = "file"
+    write_outputs: str = "last"
+    input_format: str = "parquet"
+    sample_interval: Optional[float] = None
+    repetitions: int = 0
+    warmup: int = 0
+    calibrate: bool = False
+    cpu_profiler: Optional[str] = None
+    cpu_interval: float = 0.001
+    _order: list[BenchmarkStep] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.chain_mode not in ["file", "memory"]:
+            raise ValueError(
+                f"'chain_mode' must be 'file' or 'memory'. Provided: {self.chain_mode}"
+            )
+        if self.write_outputs not in ["all", "last", "none"]:
+            raise ValueError(
+                "'write_outputs' must be 'all', 'last' or 'none'. "
+                f"Provided: {self.write_outputs}"
+            )
+        file_steps = [step.name for step in self.steps if step.requires_files]
+        if self.chain_mode == "memory" and len(file_steps) > 0:
+            raise ValueError(
+                "Steps that require files cannot be chained in memory mode. "
+                f"Provided: {file_steps}"
+            )
+        if self.input_format not in ["parquet", "arrow"]:
+            raise ValueError(
+                "'input_format' must be 'parquet' or 'arrow'. "
+                f"Provided: {self.input_format}"
+            )
+        if self.cpu_profiler is not None and self.cpu_profiler not in CPU_PROFILERS:
+            raise ValueError(
+                f"'cpu_profiler' must be one of {CPU_PROFILERS}. "
+                f"Provided: {self.cpu_profiler}"
+            )
+        if self.repetitions < 0 or self.warmup < 0:
+            raise ValueError(
+                "'repetitions' and 'warmup' must not be negative. "
+                f"Provided: {self.repetitions}, {self.warmup}"
+            )
+
+        self.output_dir = pathlib.Path(self.output_dir).resolve()
+        self.benchmark_dir = pathlib.Path(self.benchmark_dir).resolve()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.benchmark_dir.mkdir(parents=True, exist_ok=True)
+        self._order = self._resolve_order()
+
+    def _resolve_order(self) -> list[BenchmarkStep]:
+        """Orders the steps so every step is executed after its dependency. Steps
+        without dependencies between them keep the order they were given in.
+
+        Returns
+        -------
+        list[BenchmarkStep]
+            steps in execution order
+
+        Raises
+        ------
+        ValueError
+            Raised if step names are duplicated, a dependency is unknown or the
+            steps contain a cycle
+        """
+
+        names = [step.name for step in self.steps]
+        if len(names) != len(set(names)):
+            raise ValueError(f"Step names must be unique. Provided: {names}")
+
+        unknown = [
+            step.depends_on
+            for step in self.steps
+            if step.depends_on is not None and step.depends_on not in names
+        ]
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown step dependencies: {unknown}")
+
+        order, done = [], set()
+        remaining = list(self.steps)
+        while len(remaining) > 0:
+            ready = [
+                step
+                for step in remaining
+                if step.depends_on is None or step.depends_on in done
+            ]
+            if len(ready) == 0:
+                raise ValueError(
+                    f"Steps contain a cycle: {[step.name for step in remaining]}"
+                )
+            order.append(ready[0])
+            done.add(ready[0].name)
+            remaining.remove(ready[0])
+
+        return order
+
+    def capture_path(self, plate: str, step: BenchmarkStep) -> pathlib.Path:
+        """Returns the path of the memray capture of a plate's step
+
+        Parameters
+        ----------
+        plate : str
+            name of the plate
+        step : BenchmarkStep
+            benchmarked step
+
+        Returns
+        -------
+        pathlib.Path
+            path to the memray capture
+        """
+        name = f"{plate}_{self.dataset}_{step.name}{_variant_suffix(step)}"
+        return self.benchmark_dir / f"{name}_benchmarks.bin"
+
+    def output_path(self, plate: str, step: BenchmarkStep) -> pathlib.Path:
+        """Returns the path of the output file of a plate's step
+
+        Parameters
+        ----------
+        plate : str
+            name of the plate
+        step : BenchmarkStep
+            benchmarked step
+
+        Returns
+        -------
+        pathlib.Path
+            path to the output file
+        """
+        suffix = step.name if step.output_suffix is None else step.output_suffix
+        return self.output_dir / f"{plate}_{suffix}{_variant_suffix(step)}.parquet"
+
+    def run_plate(
+        self,
+        plate: str,
+        info: dict,
+        n_workers: Optional[int] = 1,
+        concurrent_plates: Optional[int] = 1,
+    ) -> pd.DataFrame:
+        """Executes all steps on a single plate
+
+        Parameters
+        ----------
+        plate : str
+            name of the plate
+        info : dict
+            plate information, must contain the path to the plate's profile under
+            `profile_key`
+        n_workers : Optional[int]
+            number of workers used in the run, recorded in the profile
+        concurrent_plates : Optional[int]
+            number of plates being processed, including this one, when the plate
+            started. Recorded in the profile
+
+        Returns
+        -------
+        pd.DataFrame
+            benchmark profile of the plate, one row per tracked step
+        """
+
+        # memray is only required when benchmarks are executed
+        import memray
+
+        profile_path = pathlib.Path(info[self.profile_key]).resolve(strict=True)
+        file_size = round(profile_path.stat().st_size / 1024**2, 3)
+        n_rows, n_columns = read_table_shape(profile_path)
+
+        # the arrow file is created before any step is tracked
+        arrow_path = None
+        if self.input_format == "arrow":
+            arrow_path = parquet_to_arrow(
+                profile_path, self.output_dir / f"{plate}.arrow"
+            )
+
+        # file mode: outputs are paths, memory mode: outputs are DataFrames
+        in_memory = self.chain_mode == "memory"
+        outputs = {}
+        records = []
+        for step in self._order:
+            if step.depends_on is None:
+                profiles = str(profile_path)
+                if arrow_path is not None:
+                    profiles = open_arrow(arrow_path)
+                elif step.preload or in_memory:
+                    profiles = pd.read_parquet(profiles)
+            else:
+                profiles = outputs[step.depends_on]
+                if step.preload and isinstance(profiles, str):
+                    profiles = pd.read_parquet(profiles)
+
+            # steps only write their outputs in file mode
+            output_file = str(self.output_path(plate, step))
+            context = StepContext(
+                plate,
+                info,
+                profiles,
+                None if in_memory or step.returns_output else output_file,
+            )
+            if step.prepare is not None:
+                context = step.prepare(context)
+
+            # untracked steps are executed without collecting benchmarks
+            if not step.tracked:
+                outputs[step.name] = self._chain_output(
+                    step, step.func(context), output_file
+                )
+                continue
+
+            # warm-up and timing runs are executed without tracking
+            for _ in range(self.warmup):
+                step.func(context)
+            timings = self._time_step(step, context)
+
+            # memray does not overwrite existing captures
+            capture_path = self.capture_path(plate, step)
+            capture_path.unlink(missing_ok=True)
+
+            # the sampler's process is started before tracking starts, therefore
+            # it is not followed by memray
+            sampler = (
+                nullcontext()
+                if self.sample_interval is None
+                else ResourceSampler(interval=self.sample_interval)
+            )
+
+            with sampler:
+                reset_peak_rss()
+                wall_start, cpu_start = time.perf_counter(), time.process_time()
+                with memray.Tracker(str(capture_path), follow_fork=self.follow_fork):
+                    result = step.func(context)
+                wall_time = time.perf_counter() - wall_start
+                cpu_time = time.process_time() - cpu_start
+                peak_rss = read_peak_rss()
+
+            samples_file = None
+            if self.sample_interval is not None:
+                samples_path = capture_path.with_name(
+                    capture_path.name.replace("_benchmarks.bin", "_samples.parquet")
+                )
+                sampler.to_frame().to_parquet(samples_path, index=False)
+                samples_file = samples_path.name
+            outputs[step.name] = self._chain_output(step, result, output_file)
+
+            # in memory mode, outputs are written outside tracking
+            serialization_time = None
+            if in_memory and self._writes_output(step):
+                write_start = time.perf_counter()
+                outputs[step.name].to_parquet(output_file, index=False)
+                serialization_time = time.perf_counter() - write_start
+
+            # CPU profiles are captured in an untracked run
+            cpu_profile_file = None
+            if self.cpu_profiler is not None:
+                with CPUProfiler(self.cpu_profiler, self.cpu_interval) as profiler:
+                    step.func(context)
+                cpu_profile_file = profiler.write_collapsed(
+                    capture_path.with_name(
+                        capture_path.name.replace("_benchmarks.bin", "_cpu.collapsed")
+                    )
+                ).name
+
+            calibration = (
+                self._calibrate_step(step, context, capture_path, wall_time, timings)
+                if self.calibrate
+                else {}
+            )
+
+            # size of the written output, e.g. to weigh compression against time
+            output_size = None
+            written = (
+                self._writes_output(step) if in_memory else not step.returns_output
+            )
+            if written and pathlib.Path(output_file).exists():
+                output_size = round(
+                    pathlib.Path(output_file).stat().st_size / 1024**2, 3
+                )
+
+            # reading benchmark results from the capture's metadata
+            meta_data = read_bin_metadata(capture_path)
+            records.append(
+                {
+                    "dataset": self.dataset,
+                    "process_name": step.name,
+                    "input_data_name": plate,
+                    "pid": meta_data["pid"],
+                    "start_time": meta_data["start_time"],
+                    "end_time": meta_data["end_time"],
+                    "total_allocations": int(meta_data["total_allocations"]),
+                    "peak_memory": round(meta_data["peak_memory"] / 1024**2, 3),
+                    "file_size": file_size,
+                    "n_rows": n_rows,
+                    "n_columns": n_columns,
+                    "benchmark_file": capture_path.name,
+                    "wall_time": wall_time,
+                    "n_workers": n_workers,
+                    "concurrent_plates": concurrent_plates,
+                    "chain_mode": self.chain_mode,
+                    "serialization_time": serialization_time,
+                    "variant": step.variant,
+                    "input_format": self.input_format,
+                    "peak_rss": None if peak_rss is None else round(peak_rss, 3),
+                    "samples_file": samples_file,
+                    "cpu_time": cpu_time,
+                    "warmup_runs": self.warmup,
+                    "output_size": output_size,
+                    "cpu_profile_file": cpu_profile_file,
+                    **timings,
+                    **calibration,
+                }
+            )
+
+        profile_df = pd.DataFrame(records)
+        if len(profile_df) == 0:
+            return profile_df
+
+        # computing durations from memray timestamps
+        for col in ["start_time", "end_time"]:
+            profile_df[col] = pd.to_datetime(profile_df[col], format=MEMRAY_TIME_FORMAT)
+        profile_df.insert(
+            6,
+            "time_duration",
+            (profile_df["end_time"] - profile_df["start_time"]).dt.total_seconds(),
+        )
+        if self.calibrate:
+            profile_df["corrected_time"] = (
+                profile_df["time_duration"] / profile_df["overhead_ratio"]
+            )
+        return profile_df
+
+    def _time_step(self, step: BenchmarkStep, context: StepContext) -> dict:
+        """Executes the untracked timing runs of a step
+
+        Parameters
+        ----------
+        step : BenchmarkStep
+            benchmarked step
+        context : StepContext
+            information passed to the step
+
+        Returns
+        -------
+        dict
+            number of repetitions and the median, interquartile range and
+            minimum of the wall and CPU times (secs). Values are None without
+            repetitions
+        """
+        wall_times = np.zeros(self.repetitions)
+        cpu_times = np.zeros(self.repetitions)
+        for idx in range(self.repetitions):
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            step.func(context)
+            wall_times[idx] = time.perf_counter() - wall_start
+            cpu_times[idx] = time.process_time() - cpu_start
+
+        timings = {"repetitions": self.repetitions}
+        for name, values in [("wall_time", wall_times), ("cpu_time", cpu_times)]:
+            timings.update(summarize_times(values, prefix=name))
+        return timings
+
+    def _calibrate_step(
+        self,
+        step: BenchmarkStep,
+        context: StepContext,
+        capture_path: pathlib.Path,
+        wall_time: float,
+        timings: dict,
+    ) -> dict:
+        """Measures the overhead of memray on a step by comparing the tracked run
+        against an untracked run and a run that traces Python allocators
+
+        Parameters
+        ----------
+        step : BenchmarkStep
+            benchmarked step
+        context : StepContext
+            information passed to the step
+        capture_path : pathlib.Path
+            path to the step's memray capture
+        wall_time : float
+            wall time (secs) of the tracked run
+        timings : dict
+            results of the timing runs, see `_time_step`
+
+        Returns
+        -------
+        dict
+            untracked_time, traced_time (secs), overhead_ratio and
+            traced_overhead_ratio
+        """
+        import memray
+
+        # timing runs are reused as the untracked baseline
+        untracked_time = timings.get("wall_time_median")
+        if untracked_time is None:
+            wall_start = time.perf_counter()
+            step.func(context)
+            untracked_time = time.perf_counter() - wall_start
+
+        # python allocators are traced into a separate capture
+        traced_path = capture_path.with_name(
+            capture_path.name.replace("_benchmarks.bin", "_traced_benchmarks.bin")
+        )
+        traced_path.unlink(missing_ok=True)
+        wall_start = time.perf_counter()
+        with memray.Tracker(
+            str(traced_path),
+            follow_fork=self.follow_fork,
+            trace_python_allocators=True,
+        ):
+            step.func(context)
+        traced_time = time.perf_counter() - wall_start
+
+        return {
+            "untracked_time": untracked_time,
+            "traced_time": traced_time,
+            "overhead_ratio": wall_time / untracked_time,
+            "traced_overhead_ratio": traced_time / untracked_time,
+        }
+
+    def _chain_output(
+        self, step: BenchmarkStep, result: Optional[pd.DataFrame], output_file: str
+    ) -> str | pd.DataFrame:
+        """Returns the output that is passed to the dependent steps
+
+        Parameters
+        ----------
+        step : BenchmarkStep
+            executed step
+        result : Optional[pd.DataFrame]
+            value returned by the step
+        output_file : str
+            path to the step's output file
+
+        Returns
+        -------
+        str | pd.DataFrame
+            path to the step's output in file mode, the returned DataFrame in
+            memory mode or if the step returns its output
+
+        Raises
+        ------
+        TypeError
+            Raised if a step does not return a DataFrame in memory mode or if it
+            returns its output
+        """
+        if self.chain_mode == "file" and not step.returns_output:
+            return output_file
+        if not isinstance(result, pd.DataFrame):
+            raise TypeError(
+                f"Step '{step.name}' must return a DataFrame in memory mode or "
+                f"with returns_output. Returned: {type(result)}"
+            )
+        return result
+
+    def _writes_output(self, step: BenchmarkStep) -> bool:
+        """Checks if the output of a step is written in memory mode
+
+        Parameters
+        ----------
+        step : BenchmarkStep
+            executed step
+
+        Returns
+        -------
+        bool
+            True if the output is written
+        """
+        if self.write_outputs == "all":
+            return True
+        if self.write_outputs == "last":
+            return all(other.depends_on != step.name for other in self.steps)
+        return False
+
+    def estimate_memory(self, info: dict) -> float:
+        """Estimates the memory (MB) required to process a plate from the size of
+        its profile
+
+        Parameters
+        ----------
+        info : dict
+            plate information
+
+        Returns
+        -------
+        float
+            estimated memory in MB
+        """
+        profile_path = pathlib.Path(info[self.profile_key])
+        return profile_path.stat().st_size / 1024**2 * self.memory_factor
+
+    def run(
+        self,
+        plate_info: dict[str, dict],
+        store: Optional[BenchmarkStore] = None,
+        n_workers: Optional[int] = 1,
+        memory_budget: Optional[float] = None,
+    ) -> pd.DataFrame:
+        """Executes all steps on every plate.
+
+        If `n_workers` is higher than 1, plates are processed in parallel worker
+        processes, each plate writing its own memray captures. A plate is only
+        started if the estimated memory of all running plates stays within the
+        memory budget, a plate that exceeds the budget by itself is only started
+        when no other plate is running.
+
+        Parameters
+        ----------
+        plate_info : dict[str, dict]
+            plate names mapped to their plate information
+        store : Optional[BenchmarkStore]
+            if provided, the benchmark profile is appended into the store
+        n_workers : Optional[int]
+            number of plates processed at the same time. Default is 1
+        memory_budget : Optional[float]
+            maximum estimated memory (MB) of all running plates, see
+            `estimate_memory`. Default is no limit
+
+        Returns
+        -------
+        pd.DataFrame
+            benchmark profile of all plates, one row per tracked step. An empty
+            profile with the store's columns is returned (and not appended) if
+            no step was tracked
+
+        Raises
+        ------
+        ValueError
+            Raised if `n_workers` is lower than 1
+        """
+
+        if n_workers < 1:
+            raise ValueError(f"'n_workers' must be at least 1. Provided: {n_workers}")
+
+        plate_dfs = []
+        if n_workers == 1:
+            for plate, info in plate_info.items():
+                print(f"Performing benchmarked pipeline for {plate}")
+                plate_dfs.append(self.run_plate(plate, info))
+        else:
+            plate_dfs = self._run_parallel(plate_info, n_workers, memory_budget)
+
+        # without plates or tracked steps the profile is empty
+        plate_dfs = [plate_df for plate_df in plate_dfs if len(plate_df) > 0]
+        if len(plate_dfs) == 0:
+            return pd.DataFrame(columns=BENCHMARK_SCHEMA.names)
+
+        profile_df = pd.concat(plate_dfs, ignore_index=True)
+        if store is not None:
+            store.append(profile_df)
+
+        return profile_df
+
+    def _run_parallel(
+        self,
+        plate_info: dict[str, dict],
+        n_workers: int,
+        memory_budget: Optional[float],
+    ) -> list[pd.DataFrame]:
+        """Processes plates in worker processes while respecting the memory budget
+
+        Parameters
+        ----------
+        plate_info : dict[str, dict]
+            plate names mapped to their plate information
+        n_workers : int
+            number of worker processes
+        memory_budget : Optional[float]
+            maximum estimated memory (MB) of all running plates
+
+        Returns
+        -------
+        list[pd.DataFrame]
+            benchmark profile of each plate
+        """
+
+        pending = list(plate_info.items())
+        running = {}
+        plate_dfs = {}
+
+        # spawned workers do not inherit the threads of the parent process
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=mp_context) as pool:
+            while len(pending) > 0 or len(running) > 0:
+                # submitting plates while workers and memory are available
+                while len(pending) > 0 and len(running) < n_workers:
+                    plate, info = pending[0]
+                    estimate = self.estimate_memory(info)
+                    in_use = sum(estimate for _, estimate in running.values())
+                    if (
+                        len(running) > 0
+                        and memory_budget is not None
+                        and in_use + estimate > memory_budget
+                    ):
+                        break
+
+                    pending.pop(0)
+                    print(f"Performing benchmarked pipeline for {plate}")
+                    future = pool.submit(
+                        self.run_plate, plate, info, n_workers, len(running) + 1
+                    )
+                    running[future] = (plate, estimate)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    plate, _ = running.pop(future)
+                    plate_dfs[plate] = future.result()
+
+        # keeping the order of the plates
+        return [plate_dfs[plate] for plate in plate_info]
+
+
+def correct_times(
+    profile_df: pd.DataFrame,
+    calibration_df: pd.DataFrame,
+    by: Optional[list[str]] = None,
+) -> pd.DataFrame:
+    """Adds the time corrected for memray's overhead into a benchmark profile,
+    using the median overhead ratio of each step measured in a calibration run
+
+    Parameters
+    ----------
+    profile_df : pd.DataFrame
+        benchmark profile containing the raw `time_duration`
+    calibration_df : pd.DataFrame
+        benchmark profile of a calibration run (`BenchmarkRunner(calibrate=True)`)
+    by : Optional[list[str]]
+        columns used to match the steps of both profiles. Default is
+        `process_name`
+
+    Returns
+    -------
+    pd.DataFrame
+        benchmark profile with the `overhead_ratio` and `corrected_time` columns
+    """
+    by = ["process_name"] if by is None else by
+    ratios_df = calibration_df.groupby(by, as_index=False)["overhead_ratio"].median()
+
+    profile_df = profile_df.drop(
+        columns=[
+            col for col in ["overhead_ratio", "corrected_time"] if col in profile_df
+        ]
+    ).merge(ratios_df, on=by, how="left")
+    profile_df["corrected_time"] = (
+        profile_df["time_duration"] / profile_df["overhead_ratio"]
+    )
+    return profile_df
+
+
+def summarize_times(values: np.ndarray, prefix: str) -> dict:
+    """Summarizes repeated time measurements with robust statistics
+
+    Parameters
+    ----------
+    values : np.ndarray
+        measured times (secs)
+    prefix : str
+        prefix of the returned keys, e.g. "wall_time"
+
+    Returns
+    -------
+    dict
+        `{prefix}_median`, `{prefix}_iqr` and `{prefix}_min`, None if there are no
+        measurements
+    """
+    if len(values) == 0:
+        return {f"{prefix}_median": None, f"{prefix}_iqr": None, f"{prefix}_min": None}
+
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    return {
+        f"{prefix}_median": float(median),
+        f"{prefix}_iqr": float(q3 - q1),
+        f"{prefix}_min": float(np.min(values)),
+    }
+
+
+def _variant_suffix(step: BenchmarkStep) -> str:
+    """Returns the suffix added to file names of non-default step variants"""
+    return "" if step.variant == DEFAULT_VARIANT else f"_{step.variant}"
+
+
+def compare_variants(
+    profile_df: pd.DataFrame,
+    metrics: Optional[list[str]] = None,
+    by: Optional[str] = "variant",
+    baseline: Optional[str] = None,
+) -> pd.DataFrame:
+    """Places the benchmarks of different step variants (or input formats) side by
+    side, one row per plate and step
+
+    Parameters
+    ----------
+    profile_df : pd.DataFrame
+        benchmark profile containing the `by` column
+    metrics : Optional[list[str]]
+        metrics to compare. Default is time_duration and peak_memory
+    by : Optional[str]
+        column that labels the compared runs, "variant" or "input_format".
+        Default is "variant"
+    baseline : Optional[str]
+        label used as reference, the ratio between every other label and the
+        baseline is added as `{metric}_ratio_{label}`. Default is "default" for
+        variants and "parquet" for input formats
+
+    Returns
+    -------
+    pd.DataFrame
+        columns named `{metric}_{label}` for each metric and label
+
+    Raises
+    ------
+    ValueError
+        Raised if `by` is not supported or the profile does not contain it
+    """
+
+    if by not in _COMPARISON_DEFAULTS:
+        raise ValueError(
+            f"'by' must be one of {list(_COMPARISON_DEFAULTS)}. Provided: {by}"
+        )
+    if by not in profile_df.columns:
+        raise ValueError(f"'profile_df' must contain the '{by}' column")
+    metrics = ["time_duration", "peak_memory"] if metrics is None else metrics
+    baseline = _COMPARISON_DEFAULTS[by] if baseline is None else baseline
+
+    # profiles recorded before the column existed used the default
+    profile_df = profile_df.assign(
+        **{by: profile_df[by].fillna(_COMPARISON_DEFAULTS[by])}
+    )
+    wide_df = profile_df.pivot_table(
+        index=["input_data_name", "process_name"],
+        columns=by,
+        values=metrics,
+        aggfunc="mean",
+    )
+    labels = list(wide_df.columns.get_level_values(1).unique())
+    wide_df.columns = [f"{metric}_{label}" for metric, label in wide_df.columns]
+
+    if baseline in labels:
+        for metric in metrics:
+            for label in labels:
+                if label == baseline:
+                    continue
+                wide_df[f"{metric}_ratio_{label}"] = (
+                    wide_df[f"{metric}_{label}"] / wide_df[f"{metric}_{baseline}"]
+                )
+
+    return wide_df.reset_index()
@@ -0,0 +1,338 @@
+"""
+Module: benchmark_store.py
+
+Description:
+The `benchmark_store.py` module contains the `BenchmarkStore`, a partitioned
+parquet store that contains the benchmark profiles of all datasets. All profiles
+share a single typed schema and are partitioned by dataset, process and the date
+the benchmark was executed. This allows analyses to only load the columns and
+partitions required instead of parsing all the benchmark files again.
+"""
+
+import pathlib
+import uuid
+from datetime import date, datetime
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# schema shared by all benchmark profiles within the store
+# time_duration, wall_time, cpu_time (and their summaries) and serialization_time
+# are in seconds
+# peak_memory, peak_rss, file_size and output_size are in MB
+BENCHMARK_SCHEMA = pa.schema(
+    [
+        pa.field("dataset", pa.string(), nullable=False),
+        pa.field("process_name", pa.string(), nullable=False),
+        pa.field("run_date", pa.date32(), nullable=False),
+        pa.field("input_data_name", pa.string(), nullable=False),
+        pa.field("pid", pa.int64()),
+        pa.field("start_time", pa.timestamp("us")),
+        pa.field("end_time", pa.timestamp("us")),
+        pa.field("time_duration", pa.float64()),
+        pa.field("total_allocations", pa.int64()),
+        pa.field("peak_memory", pa.float64()),
+        pa.field("file_size", pa.float64()),
+        pa.field("n_rows", pa.int64()),
+        pa.field("n_columns", pa.int64()),
+        pa.field("benchmark_file", pa.string()),
+        pa.field("wall_time", pa.float64()),
+        pa.field("n_workers", pa.int64()),
+        pa.field("concurrent_plates", pa.int64()),
+        pa.field("chain_mode", pa.string()),
+        pa.field("serialization_time", pa.float64()),
+        pa.field("variant", pa.string()),
+        pa.field("input_format", pa.string()),
+        pa.field("peak_rss", pa.float64()),
+        pa.field("samples_file", pa.string()),
+        pa.field("cpu_time", pa.float64()),
+        pa.field("warmup_runs", pa.int64()),
+        pa.field("repetitions", pa.int64()),
+        pa.field("wall_time_median", pa.float64()),
+        pa.field("wall_time_iqr", pa.float64()),
+        pa.field("wall_time_min", pa.float64()),
+        pa.field("cpu_time_median", pa.float64()),
+        pa.field("cpu_time_iqr", pa.float64()),
+        pa.field("cpu_time_min", pa.float64()),
+        pa.field("untracked_time", pa.float64()),
+        pa.field("traced_time", pa.float64()),
+        pa.field("overhead_ratio", pa.float64()),
+        pa.field("traced_overhead_ratio", pa.float64()),
+        pa.field("corrected_time", pa.float64()),
+        pa.field("output_size", pa.float64()),
+        pa.field("cpu_profile_file", pa.string()),
+    ]
+)
+
+# columns used to partition the store
+PARTITION_COLUMNS = ["dataset", "process_name", "run_date"]
+
+# columns that must be provided when appending profiles
+REQUIRED_COLUMNS = ["dataset", "process_name", "input_data_name", "start_time"]
+
+# older profiles used `script` instead of `process_name`
+COLUMN_ALIASES = {"script": "process_name"}
+
+
+def normalize_columns(profile_df: pd.DataFrame) -> pd.DataFrame:
+    """Renames the columns of older benchmark profiles to the store's names
+
+    Parameters
+    ----------
+    profile_df : pd.DataFrame
+        benchmark profile
+
+    Returns
+    -------
+    pd.DataFrame
+        profile using the names of `BENCHMARK_SCHEMA`, e.g. `process_name`
+        instead of `script`
+    """
+    return profile_df.rename(columns=COLUMN_ALIASES)
+
+
+class BenchmarkStore:
+    """Partitioned parquet store containing the benchmark profiles of all
+    datasets.
+
+    The store is partitioned with the hive layout
+    `dataset=<name>/process_name=<name>/run_date=<date>/`, therefore queries that
+    filter on these columns only read the matching partitions.
+
+    Parameters
+    ----------
+    root : str | pathlib.Path
+        path to the directory where the store is located. It will be created if it
+        does not exist
+    """
+
+    def __init__(self, root: str | pathlib.Path) -> None:
+        # type checking
+        if not isinstance(root, (str, pathlib.Path)):
+            raise TypeError(
+                "'root' must be a str or a pathlib.Path object. "
+                f"Provided: {type(root)}"
+            )
+
+        self.root = pathlib.Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f"BenchmarkStore(root={str(self.root)!r})"
+
+    def _to_table(self, profile_df: pd.DataFrame) -> pa.Table:
+        """Converts a benchmark profile into an arrow table that follows the
+        `BENCHMARK_SCHEMA`.
+
+        Parameters
+        ----------
+        profile_df : pd.DataFrame
+            benchmark profile
+
+        Returns
+        -------
+        pa.Table
+            typed benchmark profile
+
+        Raises
+        ------
+        ValueError
+            Raised if required columns are missing or unknown columns are found
+        """
+
+        # dropping unnamed index columns generated by `DataFrame.to_csv`
+        profile_df = profile_df.loc[:, ~profile_df.columns.str.startswith("Unnamed")]
+        profile_df = normalize_columns(profile_df)
+
+        # checking columns
+        missing_cols = set(REQUIRED_COLUMNS) - set(profile_df.columns)
+        if len(missing_cols) > 0:
+            raise ValueError(f"Missing required columns: {sorted(missing_cols)}")
+        unknown_cols = set(profile_df.columns) - set(BENCHMARK_SCHEMA.names)
+        if len(unknown_cols) > 0:
+            raise ValueError(f"Unknown columns: {sorted(unknown_cols)}")
+
+        # timestamps are stored as datetime objects
+        profile_df = profile_df.copy()
+        for col in ["start_time", "end_time"]:
+            if col in profile_df.columns:
+                profile_df[col] = pd.to_datetime(profile_df[col])
+
+        # run date is obtained from the start time if not provided
+        if "run_date" not in profile_df.columns:
+            profile_df["run_date"] = profile_df["start_time"].dt.date
+
+        # adding missing optional columns with null values
+        for col in BENCHMARK_SCHEMA.names:
+            if col not in profile_df.columns:
+                profile_df[col] = None
+
+        return pa.Table.from_pandas(
+            profile_df[BENCHMARK_SCHEMA.names],
+            schema=BENCHMARK_SCHEMA,
+            preserve_index=False,
+        )
+
+    def append(
+        self,
+        profile_df: pd.DataFrame,
+        dataset: Optional[str] = None,
+        overwrite: Optional[bool] = False,
+    ) -> int:
+        """Appends benchmark profile into the store.
+
+        Parameters
+        ----------
+        profile_df : pd.DataFrame
+            benchmark profile, where each row is a single benchmarked process
+        dataset : Optional[str]
+            name of the dataset. Required if the profile does not have a
+            `dataset` column
+        overwrite : Optional[bool]
+            if True, partitions that are written replace the existing ones
+            instead of being appended to
+
+        Returns
+        -------
+        int
+            number of records written into the store
+
+        Raises
+        ------
+        TypeError
+            Raised if `profile_df` is not a pandas DataFrame
+        """
+
+        # type checking
+        if not isinstance(profile_df, pd.DataFrame):
+            raise TypeError(
+                "'profile_df' must be a pandas DataFrame. "
+                f"Provided: {type(profile_df)}"
+            )
+
+        if dataset is not None:
+            profile_df = profile_df.assign(dataset=dataset)
+
+        table = self._to_table(profile_df)
+        if table.num_rows == 0:
+            return 0
+
+        # unique file names per append ensures that files are not overwritten,
+        # overwritten partitions keep the same file names across rebuilds
+        basename_template = (
+            "part-{i}.parquet"
+            if overwrite
+            else f"part-{uuid.uuid4().hex}-{{i}}.parquet"
+        )
+        ds.write_dataset(
+            table,
+            self.root,
+            format="parquet",
+            partitioning=PARTITION_COLUMNS,
+            partitioning_flavor="hive",
+            basename_template=basename_template,
+            existing_data_behavior=(
+                "delete_matching" if overwrite else "overwrite_or_ignore"
+            ),
+        )
+
+        return table.num_rows
+
+    def query(
+        self,
+        columns: Optional[list[str]] = None,
+        dataset: Optional[str | list[str]] = None,
+        process_name: Optional[str | list[str]] = None,
+        input_data_name: Optional[str | list[str]] = None,
+        start_date: Optional[str | date] = None,
+        end_date: Optional[str | date] = None,
+    ) -> pd.DataFrame:
+        """Loads benchmark profiles from the store. Only the selected columns and
+        the partitions that match the filters are read.
+
+        Parameters
+        ----------
+        columns : Optional[list[str]]
+            columns to load. Default is all columns
+        dataset : Optional[str | list[str]]
+            dataset(s) to select
+        process_name : Optional[str | list[str]]
+            process(es) to select
+        input_data_name : Optional[str | list[str]]
+            input(s) to select
+        start_date : Optional[str | date]
+            select runs executed on or after this date
+        end_date : Optional[str | date]
+            select runs executed on or before this date
+
+        Returns
+        -------
+        pd.DataFrame
+            benchmark profiles that match the query
+
+        Raises
+        ------
+        ValueError
+            Raised if unknown columns are selected
+        """
+
+        # checking selected columns
+        if columns is not None:
+            unknown_cols = set(columns) - set(BENCHMARK_SCHEMA.names)
+            if len(unknown_cols) > 0:
+                raise ValueError(f"Unknown columns: {sorted(unknown_cols)}")
+
+        # an empty store returns an empty profile
+        if not any(self.root.rglob("*.parquet")):
+            empty_df = BENCHMARK_SCHEMA.empty_table().to_pandas()
+            return empty_df if columns is None else empty_df[columns]
+
+        # building filter expression
+        expression = None
+        for name, values in [
+            ("dataset", dataset),
+            ("process_name", process_name),
+            ("input_data_name", input_data_name),
+        ]:
+            if values is None:
+                continue
+            values = [values] if isinstance(values, str) else list(values)
+            expression = _and(expression, ds.field(name).isin(values))
+
+        if start_date is not None:
+            expression = _and(expression, ds.field("run_date") >= _to_date(start_date))
+        if end_date is not None:
+            expression = _and(expression, ds.field("run_date") <= _to_date(end_date))
+
+        return self._dataset().to_table(columns=columns, filter=expression).to_pandas()
+
+    def _dataset(self) -> ds.Dataset:
+        """Opens the store as a pyarrow dataset
+
+        Returns
+        -------
+        ds.Dataset
+            partitioned benchmark dataset
+        """
+        return ds.dataset(
+            self.root,
+            schema=BENCHMARK_SCHEMA,
+            format="parquet",
+            partitioning="hive",
+        )
+
+
+def _and(expression: Optional[ds.Expression], other: ds.Expression) -> ds.Expression:
+    """Combines two filter expressions, where the first one can be missing"""
+    return other if expression is None else expression & other
+
+
+def _to_date(value: str | date) -> date:
+    """Converts ISO formatted date strings into date objects"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
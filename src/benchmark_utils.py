@@ -10,9 +10,42 @@ standardizes common I/O tasks across the project, promoting efficiency and
 organization.
 """
 
+import bisect
+import json
+import os
 import pathlib
+import shutil
+import sqlite3
+import subprocess
+import time
+import warnings
 from collections import defaultdict
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+# use orjson to parse json files if available
+try:
+    import orjson
+
+    def load_json(path: pathlib.Path) -> dict:
+        """Parses a json file"""
+        return orjson.loads(path.read_bytes())
+
+except ImportError:
+
+    def load_json(path: pathlib.Path) -> dict:
+        """Parses a json file"""
+        return json.loads(path.read_bytes())
+
+
+# format of the time strings found in memray json files
+MEMRAY_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
 
 
 def validate_path(
@@ -96,6 +129,118 @@ def get_benchmark_files(
     return bench_files
 
 
+class FilePathResolver:
+    """Resolves file names into the paths of the data files whose name starts with
+    them. This also extends to symbolic links.
+
+    The data directory is scanned once and the file names are stored in a sorted
+    index, therefore each lookup is a binary search over the index. The index is
+    shared across instances and rebuilt only when the modification time of the
+    data directory changes (e.g. files were added or removed).
+
+    If a name matches multiple data files (e.g. "Plate_3" matches both
+    "Plate_3_nf1.sqlite" and "Plate_3_prime_nf1.sqlite"), the match is reported in
+    `ambiguous` and the shortest file name, which is the closest match, is used.
+
+    Parameters
+    ----------
+    data_dir : str | pathlib.Path
+        A string representing the directory path where the data files are located,
+        or a pathlib.Path object.
+
+    data_ext : str
+        The file extension (without a dot) of the data files to be considered
+        when creating the index.
+    """
+
+    # directory indexes, keyed on (directory, extension)
+    _index_cache: dict[tuple[str, str], tuple[int, list[str], list[str]]] = {}
+
+    def __init__(self, data_dir: str | pathlib.Path, data_ext: str) -> None:
+        self.data_dir = validate_path(data_dir, check_dir=True)
+        self.data_ext = data_ext.strip().replace(".", "")
+
+        # names that matched more than one data file
+        self.ambiguous: dict[str, list[str]] = {}
+
+    def _index(self) -> tuple[list[str], list[str]]:
+        """Returns the sorted file names and their paths, the directory is only
+        scanned again if it has been modified
+
+        Returns
+        -------
+        tuple[list[str], list[str]]
+            sorted file names and their respective paths
+        """
+        key = (str(self.data_dir), self.data_ext)
+        mtime = self.data_dir.stat().st_mtime_ns
+
+        cached = self._index_cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        data_files = sorted(
+            self.data_dir.glob(f"*.{self.data_ext}"), key=lambda path: path.name
+        )
+        names = [data_file.name for data_file in data_files]
+        paths = [str(data_file) for data_file in data_files]
+        self._index_cache[key] = (mtime, names, paths)
+
+        return names, paths
+
+    def matches(self, fname: str) -> list[str]:
+        """Returns the paths of all data files whose name starts with `fname`
+
+        Parameters
+        ----------
+        fname : str
+            file name or prefix of the file name
+
+        Returns
+        -------
+        list[str]
+            paths of the matching data files
+        """
+        names, paths = self._index()
+
+        # all names starting with `fname` are stored next to each other
+        lower = bisect.bisect_left(names, fname)
+        upper = bisect.bisect_left(names, f"{fname}{chr(0x10FFFF)}", lo=lower)
+        return paths[lower:upper]
+
+    def resolve(self, fname: str, strict: Optional[bool] = False) -> Optional[str]:
+        """Resolves a file name into the path of its data file.
+
+        Parameters
+        ----------
+        fname : str
+            file name or prefix of the file name
+        strict : Optional[bool]
+            raise an error if `fname` matches multiple data files
+
+        Returns
+        -------
+        Optional[str]
+            path to the data file, None if no data file was found
+
+        Raises
+        ------
+        ValueError
+            Raised if `strict` is True and `fname` matches multiple data files
+        """
+        found = self.matches(fname)
+        if len(found) == 0:
+            return None
+
+        if len(found) > 1:
+            if strict:
+                raise ValueError(f"'{fname}' matches multiple files: {found}")
+            self.ambiguous[fname] = found
+            return min(found, key=lambda path: len(pathlib.Path(path).name))
+
+        return found[0]
+
+
 def create_filename_path_mapping(
     fnames: str | list[str], data_dir: str | pathlib.Path, data_ext: str
 ) -> dict:
@@ -126,16 +271,701 @@ def create_filename_path_mapping(
 
     # convert to list if only a string is passed
     if isinstance(fnames, str):
-        fnames = [str]
-
-    # check path
-    data_dir = validate_path(data_dir, check_dir=True)
-    data_ext = data_ext.strip().replace(".", "")
+        fnames = [fnames]
 
-    # collect all data files
+    # resolve all file names with the indexed data directory
+    resolver = FilePathResolver(data_dir, data_ext)
     labeled_inputs = defaultdict(lambda: None)
-    for data_file in data_dir.glob(f"*.{data_ext}"):
-        for fname in fnames:
-            if data_file.name.startswith(fname):
-                labeled_inputs[fname] = str(data_file)
+    for fname in fnames:
+        path = resolver.resolve(fname)
+        if path is not None:
+            labeled_inputs[fname] = path
+
+    # reporting names that matched more than one file
+    for fname, found in resolver.ambiguous.items():
+        warnings.warn(
+            f"'{fname}' matches multiple files, using the closest match: {found}"
+        )
+
     return labeled_inputs
+
+
+@dataclass
+class ConversionResult:
+    """Outcome of converting a single memray `.bin` capture into a `.json` file.
+
+    Attributes
+    ----------
+    bin_path : pathlib.Path
+        path to the memray binary capture
+    json_path : pathlib.Path
+        path to the generated (or already existing) json file
+    status : str
+        one of "converted", "skipped" or "failed"
+    duration : float
+        wall time in seconds spent on the conversion
+    error : Optional[str]
+        stderr message returned by `memray stats` if the conversion failed
+    """
+
+    bin_path: pathlib.Path
+    json_path: pathlib.Path
+    status: str
+    duration: float
+    error: Optional[str] = None
+
+
+def _convert_bin_file(
+    bin_path: pathlib.Path, json_path: pathlib.Path, force: bool
+) -> ConversionResult:
+    """Converts a single `.bin` file into a `.json` file with `memray stats`.
+    Conversion is skipped if the json file is newer than the `.bin` file.
+
+    Parameters
+    ----------
+    bin_path : pathlib.Path
+        path to memray binary capture
+    json_path : pathlib.Path
+        path where the json file will be written
+    force : bool
+        convert even if an up-to-date json file already exists
+
+    Returns
+    -------
+    ConversionResult
+        status and timing of the conversion
+    """
+
+    # skip if the json output is already newer than its capture
+    if (
+        not force
+        and json_path.exists()
+        and json_path.stat().st_mtime >= bin_path.stat().st_mtime
+    ):
+        return ConversionResult(bin_path, json_path, "skipped", 0.0)
+
+    # executing memray to convert bin files into json files
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [
+            "memray",
+            "stats",
+            "--json",
+            "--output",
+            str(json_path),
+            "--force",
+            str(bin_path),
+        ],
+        capture_output=True,
+        text=True,
+    )
+    duration = time.perf_counter() - start
+
+    if proc.returncode != 0:
+        return ConversionResult(
+            bin_path, json_path, "failed", duration, proc.stderr.strip()
+        )
+    return ConversionResult(bin_path, json_path, "converted", duration)
+
+
+def convert_bin_files(
+    benchmark_path: str | pathlib.Path,
+    out_dir: Optional[str | pathlib.Path] = None,
+    n_workers: Optional[int] = None,
+    force: Optional[bool] = False,
+) -> list[ConversionResult]:
+    """Converts all memray `.bin` files found in the benchmark directory into
+    `.json` files. Conversions are executed concurrently where each worker drives
+    one `memray stats` process, therefore at most `n_workers` memray processes
+    are running at the same time.
+
+    Parameters
+    ----------
+    benchmark_path : str | pathlib.Path
+        path to benchmark directory containing the `.bin` files
+    out_dir : Optional[str | pathlib.Path]
+        directory where the json files are written. Default is the benchmark
+        directory
+    n_workers : Optional[int]
+        maximum number of concurrent conversions. Default is the number of
+        available CPUs
+    force : Optional[bool]
+        convert all files, even those that have an up-to-date json file
+
+    Returns
+    -------
+    list[ConversionResult]
+        status and timings of each conversion, ordered like the `.bin` files.
+        Empty if the directory does not contain `.bin` files
+
+    Raises
+    ------
+    FileNotFoundError
+        Raised if the `memray` executable cannot be found
+    ValueError
+        Raised if `n_workers` is lower than 1
+    """
+
+    # check if memray is installed
+    if shutil.which("memray") is None:
+        raise FileNotFoundError("Unable to locate 'memray' executable")
+
+    # setting up the number of workers
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if n_workers < 1:
+        raise ValueError(f"'n_workers' must be at least 1. Provided: {n_workers}")
+
+    # collecting all bin files and where their json file will be stored, bin
+    # files may have been removed once converted
+    benchmark_path = validate_path(benchmark_path, check_dir=True)
+    if not any(benchmark_path.glob("*.bin")):
+        return []
+    bin_files = sorted(get_benchmark_files(benchmark_path, ext="bin"))
+    out_dir = (
+        bin_files[0].parent
+        if out_dir is None
+        else validate_path(out_dir, check_dir=True)
+    )
+    json_files = [out_dir / f"{bin_path.stem}.json" for bin_path in bin_files]
+
+    # each worker only waits on a memray child process, so threads are
+    # enough to bound the number of concurrent memray processes
+    with ThreadPoolExecutor(max_workers=min(n_workers, len(bin_files))) as pool:
+        results = list(
+            pool.map(
+                _convert_bin_file,
+                bin_files,
+                json_files,
+                [force] * len(bin_files),
+            )
+        )
+
+    return results
+
+
+def _format_memray_time(timestamp: datetime) -> str:
+    """Formats memray timestamps into local time strings found in memray json
+    files. Newer versions of memray return timezone aware timestamps.
+
+    Parameters
+    ----------
+    timestamp : datetime
+        timestamp obtained from memray's metadata
+
+    Returns
+    -------
+    str
+        timestamp formatted with `MEMRAY_TIME_FORMAT`
+    """
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp.strftime(MEMRAY_TIME_FORMAT)
+
+
+def read_bin_metadata(bin_path: str | pathlib.Path) -> dict:
+    """Reads the `metadata` block of a memray `.bin` capture in-process with
+    memray's `FileReader`, without writing an intermediate json file.
+
+    Only the capture header is read, therefore the cost does not depend on the
+    number of recorded allocations.
+
+    Parameters
+    ----------
+    bin_path : str | pathlib.Path
+        path to memray binary capture
+
+    Returns
+    -------
+    dict
+        contents of the `metadata` block that `memray stats --json` generates
+        (pid, start/end time, total_allocations, peak_memory, etc.)
+    """
+
+    # memray is only required when reading binary captures
+    from memray import FileReader
+
+    bin_path = validate_path(bin_path)
+
+    reader = FileReader(str(bin_path))
+    try:
+        metadata = reader.metadata
+    finally:
+        reader.close()
+
+    # formatting fields the same way `memray stats --json` does
+    return {
+        "start_time": _format_memray_time(metadata.start_time),
+        "end_time": _format_memray_time(metadata.end_time),
+        "total_allocations": metadata.total_allocations,
+        "total_frames": metadata.total_frames,
+        "peak_memory": metadata.peak_memory,
+        "command_line": metadata.command_line,
+        "pid": metadata.pid,
+        "python_allocator": str(metadata.python_allocator),
+        "has_native_traces": metadata.has_native_traces,
+    }
+
+
+def iter_bin_metadata(
+    benchmark_path: str | pathlib.Path,
+) -> Iterator[tuple[pathlib.Path, dict]]:
+    """Lazily reads the metadata of all memray `.bin` captures in the benchmark
+    directory. Captures are opened one at a time, allowing large amount of
+    captures to be summarized within a single process.
+
+    Parameters
+    ----------
+    benchmark_path : str | pathlib.Path
+        path to benchmark directory containing the `.bin` files
+
+    Yields
+    ------
+    tuple[pathlib.Path, dict]
+        path to the `.bin` file and its metadata block
+    """
+
+    for bin_path in sorted(get_benchmark_files(benchmark_path, ext="bin")):
+        yield bin_path, read_bin_metadata(bin_path)
+
+
+def load_benchmark_metadata(
+    paths: list[str | pathlib.Path],
+    extra_fields: Optional[list[str]] = None,
+    decimals: Optional[int] = 3,
+) -> pd.DataFrame:
+    """Loads the `metadata` block of memray json files into a DataFrame. The
+    metadata of `.bin` captures is read with `read_bin_metadata`.
+
+    Raw values are collected into column arrays while reading the files, timestamps,
+    time durations and peak memory are then computed for all files at once.
+
+    Parameters
+    ----------
+    paths : list[str | pathlib.Path]
+        paths to memray json files or binary captures
+    extra_fields : Optional[list[str]]
+        additional metadata fields to include as columns, e.g. "command_line"
+    decimals : Optional[int]
+        number of decimals of the peak memory (MB). If None, peak memory is not
+        rounded. Default is 3
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame with one row per file with the pid, start_time, end_time,
+        time_duration (secs), total_allocations and peak_memory (MB) columns
+        followed by the extra fields
+    """
+
+    extra_fields = [] if extra_fields is None else list(extra_fields)
+    fields = [
+        "pid",
+        "start_time",
+        "end_time",
+        "total_allocations",
+        "peak_memory",
+    ] + extra_fields
+
+    # collecting raw values into column arrays
+    columns = {field: [] for field in fields}
+    for path in paths:
+        path = pathlib.Path(path)
+        if path.suffix == ".bin":
+            meta_data = read_bin_metadata(path)
+        else:
+            meta_data = load_json(path)["metadata"]
+        for field in fields:
+            columns[field].append(meta_data[field])
+
+    # parsing all timestamps and computing durations at once
+    start_time = pd.to_datetime(
+        pd.Series(columns["start_time"], dtype="object"), format=MEMRAY_TIME_FORMAT
+    )
+    end_time = pd.to_datetime(
+        pd.Series(columns["end_time"], dtype="object"), format=MEMRAY_TIME_FORMAT
+    )
+
+    # converting bytes to MegaBytes
+    peak_memory = np.asarray(columns["peak_memory"], dtype=np.int64) / 1024**2
+    if decimals is not None:
+        peak_memory = np.round(peak_memory, decimals)
+
+    metadata_df = pd.DataFrame(
+        {
+            "pid": np.asarray(columns["pid"], dtype=np.int64),
+            "start_time": start_time,
+            "end_time": end_time,
+            "time_duration": (end_time - start_time).dt.total_seconds(),
+            "total_allocations": np.asarray(
+                columns["total_allocations"], dtype=np.int64
+            ),
+            "peak_memory": peak_memory,
+        }
+    )
+    for field in extra_fields:
+        metadata_df[field] = columns[field]
+
+    return metadata_df
+
+
+# table shapes, keyed on (path, exact) and invalidated by size and mtime
+_shape_cache: dict[tuple[str, bool], tuple[int, int, tuple]] = {}
+
+
+def read_table_shape(
+    path: pathlib.Path, exact: Optional[bool] = False
+) -> tuple[Optional[int], Optional[int]]:
+    """Reads the number of rows and columns of a data file without loading its
+    contents. Parquet files are read from their footer, sqlite files from their
+    schema where the number of rows is the number of rows of the largest table
+    and the number of columns is the total amount of columns across all tables.
+    Shapes are cached until the file's size or modification time changes.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        path to parquet or sqlite file
+    exact : Optional[bool]
+        count the rows of sqlite tables with COUNT(*), which scans every table.
+        By default the largest rowid is read from the table's b-tree, which
+        over-reports the rows of tables with deleted rows. Default is False
+
+    Returns
+    -------
+    tuple[Optional[int], Optional[int]]
+        number of rows and columns, None if the file type is not supported
+    """
+
+    path = pathlib.Path(path)
+    ext = path.suffix.replace(".", "")
+    if ext not in ("parquet", "sqlite"):
+        return None, None
+
+    stat = path.stat()
+    key = (str(path.resolve()), bool(exact))
+    cached = _shape_cache.get(key)
+    if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+
+    if ext == "parquet":
+        import pyarrow.parquet as pq
+
+        metadata = pq.read_metadata(path)
+        shape = (metadata.num_rows, metadata.num_columns)
+
+    else:
+        n_rows, n_columns = 0, 0
+        with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as conn:
+            tables = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table'"
+                )
+            ]
+            for table in tables:
+                n_columns += len(
+                    conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+                )
+
+                # max rowid is read from the table's b-tree instead of a full scan,
+                # WITHOUT ROWID tables have no rowid and are counted
+                count = None
+                if not exact:
+                    try:
+                        count = conn.execute(
+                            f'SELECT MAX(rowid) FROM "{table}"'
+                        ).fetchone()
+                    except sqlite3.OperationalError:
+                        pass
+                if count is None:
+                    count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()
+                n_rows = max(n_rows, count[0] or 0)
+        shape = (n_rows, n_columns)
+
+    _shape_cache[key] = (stat.st_size, stat.st_mtime_ns, shape)
+    return shape
+
+
+class InputSizeIndex:
+    """Index containing the file size, number of rows and number of columns of the
+    input data files used in the benchmarks. The index is persisted in a json
+    sidecar file and files that did not change since they were last indexed are
+    not opened again.
+
+    Parameters
+    ----------
+    sidecar_path : str | pathlib.Path
+        path to the json sidecar file. It is loaded if it exists
+    """
+
+    def __init__(self, sidecar_path: str | pathlib.Path) -> None:
+        self.sidecar_path = pathlib.Path(sidecar_path).resolve()
+        self.entries: dict[str, dict] = {}
+        if self.sidecar_path.exists():
+            with open(self.sidecar_path, mode="r", encoding="utf-8") as contents:
+                self.entries = json.load(contents)
+
+    def update(
+        self,
+        data_dir: str | pathlib.Path,
+        data_ext: str,
+        name_fn: Optional[Callable[[pathlib.Path], str]] = None,
+        recursive: Optional[bool] = False,
+    ) -> pd.DataFrame:
+        """Indexes all data files within the data directory and saves the sidecar.
+
+        Parameters
+        ----------
+        data_dir : str | pathlib.Path
+            directory where the data files are located
+        data_ext : str
+            extension of the data files, e.g. "parquet" or "sqlite"
+        name_fn : Optional[Callable[[pathlib.Path], str]]
+            function that returns the input name of a data file. Default is the
+            file's stem
+        recursive : Optional[bool]
+            search the data directory recursively
+
+        Returns
+        -------
+        pd.DataFrame
+            all indexed inputs
+        """
+
+        data_dir = validate_path(data_dir, check_dir=True)
+        data_ext = data_ext.strip().replace(".", "")
+        name_fn = (lambda path: path.stem) if name_fn is None else name_fn
+
+        pattern = f"*.{data_ext}"
+        data_files = data_dir.rglob(pattern) if recursive else data_dir.glob(pattern)
+        for data_file in data_files:
+            name = name_fn(data_file)
+            stat = data_file.stat()
+
+            # skipping files that have not changed since they were indexed
+            entry = self.entries.get(name)
+            if (
+                entry is not None
+                and entry["path"] == str(data_file)
+                and entry["size_bytes"] == stat.st_size
+                and entry["mtime_ns"] == stat.st_mtime_ns
+            ):
+                continue
+
+            n_rows, n_columns = read_table_shape(data_file)
+            self.entries[name] = {
+                "path": str(data_file),
+                "size_bytes": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "file_size": round(stat.st_size / 1024**2, 3),
+                "n_rows": n_rows,
+                "n_columns": n_columns,
+            }
+
+        self.save()
+        return self.to_frame()
+
+    def save(self) -> None:
+        """Writes the index into the json sidecar file"""
+        with open(self.sidecar_path, mode="w", encoding="utf-8") as stream:
+            json.dump(self.entries, stream, indent=4)
+
+    def file_sizes(self) -> dict[str, float]:
+        """Returns the file size (MB) of each input, following the format of the
+        `file_size.json` files
+
+        Returns
+        -------
+        dict[str, float]
+            input names mapped to their file size in MB
+        """
+        return {name: entry["file_size"] for name, entry in self.entries.items()}
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns the index as a DataFrame
+
+        Returns
+        -------
+        pd.DataFrame
+            DataFrame with the input_data_name, file_size (MB), n_rows and
+            n_columns columns
+        """
+        columns = ["input_data_name", "file_size", "n_rows", "n_columns"]
+        return pd.DataFrame(
+            [
+                [name, entry["file_size"], entry["n_rows"], entry["n_columns"]]
+                for name, entry in self.entries.items()
+            ],
+            columns=columns,
+        ).astype({"n_rows": "Int64", "n_columns": "Int64"})
+
+    def merge(
+        self,
+        profile_df: pd.DataFrame,
+        on: Optional[str] = "input_data_name",
+        match_prefix: Optional[bool] = False,
+    ) -> pd.DataFrame:
+        """Adds the file size, number of rows and number of columns of each input
+        into a benchmark profile
+
+        Parameters
+        ----------
+        profile_df : pd.DataFrame
+            benchmark profile
+        on : Optional[str]
+            column of the profile containing the input names
+        match_prefix : Optional[bool]
+            match profile inputs with indexed inputs that start with the same name,
+            the shortest indexed name is used if multiple inputs match
+
+        Returns
+        -------
+        pd.DataFrame
+            benchmark profile with the file_size, n_rows and n_columns columns.
+            Inputs that are not indexed have missing values
+        """
+
+        sizes_df = self.to_frame().rename(columns={"input_data_name": "_index_name"})
+
+        # mapping each unique profile input to its indexed name
+        names = sorted(self.entries)
+        index_names = {}
+        for key in profile_df[on].dropna().unique():
+            if not match_prefix:
+                index_names[key] = key if key in self.entries else None
+                continue
+            lower = bisect.bisect_left(names, key)
+            upper = bisect.bisect_left(names, f"{key}{chr(0x10FFFF)}", lo=lower)
+            found = names[lower:upper]
+            index_names[key] = min(found, key=len) if len(found) > 0 else None
+
+        # previous size columns are replaced
+        profile_df = profile_df.drop(
+            columns=[
+                col for col in ["file_size", "n_rows", "n_columns"] if col in profile_df
+            ]
+        )
+        return (
+            profile_df.assign(_index_name=profile_df[on].map(index_names))
+            .merge(sizes_df, on="_index_name", how="left")
+            .drop(columns="_index_name")
+        )
+
+
+def parquet_to_arrow(
+    parquet_path: str | pathlib.Path,
+    arrow_path: str | pathlib.Path,
+    batch_size: Optional[int] = 65_536,
+    force: Optional[bool] = False,
+) -> pathlib.Path:
+    """Converts a parquet file into an uncompressed Arrow IPC (Feather v2) file
+    that can be memory-mapped. The parquet file is read one record batch at a
+    time and the conversion is skipped if the Arrow file is newer than the parquet
+    file.
+
+    Parameters
+    ----------
+    parquet_path : str | pathlib.Path
+        path to parquet file
+    arrow_path : str | pathlib.Path
+        path to the Arrow IPC file
+    batch_size : Optional[int]
+        number of rows converted at a time
+    force : Optional[bool]
+        convert even if the Arrow file is up to date
+
+    Returns
+    -------
+    pathlib.Path
+        path to the Arrow IPC file
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet_path = validate_path(parquet_path)
+    arrow_path = pathlib.Path(arrow_path).resolve()
+    if (
+        not force
+        and arrow_path.exists()
+        and arrow_path.stat().st_mtime_ns >= parquet_path.stat().st_mtime_ns
+    ):
+        return arrow_path
+
+    # written into a temporary file, an interrupted conversion is not reused
+    tmp_path = arrow_path.with_name(f"{arrow_path.name}.tmp")
+    parquet_file = pq.ParquetFile(parquet_path)
+    with pa.OSFile(str(tmp_path), "wb") as sink:
+        with pa.ipc.new_file(sink, parquet_file.schema_arrow) as writer:
+            for batch in parquet_file.iter_batches(batch_size=batch_size):
+                writer.write_batch(batch)
+    tmp_path.replace(arrow_path)
+
+    return arrow_path
+
+
+def open_arrow(arrow_path: str | pathlib.Path, columns: Optional[list[str]] = None):
+    """Opens an Arrow IPC file memory-mapped. Column buffers point into the mapped
+    file, therefore no data is copied and pages are only read when accessed.
+
+    Parameters
+    ----------
+    arrow_path : str | pathlib.Path
+        path to the Arrow IPC file
+    columns : Optional[list[str]]
+        columns to select. Default is all columns
+
+    Returns
+    -------
+    pa.Table
+        memory-mapped table
+    """
+    import pyarrow as pa
+
+    source = pa.memory_map(str(arrow_path), "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table if columns is None else table.select(columns)
+
+
+def reset_peak_rss() -> bool:
+    """Resets the peak resident set size (VmHWM) of the current process. Only
+    supported on Linux
+
+    Returns
+    -------
+    bool
+        True if the peak was reset
+    """
+    try:
+        with open("/proc/self/clear_refs", mode="w") as stream:
+            stream.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def read_peak_rss() -> Optional[float]:
+    """Reads the peak resident set size (MB) of the current process. If the peak
+    cannot be reset (see `reset_peak_rss`) it is the peak since the process
+    started
+
+    Returns
+    -------
+    Optional[float]
+        peak resident set size in MB, None if it is not available
+    """
+    try:
+        with open("/proc/self/status", mode="r") as stream:
+            for line in stream:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    # ru_maxrss is in KB on linux and in bytes on macOS
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024**2 if os.uname().sysname == "Darwin" else max_rss / 1024
@@ -0,0 +1,283 @@
+"""
+Module: control_pipelines.py
+
+Description:
+The `control_pipelines.py` module contains the step graphs of the pycytominer
+control pipelines found in `all-benchmarks/control/`. Each function returns the
+steps executed by the respective memray script, allowing the pipelines to be
+benchmarked with the `BenchmarkRunner`.
+
+Work the memray scripts execute outside of tracking is done by the steps' `prepare`
+functions before tracking starts, e.g. the platemap is loaded from
+`StepContext.info["platemap_path"]` into `StepContext.info["platemap"]`. When the
+runner passes DataFrames between steps (memory mode) `StepContext.output_file` is
+None and pycytominer returns the processed DataFrame instead of writing it. Inputs
+are obtained with `StepContext.profiles_input`, which also converts memory-mapped
+Arrow inputs.
+"""
+
+import dataclasses
+
+import pandas as pd
+
+from .benchmark_runner import BenchmarkStep, StepContext
+
+# operations to perform for feature selection
+FEATURE_SELECT_OPS = [
+    "variance_threshold",
+    "correlation_threshold",
+    "blocklist",
+]
+
+# columns used to join platemaps with the profiles
+JOIN_ON = ["Metadata_well_position", "Image_Metadata_Well"]
+
+# columns to remove prior to single-cell aggregation via cameron's method
+CAMERON_UNWANTED_AGGREGATE_COLS = {"Object", "Parent", "Site", "Image"}
+
+# site column renamed to avoid identifying it as a feature
+SITE_RENAME = {"Image_Metadata_Site": "Metadata_Site"}
+
+# metadata columns moved to the front of the NF1 single-cell annotated profiles,
+# starting at this position
+NF1_FRONT_COLUMNS = ["Metadata_Well", "Metadata_Site", "Metadata_number_of_singlecells"]
+NF1_FRONT_POSITION = 2
+
+
+def load_platemap(context: StepContext) -> StepContext:
+    """Loads the platemap found in `info["platemap_path"]` into `info["platemap"]`
+    before tracking starts"""
+    info = {**context.info, "platemap": pd.read_csv(context.info["platemap_path"])}
+    return dataclasses.replace(context, info=info)
+
+
+def load_camerons_strata(context: StepContext) -> StepContext:
+    """Loads the feature selected profiles and infers the metadata columns used
+    as strata by Cameron's method (`info["strata"]`) before tracking starts"""
+    from pycytominer.cyto_utils import infer_cp_features, load_profiles
+
+    feature_select_df = load_profiles(context.profiles_input())
+    strata = [
+        col
+        for col in infer_cp_features(feature_select_df, metadata=True)
+        if all(unwanted not in col for unwanted in CAMERON_UNWANTED_AGGREGATE_COLS)
+    ]
+    return dataclasses.replace(
+        context,
+        profiles=feature_select_df,
+        info={**context.info, "strata": strata},
+    )
+
+
+def aggregate_step(context: StepContext) -> pd.DataFrame:
+    """Creates bulk profiles by computing the median of each well"""
+    from pycytominer import aggregate
+
+    return aggregate(
+        population_df=context.profiles_input(),
+        operation="median",
+        strata=["Image_Metadata_Plate", "Image_Metadata_Well"],
+        output_file=context.output_file,
+        output_type="parquet",
+    )
+
+
+def annotate_step(context: StepContext) -> pd.DataFrame:
+    """Adds platemap metadata into the profiles"""
+    from pycytominer import annotate
+
+    return annotate(
+        profiles=context.profiles_input(),
+        platemap=context.info["platemap"],
+        join_on=JOIN_ON,
+        output_file=context.output_file,
+        output_type="parquet",
+    )
+
+
+def rename_site_step(context: StepContext) -> pd.DataFrame:
+    """Renames the site column to avoid identifying it as a feature"""
+    profile_df = context.profiles_input()
+    if isinstance(profile_df, str):
+        profile_df = pd.read_parquet(profile_df)
+    profile_df = profile_df.rename(columns=SITE_RENAME)
+    if context.output_file is not None:
+        profile_df.to_parquet(context.output_file, index=False)
+    return profile_df
+
+
+def nf1_rename_site_step(context: StepContext) -> pd.DataFrame:
+    """Renames the site column and moves the well, site and single-cell count
+    metadata to the front of the annotated profiles, as the NF1 single-cell script
+    does before saving them"""
+    profile_df = context.profiles_input()
+    if isinstance(profile_df, str):
+        profile_df = pd.read_parquet(profile_df)
+    profile_df = profile_df.rename(columns=SITE_RENAME)
+    front_cols = [col for col in NF1_FRONT_COLUMNS if col in profile_df.columns]
+    other_cols = [col for col in profile_df.columns if col not in front_cols]
+    profile_df = profile_df[
+        other_cols[:NF1_FRONT_POSITION] + front_cols + other_cols[NF1_FRONT_POSITION:]
+    ]
+    if context.output_file is not None:
+        profile_df.to_parquet(context.output_file, index=False)
+    return profile_df
+
+
+def normalize_step(context: StepContext) -> pd.DataFrame:
+    """Standardizes the profiles. Samples used for normalization are obtained from
+    `StepContext.info["normalize_samples"]`, default is all samples"""
+    from pycytominer import normalize
+
+    return normalize(
+        profiles=context.profiles_input(),
+        method="standardize",
+        samples=context.info.get("normalize_samples", "all"),
+        output_file=context.output_file,
+        output_type="parquet",
+    )
+
+
+def feature_select_step(context: StepContext) -> pd.DataFrame:
+    """Removes features with low variance, high correlation or blocklisted"""
+    from pycytominer import feature_select
+
+    return feature_select(
+        context.profiles_input(),
+        operation=FEATURE_SELECT_OPS,
+        output_file=context.output_file,
+        output_type="parquet",
+    )
+
+
+def camerons_aggregate_step(context: StepContext) -> pd.DataFrame:
+    """Creates bulk profiles from the feature selected single-cell profiles while
+    retaining the metadata (Cameron's method). The strata are obtained from
+    `StepContext.info["strata"]`, see `load_camerons_strata`"""
+    from pycytominer import aggregate
+
+    return aggregate(
+        population_df=context.profiles_input(),
+        operation="median",
+        strata=context.info["strata"],
+        output_file=context.output_file,
+        output_type="parquet",
+    )
+
+
+def cfret_single_cell_steps() -> list[BenchmarkStep]:
+    """Steps of `memray_1.single_cell_processing.py` (CFReT control)
+
+    Returns
+    -------
+    list[BenchmarkStep]
+        annotate -> rename site -> normalize -> feature_select
+    """
+    return [
+        BenchmarkStep(
+            "annotate",
+            annotate_step,
+            output_suffix="sc_annotated",
+            preload=True,
+            prepare=load_platemap,
+        ),
+        BenchmarkStep(
+            "rename_site",
+            rename_site_step,
+            depends_on="annotate",
+            output_suffix="sc_annotated",
+            tracked=False,
+        ),
+        BenchmarkStep(
+            "normalize",
+            normalize_step,
+            depends_on="rename_site",
+            output_suffix="sc_normalized",
+        ),
+        BenchmarkStep(
+            "feature_select",
+            feature_select_step,
+            depends_on="normalize",
+            output_suffix="sc_feature_selected",
+        ),
+    ]
+
+
+def nf1_bulk_steps() -> list[BenchmarkStep]:
+    """Steps of `memray_1.pycytominer_bulk_pipelines.py` (NF1 control)
+
+    Returns
+    -------
+    list[BenchmarkStep]
+        aggregate -> annotate -> normalize -> feature_select
+    """
+    return [
+        BenchmarkStep("aggregate", aggregate_step, output_suffix="bulk", preload=True),
+        BenchmarkStep(
+            "annotate",
+            annotate_step,
+            depends_on="aggregate",
+            output_suffix="bulk_annotated",
+            prepare=load_platemap,
+        ),
+        BenchmarkStep(
+            "normalize",
+            normalize_step,
+            depends_on="annotate",
+            output_suffix="bulk_normalized",
+        ),
+        BenchmarkStep(
+            "feature_select",
+            feature_select_step,
+            depends_on="normalize",
+            output_suffix="bulk_feature_selected",
+        ),
+    ]
+
+
+def nf1_single_cell_steps() -> list[BenchmarkStep]:
+    """Steps of `memray_2.pycytominer_singlecell_pipelines.py` (NF1 control)
+
+    Returns
+    -------
+    list[BenchmarkStep]
+        annotate -> rename site -> normalize -> feature_select -> aggregate. The
+        annotated profiles are returned by annotate and saved by the untracked
+        rename site step, after the metadata columns are reordered
+    """
+    return [
+        BenchmarkStep(
+            "annotate",
+            annotate_step,
+            output_suffix="sc_annotated",
+            preload=True,
+            returns_output=True,
+            prepare=load_platemap,
+        ),
+        BenchmarkStep(
+            "rename_site",
+            nf1_rename_site_step,
+            depends_on="annotate",
+            output_suffix="sc_annotated",
+            tracked=False,
+        ),
+        BenchmarkStep(
+            "normalize",
+            normalize_step,
+            depends_on="rename_site",
+            output_suffix="sc_normalized",
+        ),
+        BenchmarkStep(
+            "feature_select",
+            feature_select_step,
+            depends_on="normalize",
+            output_suffix="sc_feature_selected",
+        ),
+        BenchmarkStep(
+            "aggregate",
+            camerons_aggregate_step,
+            depends_on="feature_select",
+            output_suffix="bulk_camerons_method",
+            prepare=load_camerons_strata,
+        ),
+    ]
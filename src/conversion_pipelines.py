@@ -0,0 +1,443 @@
+"""
+Module: conversion_pipelines.py
+
+Description:
+The `conversion_pipelines.py` module benchmarks the conversion of CellProfiler
+sqlite files into single-cell parquet files as a pipeline step. The compartment
+tables are joined with the image table in sqlite and the result is read in chunks
+that are written as parquet row groups, therefore peak memory depends on the
+chunk and row group sizes rather than on the plate size. The buffered row groups
+are Arrow tables allocated from pyarrow's memory pool, which memray does not
+track, therefore configurations are compared on the `peak_rss` recorded by the
+runner rather than on the memray `peak_memory`.
+
+Conversions are swept over chunk sizes, compression codecs and row group sizes,
+each configuration is recorded as a variant of the `sqlite_to_parquet` step within
+the benchmark profile. `conversion_payoff` weighs the cost of converting a plate
+against the time saved by processing the parquet file instead of the sqlite file.
+"""
+
+import itertools
+import pathlib
+import sqlite3
+from contextlib import closing
+from functools import partial
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .benchmark_runner import BenchmarkRunner, BenchmarkStep, StepContext
+from .benchmark_store import BenchmarkStore, normalize_columns
+from .streaming_pipelines import COMPARTMENTS
+
+# name of the conversion step within the benchmark profiles
+CONVERSION_STEP = "sqlite_to_parquet"
+
+# columns identifying a single object across the compartment tables
+MERGE_COLUMNS = ["TableNumber", "ImageNumber"]
+
+# columns linking the cytoplasm to its parent cell and nucleus, following
+# pycytominer's `SingleCells` default linking columns
+PARENT_COLUMNS = {
+    "Cells": "Cytoplasm_Parent_Cells",
+    "Nuclei": "Cytoplasm_Parent_Nuclei",
+}
+
+# default number of rows read from sqlite at a time
+DEFAULT_CHUNK_SIZE = 50_000
+
+# default number of rows of each parquet row group
+DEFAULT_ROW_GROUP_SIZE = 100_000
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> list[str]:
+    """Returns the column names of a sqlite table"""
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def single_cell_query(
+    conn: sqlite3.Connection,
+    image_table: Optional[str] = "Image",
+    compartments: Optional[list[str]] = None,
+) -> str:
+    """Creates the query joining the compartment tables with the image table,
+    one row per cell.
+
+    Compartments are joined on `MERGE_COLUMNS` and the cytoplasm's parent columns
+    (`PARENT_COLUMNS`) when the cytoplasm table contains them, otherwise on the
+    objects' `ObjectNumber`. Identifier columns are only selected once.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        connection to the sqlite file
+    image_table : Optional[str]
+        name of the image table. Default is "Image"
+    compartments : Optional[list[str]]
+        compartment tables, the first one is used as the base of the join.
+        Default is `COMPARTMENTS` with the cytoplasm first
+
+    Returns
+    -------
+    str
+        SQL query
+
+    Raises
+    ------
+    ValueError
+        Raised if a table is missing from the sqlite file
+    """
+    if compartments is None:
+        compartments = ["Cytoplasm"] + [
+            compartment for compartment in COMPARTMENTS if compartment != "Cytoplasm"
+        ]
+    tables = [
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    ]
+    missing = [table for table in [image_table] + compartments if table not in tables]
+    if len(missing) > 0:
+        raise ValueError(f"Tables not found in sqlite file: {missing}")
+
+    # identifiers are selected from the image table and the base compartment
+    base = compartments[0]
+    base_columns = _table_columns(conn, base)
+    select = [f'"{image_table}"."{col}"' for col in _table_columns(conn, image_table)]
+    select += [f'"{base}"."{col}"' for col in base_columns if col not in MERGE_COLUMNS]
+
+    joins = []
+    for compartment in compartments[1:]:
+        link = PARENT_COLUMNS.get(compartment) if base == "Cytoplasm" else None
+        link = link if link in base_columns else "ObjectNumber"
+        conditions = [
+            f'"{base}"."{col}" = "{compartment}"."{col}"' for col in MERGE_COLUMNS
+        ] + [f'"{base}"."{link}" = "{compartment}"."ObjectNumber"']
+        joins.append(f'JOIN "{compartment}" ON {" AND ".join(conditions)}')
+        select += [
+            f'"{compartment}"."{col}"'
+            for col in _table_columns(conn, compartment)
+            if col not in MERGE_COLUMNS + ["ObjectNumber"]
+        ]
+
+    image_conditions = [
+        f'"{base}"."{col}" = "{image_table}"."{col}"' for col in MERGE_COLUMNS
+    ]
+    joins.append(f'JOIN "{image_table}" ON {" AND ".join(image_conditions)}')
+    return f'SELECT {", ".join(select)} FROM "{base}" {" ".join(joins)}'
+
+
+def sqlite_to_parquet(
+    sqlite_path: str | pathlib.Path,
+    parquet_path: str | pathlib.Path,
+    chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+    compression: Optional[str] = "snappy",
+    row_group_size: Optional[int] = DEFAULT_ROW_GROUP_SIZE,
+    image_table: Optional[str] = "Image",
+    compartments: Optional[list[str]] = None,
+) -> pathlib.Path:
+    """Converts a CellProfiler sqlite file into a single-cell parquet file.
+
+    The joined cells are read `chunk_size` rows at a time and buffered until a
+    row group is complete. Up to `row_group_size - 1` rows remain buffered after
+    a row group is written and a new chunk is added to them, therefore at most
+    `row_group_size - 1 + chunk_size` rows are held in memory.
+
+    Parameters
+    ----------
+    sqlite_path : str | pathlib.Path
+        path to the sqlite file
+    parquet_path : str | pathlib.Path
+        path of the parquet file
+    chunk_size : Optional[int]
+        number of rows read from sqlite at a time
+    compression : Optional[str]
+        parquet compression codec, e.g. "snappy", "zstd", "lz4" or "none"
+    row_group_size : Optional[int]
+        number of rows of each parquet row group
+    image_table : Optional[str]
+        name of the image table. Default is "Image"
+    compartments : Optional[list[str]]
+        compartment tables, see `single_cell_query`
+
+    Returns
+    -------
+    pathlib.Path
+        path of the parquet file
+
+    Raises
+    ------
+    ValueError
+        Raised if the chunk or row group size is not a positive integer
+    """
+    for name, value in [("chunk_size", chunk_size), ("row_group_size", row_group_size)]:
+        if not isinstance(value, int) or value <= 0:
+            raise ValueError(f"'{name}' must be a positive integer. Provided: {value}")
+
+    sqlite_path = pathlib.Path(sqlite_path).resolve(strict=True)
+    parquet_path = pathlib.Path(parquet_path)
+
+    writer = None
+    buffered, n_buffered = [], 0
+    try:
+        with closing(sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True)) as conn:
+            query = single_cell_query(conn, image_table, compartments)
+            chunks = pd.read_sql_query(query, conn, chunksize=chunk_size)
+            for chunk_df in itertools.chain(chunks, [None]):
+                if chunk_df is not None:
+                    if writer is None:
+                        # columns that are empty in the first chunk are stored as floats
+                        schema = pa.Schema.from_pandas(chunk_df, preserve_index=False)
+                        schema = pa.schema(
+                            [
+                                (
+                                    field.with_type(pa.float64())
+                                    if pa.types.is_null(field.type)
+                                    else field
+                                )
+                                for field in schema
+                            ]
+                        )
+                        writer = pq.ParquetWriter(
+                            parquet_path, schema, compression=compression
+                        )
+                    buffered.append(
+                        pa.Table.from_pandas(
+                            chunk_df, schema=writer.schema, preserve_index=False
+                        )
+                    )
+                    n_buffered += len(chunk_df)
+
+                # complete row groups are written, the remainder is kept
+                last = chunk_df is None
+                if n_buffered >= row_group_size or (last and n_buffered > 0):
+                    table = pa.concat_tables(buffered)
+                    n_written = (
+                        n_buffered if last else n_buffered - n_buffered % row_group_size
+                    )
+                    writer.write_table(
+                        table.slice(0, n_written), row_group_size=row_group_size
+                    )
+                    buffered = [table.slice(n_written)]
+                    n_buffered -= n_written
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return parquet_path
+
+
+def conversion_step(
+    context: StepContext,
+    chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+    compression: Optional[str] = "snappy",
+    row_group_size: Optional[int] = DEFAULT_ROW_GROUP_SIZE,
+) -> None:
+    """Converts the plate's sqlite file into the step's parquet output
+
+    Raises
+    ------
+    ValueError
+        Raised if the runner passes DataFrames between steps (memory mode)
+    """
+    if context.output_file is None:
+        raise ValueError("Conversion steps require the runner's chain_mode='file'")
+    sqlite_to_parquet(
+        context.profiles_input(),
+        context.output_file,
+        chunk_size=chunk_size,
+        compression=compression,
+        row_group_size=row_group_size,
+        image_table=context.info.get("image_table", "Image"),
+    )
+
+
+def conversion_variant(chunk_size: int, compression: str, row_group_size: int) -> str:
+    """Returns the variant label of a conversion configuration, e.g.
+    "chunk50000_zstd_rg100000"
+    """
+    return f"chunk{chunk_size}_{compression}_rg{row_group_size}"
+
+
+def conversion_steps(
+    chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+    compression: Optional[str] = "snappy",
+    row_group_size: Optional[int] = DEFAULT_ROW_GROUP_SIZE,
+) -> list[BenchmarkStep]:
+    """Returns the conversion step of a single configuration. The output is
+    `{plate}_converted_{variant}.parquet`
+
+    Parameters
+    ----------
+    chunk_size : Optional[int]
+        number of rows read from sqlite at a time
+    compression : Optional[str]
+        parquet compression codec
+    row_group_size : Optional[int]
+        number of rows of each parquet row group
+
+    Returns
+    -------
+    list[BenchmarkStep]
+        conversion step
+    """
+    return [
+        BenchmarkStep(
+            CONVERSION_STEP,
+            partial(
+                conversion_step,
+                chunk_size=chunk_size,
+                compression=compression,
+                row_group_size=row_group_size,
+            ),
+            output_suffix="converted",
+            variant=conversion_variant(chunk_size, compression, row_group_size),
+        )
+    ]
+
+
+def run_conversion_sweep(
+    plate_info: dict,
+    output_dir: str | pathlib.Path,
+    benchmark_dir: str | pathlib.Path,
+    chunk_sizes: Optional[list[int]] = None,
+    compressions: Optional[list[str]] = None,
+    row_group_sizes: Optional[list[int]] = None,
+    dataset: Optional[str] = "conversion",
+    store: Optional[BenchmarkStore] = None,
+    **runner_kwargs,
+) -> pd.DataFrame:
+    """Benchmarks the sqlite to parquet conversion of each plate for every
+    combination of chunk size, compression codec and row group size
+
+    Parameters
+    ----------
+    plate_info : dict
+        plate names mapped to their information, containing the path to the
+        sqlite file under the runner's `profile_key`
+    output_dir : str | pathlib.Path
+        directory where the parquet files are written
+    benchmark_dir : str | pathlib.Path
+        directory where the memray captures are written
+    chunk_sizes : Optional[list[int]]
+        numbers of rows read from sqlite at a time. Default is
+        [`DEFAULT_CHUNK_SIZE`]
+    compressions : Optional[list[str]]
+        parquet compression codecs. Default is ["snappy"]
+    row_group_sizes : Optional[list[int]]
+        numbers of rows of each row group. Default is [`DEFAULT_ROW_GROUP_SIZE`]
+    dataset : Optional[str]
+        dataset name of the benchmark profile. Default is "conversion"
+    store : Optional[BenchmarkStore]
+        if provided, the benchmark profile is appended into the store
+    **runner_kwargs
+        additional `BenchmarkRunner` arguments, e.g. `repetitions`
+
+    Returns
+    -------
+    pd.DataFrame
+        benchmark profile with one row per plate and configuration, where the
+        configuration is recorded in `variant` (see `conversion_parameters`),
+        the size of the parquet file in `output_size` (MB) and the peak memory
+        including pyarrow's buffers in `peak_rss` (MB)
+    """
+    chunk_sizes = [DEFAULT_CHUNK_SIZE] if chunk_sizes is None else chunk_sizes
+    compressions = ["snappy"] if compressions is None else compressions
+    row_group_sizes = (
+        [DEFAULT_ROW_GROUP_SIZE] if row_group_sizes is None else row_group_sizes
+    )
+
+    profiles = []
+    for chunk_size, compression, row_group_size in itertools.product(
+        chunk_sizes, compressions, row_group_sizes
+    ):
+        runner = BenchmarkRunner(
+            conversion_steps(chunk_size, compression, row_group_size),
+            dataset=dataset,
+            output_dir=output_dir,
+            benchmark_dir=benchmark_dir,
+            **runner_kwargs,
+        )
+        profiles.append(runner.run(plate_info, store=store))
+
+    return pd.concat(profiles, ignore_index=True)
+
+
+def conversion_parameters(profile_df: pd.DataFrame) -> pd.DataFrame:
+    """Adds the chunk_size, compression and row_group_size of each conversion,
+    parsed from its variant label, to a benchmark profile
+
+    Parameters
+    ----------
+    profile_df : pd.DataFrame
+        benchmark profile containing conversion records
+
+    Returns
+    -------
+    pd.DataFrame
+        profile with the conversion parameters, NaN for other records
+    """
+    configs = profile_df["variant"].str.extract(r"^chunk(\d+)_(.+)_rg(\d+)$")
+    return profile_df.assign(
+        chunk_size=pd.to_numeric(configs[0]).astype("Int64"),
+        compression=configs[1],
+        row_group_size=pd.to_numeric(configs[2]).astype("Int64"),
+    )
+
+
+def conversion_payoff(
+    conversion_df: pd.DataFrame,
+    sqlite_df: pd.DataFrame,
+    parquet_df: pd.DataFrame,
+    metric: Optional[str] = "time_duration",
+) -> pd.DataFrame:
+    """Weighs the cost of converting each plate against the time saved by
+    processing its parquet file instead of its sqlite file (e.g. the
+    `aggregate_cells` step of the cell-health benchmarks)
+
+    Parameters
+    ----------
+    conversion_df : pd.DataFrame
+        benchmark profile of the conversions, see `run_conversion_sweep`
+    sqlite_df : pd.DataFrame
+        benchmark profile of the step(s) processing the sqlite files
+    parquet_df : pd.DataFrame
+        benchmark profile of the same step(s) processing the converted files
+    metric : Optional[str]
+        compared time metric. Default is "time_duration"
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per plate and conversion variant with the median conversion,
+        sqlite and parquet times, the `saving` of a single run (sqlite time minus
+        conversion and parquet times) and `break_even_runs`, the number of runs on
+        the parquet file after which the conversion pays for itself (NaN if
+        parquet is not faster)
+    """
+
+    # plates are matched by name, repeated records are summarized by their median
+    def plate_times(profile_df: pd.DataFrame, by: list[str], name: str) -> pd.DataFrame:
+        profile_df = normalize_columns(profile_df)
+        return (
+            profile_df.groupby(by + ["process_name"])[metric]
+            .median()
+            .groupby(by)
+            .sum()
+            .rename(name)
+            .reset_index()
+        )
+
+    payoff_df = (
+        plate_times(conversion_df, ["input_data_name", "variant"], "conversion_time")
+        .merge(plate_times(sqlite_df, ["input_data_name"], "sqlite_time"))
+        .merge(plate_times(parquet_df, ["input_data_name"], "parquet_time"))
+    )
+    gain = payoff_df["sqlite_time"] - payoff_df["parquet_time"]
+    payoff_df["saving"] = gain - payoff_df["conversion_time"]
+    payoff_df["break_even_runs"] = np.where(
+        gain > 0, np.ceil(payoff_df["conversion_time"] / gain.where(gain > 0)), np.nan
+    )
+    return payoff_df.sort_values(["input_data_name", "saving"], ascending=[True, False])
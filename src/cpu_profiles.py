@@ -0,0 +1,269 @@
+"""
+Module: cpu_profiles.py
+
+Description:
+The `cpu_profiles.py` module captures where the CPU time of a benchmarked step is
+spent. Steps are profiled with `cProfile` (standard library) or `pyinstrument`
+(sampling, optional dependency) and the profile is written as collapsed stacks
+(`frame;frame;frame value` lines, the input format of flame graph tools) next to
+the step's memray capture, where frames are normalized into
+`package/module:function:line` and values are self times in microseconds.
+
+The collapsed stacks of all plates are loaded into a table joined to the benchmark
+profile and aggregated into the functions with the largest self time of each step.
+"""
+
+import cProfile
+import pathlib
+import pstats
+from typing import Optional
+
+import pandas as pd
+
+from .allocation_profiles import normalize_location
+
+# supported CPU profilers
+CPU_PROFILERS = ["cprofile", "pyinstrument"]
+
+
+def _cprofile_frame(key: tuple) -> str:
+    """Normalizes a cProfile function key `(path, line, function)`, built-in
+    functions have no path and are kept as they are"""
+    path, line, function = key
+    if path == "~":
+        return function
+    return normalize_location(f"{function}:{path}:{line}")
+
+
+def _pyinstrument_frame(identifier: str) -> Optional[str]:
+    """Normalizes a pyinstrument frame identifier `function\\x00path\\x00line`,
+    synthetic frames (e.g. `[self]`) are None"""
+    function, _, rest = identifier.split("\x01")[0].partition("\x00")
+    path, _, line = rest.partition("\x00")
+    if path == "":
+        return None
+    return normalize_location(f"{function}:{path}:{line}")
+
+
+class CPUProfiler:
+    """Context manager that profiles the CPU time of the code it wraps.
+
+    `cProfile` measures every call, therefore its stacks only contain two frames:
+    each function's self time is split by caller (`caller;function`). Tracing
+    every call adds a fixed cost per call, which inflates the times of steps that
+    make many small Python calls (e.g. pandas overhead) relative to steps spending
+    their time in compiled code, therefore its times are larger than the step's
+    `time_duration` and only the shares between functions should be compared.
+    `pyinstrument` samples the full call stack every `interval` seconds, with an
+    overhead that does not depend on the number of calls.
+
+    Parameters
+    ----------
+    profiler : str
+        "cprofile" or "pyinstrument"
+    interval : float
+        sampling interval (secs) of pyinstrument
+
+    Raises
+    ------
+    ValueError
+        Raised if the profiler is not supported
+    """
+
+    def __init__(self, profiler: str = "cprofile", interval: float = 0.001) -> None:
+        if profiler not in CPU_PROFILERS:
+            raise ValueError(
+                f"'profiler' must be one of {CPU_PROFILERS}. Provided: {profiler}"
+            )
+        self.profiler = profiler
+        self.interval = interval
+        self._profile = None
+
+    def __enter__(self) -> "CPUProfiler":
+        if self.profiler == "pyinstrument":
+            # pyinstrument is only required when it is used
+            from pyinstrument import Profiler
+
+            self._profile = Profiler(interval=self.interval)
+            self._profile.start()
+        else:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.profiler == "pyinstrument":
+            self._profile.stop()
+        else:
+            self._profile.disable()
+
+    def stacks(self) -> dict[str, float]:
+        """Returns the self time (secs) of each collapsed stack
+
+        Returns
+        -------
+        dict[str, float]
+            collapsed stacks `frame;frame` mapped to their self time
+        """
+        stacks = {}
+        if self.profiler == "pyinstrument":
+            for identifiers, duration in self._profile.last_session.frame_records:
+                frames = [_pyinstrument_frame(identifier) for identifier in identifiers]
+                stack = ";".join(frame for frame in frames if frame is not None)
+                stacks[stack] = stacks.get(stack, 0.0) + duration
+            return stacks
+
+        # the profiler's own `disable` call is not part of the profiled code
+        for key, (_, _, self_time, _, callers) in pstats.Stats(
+            self._profile
+        ).stats.items():
+            if key[2] == "<method 'disable' of '_lsprof.Profiler' objects>":
+                continue
+            function = _cprofile_frame(key)
+            if len(callers) == 0:
+                stacks[function] = stacks.get(function, 0.0) + self_time
+            for caller, (_, _, caller_time, _) in callers.items():
+                stack = f"{_cprofile_frame(caller)};{function}"
+                stacks[stack] = stacks.get(stack, 0.0) + caller_time
+        return stacks
+
+    def write_collapsed(self, path: str | pathlib.Path) -> pathlib.Path:
+        """Writes the profile as collapsed stacks with self times in microseconds
+
+        Parameters
+        ----------
+        path : str | pathlib.Path
+            path of the collapsed stack file
+
+        Returns
+        -------
+        pathlib.Path
+            path of the collapsed stack file
+        """
+        path = pathlib.Path(path)
+        with open(path, mode="w", encoding="utf-8") as stream:
+            for stack, self_time in self.stacks().items():
+                value = round(self_time * 1e6)
+                if value > 0:
+                    stream.write(f"{stack} {value}\n")
+        return path
+
+
+def load_collapsed(path: str | pathlib.Path) -> pd.DataFrame:
+    """Loads a collapsed stack file
+
+    Parameters
+    ----------
+    path : str | pathlib.Path
+        path to the collapsed stack file
+
+    Returns
+    -------
+    pd.DataFrame
+        stack, the function at the top of the stack and its self time (secs)
+    """
+    records = []
+    with open(path, encoding="utf-8") as stream:
+        for line in stream:
+            stack, _, value = line.rstrip("\n").rpartition(" ")
+            records.append(
+                {
+                    "stack": stack,
+                    "function": stack.rsplit(";", 1)[-1],
+                    "self_time": int(value) / 1e6,
+                }
+            )
+    return pd.DataFrame(records, columns=["stack", "function", "self_time"])
+
+
+def load_cpu_profiles(
+    profile_df: pd.DataFrame,
+    benchmark_dir: str | pathlib.Path,
+    keys: Optional[list[str]] = None,
+) -> pd.DataFrame:
+    """Loads the CPU profiles of every benchmarked step in a profile, one row per
+    step and function
+
+    Parameters
+    ----------
+    profile_df : pd.DataFrame
+        benchmark profile containing the `cpu_profile_file` column
+    benchmark_dir : str | pathlib.Path
+        directory where the collapsed stack files are stored
+    keys : Optional[list[str]]
+        profile columns added to the functions. Default is dataset,
+        input_data_name, process_name, variant and time_duration when found
+
+    Returns
+    -------
+    pd.DataFrame
+        profile keys, function, self_time (secs) and self_share, the function's
+        share of the step's profiled time. Steps without CPU profiles are skipped
+    """
+    if keys is None:
+        keys = [
+            col
+            for col in [
+                "dataset",
+                "input_data_name",
+                "process_name",
+                "variant",
+                "time_duration",
+            ]
+            if col in profile_df.columns
+        ]
+    benchmark_dir = pathlib.Path(benchmark_dir)
+
+    function_dfs = []
+    for record in profile_df.dropna(subset=["cpu_profile_file"]).to_dict("records"):
+        stacks_df = load_collapsed(benchmark_dir / record["cpu_profile_file"])
+        function_df = stacks_df.groupby("function", as_index=False)["self_time"].sum()
+        function_df["self_share"] = (
+            function_df["self_time"] / function_df["self_time"].sum()
+        )
+        for key in reversed(keys):
+            function_df.insert(0, key, record[key])
+        function_dfs.append(function_df)
+
+    if len(function_dfs) == 0:
+        return pd.DataFrame(columns=keys + ["function", "self_time", "self_share"])
+    return pd.concat(function_dfs, ignore_index=True)
+
+
+def top_functions(
+    functions_df: pd.DataFrame,
+    by: Optional[list[str]] = None,
+    top_n: Optional[int] = 10,
+) -> pd.DataFrame:
+    """Aggregates the functions of each step across plates and ranks them by self
+    time
+
+    Parameters
+    ----------
+    functions_df : pd.DataFrame
+        CPU profile functions, see `load_cpu_profiles`
+    by : Optional[list[str]]
+        columns that define a step. Default is `process_name`
+    top_n : Optional[int]
+        number of functions kept per step. Default is 10, None keeps all of them
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per step and function with the total self_time (secs), the
+        median self_share across plates, the number of plates where the function
+        was found and the rank by self time (1 is the largest)
+    """
+    by = ["process_name"] if by is None else by
+    top_df = functions_df.groupby(by + ["function"], as_index=False).agg(
+        self_time=("self_time", "sum"),
+        self_share=("self_share", "median"),
+        n_plates=("input_data_name", "nunique"),
+    )
+    top_df["rank"] = (
+        top_df.groupby(by)["self_time"].rank(method="min", ascending=False).astype(int)
+    )
+    top_df = top_df.sort_values(by + ["rank"], ignore_index=True)
+    if top_n is not None:
+        top_df = top_df.loc[top_df["rank"] <= top_n].reset_index(drop=True)
+    return top_df
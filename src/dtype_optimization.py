@@ -0,0 +1,269 @@
+"""
+Module: dtype_optimization.py
+
+Description:
+The `dtype_optimization.py` module benchmarks the control pipelines with
+memory-optimized profile dtypes. CellProfiler features are loaded as float64 and
+metadata as strings, where a `downcast` step added at the root of a step graph
+converts features to float32 and string metadata to categoricals before any other
+step processes them.
+
+The downcast steps are recorded as the "float32" variant, therefore the memory and
+time deltas against the original pipeline are obtained with `compare_variants`.
+Lower precision changes the results, the outputs of both variants are compared by
+`output_drift` to verify the drift stays within a tolerance.
+"""
+
+import dataclasses
+import pathlib
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .benchmark_runner import (
+    DEFAULT_VARIANT,
+    BenchmarkRunner,
+    BenchmarkStep,
+    StepContext,
+)
+from .benchmark_store import BenchmarkStore
+from .streaming_pipelines import infer_features
+
+# variant of the steps processing downcast profiles
+DOWNCAST_VARIANT = "float32"
+
+# steps whose outputs are compared against the original pipeline
+DRIFT_STEPS = ["normalize", "feature_select"]
+
+
+def downcast_profiles(
+    profile_df: pd.DataFrame,
+    float_dtype: Optional[str] = "float32",
+    max_category_ratio: Optional[float] = 0.5,
+) -> pd.DataFrame:
+    """Downcasts the feature columns of a profile to a smaller float dtype and its
+    string metadata columns to categoricals
+
+    Parameters
+    ----------
+    profile_df : pd.DataFrame
+        profile containing CellProfiler features
+    float_dtype : Optional[str]
+        dtype of the feature columns. Default is "float32"
+    max_category_ratio : Optional[float]
+        string metadata columns are only converted if their number of unique
+        values divided by the number of rows is below this ratio, columns with
+        mostly unique values (e.g. file paths) take more memory as categoricals
+
+    Returns
+    -------
+    pd.DataFrame
+        downcast profile
+    """
+    features = infer_features(profile_df.columns)
+    dtypes = {
+        col: float_dtype for col in profile_df[features].select_dtypes("float").columns
+    }
+    for col in profile_df.columns.difference(features):
+        values = profile_df[col]
+        if not (
+            pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)
+        ):
+            continue
+        if values.nunique() < max_category_ratio * max(len(values), 1):
+            dtypes[col] = "category"
+    return profile_df.astype(dtypes)
+
+
+def downcast_step(context: StepContext) -> pd.DataFrame:
+    """Downcasts features to float32 and string metadata to categoricals"""
+    profile_df = context.profiles_input()
+    if isinstance(profile_df, str):
+        profile_df = pd.read_parquet(profile_df)
+    profile_df = downcast_profiles(profile_df)
+    if context.output_file is not None:
+        profile_df.to_parquet(context.output_file, index=False)
+    return profile_df
+
+
+def downcast_steps(
+    steps: list[BenchmarkStep], variant: Optional[str] = DOWNCAST_VARIANT
+) -> list[BenchmarkStep]:
+    """Adds a `downcast` step at the root of a step graph. Steps without
+    dependencies are moved after it and all steps are labelled with the variant,
+    which is appended to non-default variants (e.g. "streaming_float32")
+
+    Parameters
+    ----------
+    steps : list[BenchmarkStep]
+        original steps, e.g. `nf1_single_cell_steps()`
+    variant : Optional[str]
+        variant of the downcast steps. Default is "float32"
+
+    Returns
+    -------
+    list[BenchmarkStep]
+        downcast -> original steps
+    """
+    downcast = BenchmarkStep(
+        "downcast",
+        downcast_step,
+        output_suffix="downcast",
+        preload=True,
+        variant=variant,
+    )
+    return [downcast] + [
+        dataclasses.replace(
+            step,
+            depends_on="downcast" if step.depends_on is None else step.depends_on,
+            variant=(
+                variant
+                if step.variant == DEFAULT_VARIANT
+                else f"{step.variant}_{variant}"
+            ),
+        )
+        for step in steps
+    ]
+
+
+def output_drift(
+    reference_path: str | pathlib.Path,
+    candidate_path: str | pathlib.Path,
+    tolerance: Optional[float] = 1e-4,
+) -> dict:
+    """Measures the numerical drift between the features of two outputs of the
+    same step
+
+    Parameters
+    ----------
+    reference_path : str | pathlib.Path
+        output of the original step
+    candidate_path : str | pathlib.Path
+        output of the downcast step
+    tolerance : Optional[float]
+        largest absolute difference allowed between features
+
+    Returns
+    -------
+    dict
+        the number of compared features and rows, the features only found in one
+        of the outputs, the max absolute difference and the feature where it
+        occurs, the number of values differing by more than the tolerance and
+        `within_tolerance`, which also requires both outputs to contain the same
+        features and rows
+    """
+    reference_df = pd.read_parquet(reference_path)
+    candidate_df = pd.read_parquet(candidate_path)
+
+    # feature selection may keep different features with lower precision
+    reference_features = infer_features(reference_df.columns)
+    candidate_features = infer_features(candidate_df.columns)
+    features = [col for col in reference_features if col in candidate_features]
+    same_shape = len(reference_df) == len(candidate_df) and len(features) == len(
+        reference_features
+    ) == len(candidate_features)
+
+    # per feature maximum, NaN values are ignored
+    feature_diff = np.full(len(features), np.nan)
+    n_exceeding = 0
+    if len(reference_df) == len(candidate_df) and len(reference_df) > 0:
+        diff = np.abs(
+            reference_df[features].to_numpy(np.float64)
+            - candidate_df[features].to_numpy(np.float64)
+        )
+        with np.errstate(invalid="ignore"):
+            n_exceeding = int((diff > tolerance).sum())
+        feature_diff = np.fmax.reduce(diff, axis=0)
+    compared = not np.isnan(feature_diff).all()
+
+    return {
+        "n_features": len(features),
+        "n_rows": len(reference_df),
+        "missing_features": sorted(set(reference_features) - set(candidate_features)),
+        "extra_features": sorted(set(candidate_features) - set(reference_features)),
+        "max_abs_diff": float(np.nanmax(feature_diff)) if compared else np.nan,
+        "worst_feature": features[np.nanargmax(feature_diff)] if compared else None,
+        "n_exceeding": n_exceeding,
+        "within_tolerance": same_shape and compared and n_exceeding == 0,
+    }
+
+
+def run_downcast_comparison(
+    steps: list[BenchmarkStep],
+    plate_info: dict,
+    dataset: str,
+    output_dir: str | pathlib.Path,
+    benchmark_dir: str | pathlib.Path,
+    tolerance: Optional[float] = 1e-4,
+    drift_steps: Optional[list[str]] = None,
+    store: Optional[BenchmarkStore] = None,
+    **runner_kwargs,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Benchmarks a step graph with the original and the downcast dtypes and
+    measures the drift of their outputs
+
+    Parameters
+    ----------
+    steps : list[BenchmarkStep]
+        original steps, e.g. `nf1_single_cell_steps()`
+    plate_info : dict
+        plate names mapped to their information
+    dataset : str
+        dataset name of the benchmark profile
+    output_dir : str | pathlib.Path
+        directory where the step outputs are written
+    benchmark_dir : str | pathlib.Path
+        directory where the memray captures are written
+    tolerance : Optional[float]
+        largest absolute difference allowed between the features of both outputs
+    drift_steps : Optional[list[str]]
+        steps whose outputs are compared. Default is `DRIFT_STEPS`, steps missing
+        from the graph or without written outputs are skipped
+    store : Optional[BenchmarkStore]
+        if provided, the benchmark profiles are appended into the store
+    **runner_kwargs
+        additional `BenchmarkRunner` arguments, e.g. `chain_mode`
+
+    Returns
+    -------
+    tuple[pd.DataFrame, pd.DataFrame]
+        benchmark profile of both variants, see `compare_variants` for the memory
+        and time deltas, and the drift of each plate and step, see `output_drift`
+    """
+    drift_steps = DRIFT_STEPS if drift_steps is None else drift_steps
+    runners = [
+        BenchmarkRunner(
+            variant_steps,
+            dataset=dataset,
+            output_dir=output_dir,
+            benchmark_dir=benchmark_dir,
+            **runner_kwargs,
+        )
+        for variant_steps in [steps, downcast_steps(steps)]
+    ]
+    profile_df = pd.concat(
+        [runner.run(plate_info, store=store) for runner in runners],
+        ignore_index=True,
+    )
+
+    records = []
+    reference_steps = {step.name: step for step in runners[0].steps}
+    candidate_steps = {step.name: step for step in runners[1].steps}
+    for plate in plate_info:
+        for name in drift_steps:
+            if name not in reference_steps:
+                continue
+            reference_path = runners[0].output_path(plate, reference_steps[name])
+            candidate_path = runners[1].output_path(plate, candidate_steps[name])
+            if not (reference_path.exists() and candidate_path.exists()):
+                continue
+            records.append(
+                {
+                    "input_data_name": plate,
+                    "process_name": name,
+                    **output_drift(reference_path, candidate_path, tolerance),
+                }
+            )
+
+    return profile_df, pd.DataFrame(records)
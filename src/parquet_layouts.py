@@ -0,0 +1,443 @@
+"""
+Module: parquet_layouts.py
+
+Description:
+The `parquet_layouts.py` module benchmarks the storage layout of the intermediate
+parquet files written between the steps of the control pipelines (e.g.
+`_sc_annotated`, `_sc_normalized`, `_sc_feature_selected` and `_bulk_*`). Each
+artifact is written and read back with every combination of compression codec,
+dictionary encoding, float32 downcasting and row group size, recording the file
+size, the write and read times and the peak memory of both legs. The results are
+used to recommend a layout for each type of artifact.
+
+pyarrow allocates its buffers from its own memory pool (mimalloc or jemalloc),
+which memray does not track, therefore layouts are ranked by the increase of the
+peak resident set size of each leg. The memray peaks only include pyarrow's
+buffers when the sweep runs with `ARROW_DEFAULT_MEMORY_POOL=system`, which must be
+set before pyarrow is imported.
+"""
+
+import gc
+import itertools
+import pathlib
+import time
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .benchmark_utils import read_bin_metadata, read_peak_rss, reset_peak_rss
+
+# output suffixes of the control pipelines, longest first so that e.g.
+# "bulk_normalized" is matched before "bulk"
+ARTIFACT_TYPES = [
+    "sc_feature_selected",
+    "bulk_feature_selected",
+    "bulk_camerons_method",
+    "sc_normalized",
+    "bulk_normalized",
+    "sc_annotated",
+    "bulk_annotated",
+    "bulk",
+]
+
+# compression codecs compared by default
+LAYOUT_CODECS = ["snappy", "zstd", "lz4", "none"]
+
+# columns describing a layout
+LAYOUT_COLUMNS = ["compression", "use_dictionary", "float32", "row_group_size"]
+
+# metrics used to rank layouts and their default weights
+# file_size and peak memories are in MB, times are in seconds
+DEFAULT_WEIGHTS = {
+    "file_size": 1.0,
+    "write_time": 1.0,
+    "read_time": 1.0,
+    "write_peak_rss": 1.0,
+    "read_peak_rss": 1.0,
+}
+
+# lowest value of each metric used when comparing layouts, differences below the
+# measurement resolution (e.g. a few milliseconds) do not change the ranking
+METRIC_FLOORS = {
+    "file_size": 1.0,
+    "write_time": 0.05,
+    "read_time": 0.05,
+    "write_peak_memory": 10.0,
+    "read_peak_memory": 10.0,
+    "write_peak_rss": 10.0,
+    "read_peak_rss": 10.0,
+}
+
+
+def artifact_type(path: str | pathlib.Path) -> Optional[str]:
+    """Identifies the type of an intermediate output from its file name, e.g.
+    "Plate_3_sc_normalized.parquet" is "sc_normalized"
+
+    Parameters
+    ----------
+    path : str | pathlib.Path
+        path to the parquet file
+
+    Returns
+    -------
+    Optional[str]
+        artifact type, None if the file is not a known intermediate output
+    """
+    name = pathlib.Path(path).stem
+    for suffix in ARTIFACT_TYPES:
+        if f"_{suffix}" in name:
+            return suffix
+    return None
+
+
+def layout_label(
+    compression: str,
+    use_dictionary: bool,
+    float32: bool,
+    row_group_size: Optional[int],
+) -> str:
+    """Returns the label of a layout, e.g. "zstd_dict_f32_rg100000"
+
+    Parameters
+    ----------
+    compression : str
+        compression codec
+    use_dictionary : bool
+        dictionary encoding is enabled
+    float32 : bool
+        float64 columns are downcast to float32
+    row_group_size : Optional[int]
+        number of rows of each row group, None for pyarrow's default
+
+    Returns
+    -------
+    str
+        layout label
+    """
+    return "_".join(
+        [
+            compression,
+            "dict" if use_dictionary else "plain",
+            "f32" if float32 else "f64",
+            "rgdefault" if row_group_size is None else f"rg{row_group_size}",
+        ]
+    )
+
+
+def _release_memory() -> None:
+    """Returns the memory cached by the garbage collector and pyarrow's pool, so
+    that it is not reused by the next measured run"""
+    import pyarrow as pa
+
+    gc.collect()
+    pa.default_memory_pool().release_unused()
+
+
+def _untracked_runs(func: Callable, repetitions: int) -> tuple[float, float]:
+    """Returns the median wall time (secs) and the median increase of the peak
+    resident set size (MB) of untracked runs of a function. The peak increase is
+    NaN if the peak cannot be reset"""
+    times = np.zeros(repetitions)
+    peaks = np.full(repetitions, np.nan)
+    for idx in range(repetitions):
+        _release_memory()
+        reset = reset_peak_rss()
+        baseline = read_peak_rss()
+        start = time.perf_counter()
+        func()
+        times[idx] = time.perf_counter() - start
+        if reset and baseline is not None:
+            peaks[idx] = read_peak_rss() - baseline
+    peak_rss = np.nan if np.isnan(peaks).all() else round(np.nanmedian(peaks), 3)
+    return float(np.median(times)), peak_rss
+
+
+def _tracked_peak(func: Callable, capture_path: pathlib.Path) -> float:
+    """Executes a function with memray and returns its peak memory (MB)"""
+
+    # memray is only required when benchmarks are executed
+    import memray
+
+    # memray does not overwrite existing captures
+    capture_path.unlink(missing_ok=True)
+    with memray.Tracker(str(capture_path)):
+        func()
+    return round(read_bin_metadata(capture_path)["peak_memory"] / 1024**2, 3)
+
+
+def benchmark_layout(
+    profile_df: pd.DataFrame,
+    output_path: str | pathlib.Path,
+    capture_prefix: str | pathlib.Path,
+    compression: Optional[str] = "snappy",
+    use_dictionary: Optional[bool] = True,
+    float32: Optional[bool] = False,
+    row_group_size: Optional[int] = None,
+    repetitions: Optional[int] = 3,
+) -> dict:
+    """Writes a profile with a layout and reads it back, the same way the control
+    steps write their outputs and the next step loads them.
+
+    Times and peak resident set size increases are the median of `repetitions`
+    untracked runs of each leg. The memray peak memory is measured in a separate
+    tracked run so that times do not include memray's overhead, it only includes
+    pyarrow's buffers with `ARROW_DEFAULT_MEMORY_POOL=system` (see module
+    description).
+
+    Parameters
+    ----------
+    profile_df : pd.DataFrame
+        loaded profile
+    output_path : str | pathlib.Path
+        path of the written parquet file
+    capture_prefix : str | pathlib.Path
+        path prefix of the memray captures, `_write_benchmarks.bin` and
+        `_read_benchmarks.bin` are appended
+    compression : Optional[str]
+        compression codec, e.g. "snappy", "zstd", "lz4" or "none"
+    use_dictionary : Optional[bool]
+        enable dictionary encoding
+    float32 : Optional[bool]
+        downcast float64 columns to float32 before writing
+    row_group_size : Optional[int]
+        number of rows of each row group. Default is pyarrow's default
+    repetitions : Optional[int]
+        number of untracked runs of each leg
+
+    Returns
+    -------
+    dict
+        layout, file_size (MB), write_time and read_time (secs), the memray
+        write_peak_memory and read_peak_memory (MB) and the write_peak_rss and
+        read_peak_rss (MB), increases of the peak resident set size, NaN if the
+        peak cannot be reset (only supported on Linux)
+
+    Raises
+    ------
+    ValueError
+        Raised if the number of repetitions is not a positive integer
+    """
+    if not isinstance(repetitions, int) or repetitions <= 0:
+        raise ValueError(
+            f"'repetitions' must be a positive integer. Provided: {repetitions}"
+        )
+
+    output_path = pathlib.Path(output_path)
+    capture_prefix = str(capture_prefix)
+
+    # downcasting is not part of the measured write
+    if float32:
+        float_cols = profile_df.select_dtypes("float64").columns
+        profile_df = profile_df.astype({col: "float32" for col in float_cols})
+
+    def write():
+        profile_df.to_parquet(
+            output_path,
+            index=False,
+            compression=compression,
+            use_dictionary=use_dictionary,
+            row_group_size=row_group_size,
+        )
+
+    def read():
+        pd.read_parquet(output_path)
+
+    write_time, write_peak_rss = _untracked_runs(write, repetitions)
+    write_peak = _tracked_peak(
+        write, pathlib.Path(f"{capture_prefix}_write_benchmarks.bin")
+    )
+    read_time, read_peak_rss = _untracked_runs(read, repetitions)
+    read_peak = _tracked_peak(
+        read, pathlib.Path(f"{capture_prefix}_read_benchmarks.bin")
+    )
+
+    return {
+        "layout": layout_label(compression, use_dictionary, float32, row_group_size),
+        "compression": compression,
+        "use_dictionary": use_dictionary,
+        "float32": float32,
+        "row_group_size": row_group_size,
+        "file_size": round(output_path.stat().st_size / 1024**2, 3),
+        "write_time": write_time,
+        "read_time": read_time,
+        "write_peak_memory": write_peak,
+        "read_peak_memory": read_peak,
+        "write_peak_rss": write_peak_rss,
+        "read_peak_rss": read_peak_rss,
+    }
+
+
+def run_layout_sweep(
+    artifact_paths: list[str | pathlib.Path],
+    output_dir: str | pathlib.Path,
+    benchmark_dir: str | pathlib.Path,
+    codecs: Optional[list[str]] = None,
+    dictionary: Optional[list[bool]] = None,
+    float32: Optional[list[bool]] = None,
+    row_group_sizes: Optional[list[Optional[int]]] = None,
+    repetitions: Optional[int] = 3,
+    keep_outputs: Optional[bool] = False,
+) -> pd.DataFrame:
+    """Benchmarks every combination of layout parameters on intermediate outputs
+    of the control pipelines
+
+    Parameters
+    ----------
+    artifact_paths : list[str | pathlib.Path]
+        intermediate parquet outputs, e.g. the `*_sc_normalized.parquet` files
+        written by a `BenchmarkRunner`
+    output_dir : str | pathlib.Path
+        directory where the rewritten files are written
+    benchmark_dir : str | pathlib.Path
+        directory where the memray captures are written
+    codecs : Optional[list[str]]
+        compression codecs. Default is `LAYOUT_CODECS`
+    dictionary : Optional[list[bool]]
+        dictionary encoding settings. Default is [True, False]
+    float32 : Optional[list[bool]]
+        float32 downcasting settings. Default is [False, True]
+    row_group_sizes : Optional[list[Optional[int]]]
+        row group sizes, None is pyarrow's default. Default is
+        [None, 100_000, 10_000]
+    repetitions : Optional[int]
+        number of untracked runs of each leg
+    keep_outputs : Optional[bool]
+        keep the rewritten files. Default removes each file once benchmarked
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per artifact and layout containing the artifact's name and type,
+        its number of rows and columns and the results of `benchmark_layout`
+
+    Raises
+    ------
+    ValueError
+        Raised if the type of an artifact cannot be identified
+    """
+    codecs = LAYOUT_CODECS if codecs is None else codecs
+    dictionary = [True, False] if dictionary is None else dictionary
+    float32 = [False, True] if float32 is None else float32
+    row_group_sizes = (
+        [None, 100_000, 10_000] if row_group_sizes is None else row_group_sizes
+    )
+
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    benchmark_dir = pathlib.Path(benchmark_dir)
+    benchmark_dir.mkdir(parents=True, exist_ok=True)
+
+    records = []
+    for artifact_path in artifact_paths:
+        artifact_path = pathlib.Path(artifact_path)
+        artifact = artifact_type(artifact_path)
+        if artifact is None:
+            raise ValueError(
+                f"Unknown artifact type: {artifact_path.name}. "
+                f"File names must contain one of: {ARTIFACT_TYPES}"
+            )
+
+        print(f"Benchmarking layouts of {artifact_path.name}")
+        profile_df = pd.read_parquet(artifact_path)
+        for layout in itertools.product(codecs, dictionary, float32, row_group_sizes):
+            label = layout_label(*layout)
+            output_path = output_dir / f"{artifact_path.stem}_{label}.parquet"
+            result = benchmark_layout(
+                profile_df,
+                output_path,
+                benchmark_dir / f"{artifact_path.stem}_{label}",
+                *layout,
+                repetitions=repetitions,
+            )
+            records.append(
+                {
+                    "artifact": artifact_path.stem,
+                    "artifact_type": artifact,
+                    "n_rows": profile_df.shape[0],
+                    "n_columns": profile_df.shape[1],
+                    **result,
+                }
+            )
+            if not keep_outputs:
+                output_path.unlink()
+
+    return pd.DataFrame(records).astype({"row_group_size": "Int64"})
+
+
+def recommend_layouts(
+    layout_df: pd.DataFrame,
+    weights: Optional[dict[str, float]] = None,
+    floors: Optional[dict[str, float]] = None,
+    allow_float32: Optional[bool] = True,
+) -> pd.DataFrame:
+    """Recommends a layout for each artifact type.
+
+    Within each artifact, every metric is divided by its best (lowest) value
+    across layouts, both being raised to the metric's floor (see `METRIC_FLOORS`)
+    so that small files or sub-millisecond reads do not turn measurement noise
+    into large ratios, and the layout's score is the weighted mean of these
+    ratios, 1.0 being the best possible score. Layouts are ranked by their median
+    score across the artifacts of a type.
+
+    Parameters
+    ----------
+    layout_df : pd.DataFrame
+        results of `run_layout_sweep`
+    weights : Optional[dict[str, float]]
+        metrics mapped to their weight. Default is `DEFAULT_WEIGHTS`
+    floors : Optional[dict[str, float]]
+        metrics mapped to their lowest compared value. Default is
+        `METRIC_FLOORS`, metrics without a floor are floored at 0
+    allow_float32 : Optional[bool]
+        consider layouts that downcast to float32, which changes the stored
+        values. Default is True
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per artifact type with the recommended layout, its score, the
+        number of artifacts and the median of each metric
+
+    Raises
+    ------
+    ValueError
+        Raised if a weighted metric is not found in the results
+    """
+    weights = DEFAULT_WEIGHTS if weights is None else weights
+    floors = METRIC_FLOORS if floors is None else floors
+    missing = [metric for metric in weights if metric not in layout_df.columns]
+    if len(missing) > 0:
+        raise ValueError(f"Metrics not found in the layout results: {missing}")
+    if not allow_float32:
+        layout_df = layout_df.loc[~layout_df["float32"]]
+
+    # metrics relative to the best layout of the same artifact
+    metrics = list(weights)
+    floored = layout_df[metrics].clip(
+        lower=pd.Series({metric: floors.get(metric, 0.0) for metric in metrics}),
+        axis=1,
+    )
+    best = floored.groupby(layout_df["artifact"]).transform("min")
+    relative = floored / best.where(best > 0)
+    layout_df = layout_df.assign(
+        score=(relative * pd.Series(weights)).sum(axis=1) / sum(weights.values())
+    )
+
+    summary_df = (
+        layout_df.groupby(["artifact_type", "layout"], dropna=False)
+        .agg(
+            score=("score", "median"),
+            n_artifacts=("artifact", "nunique"),
+            **{metric: (metric, "median") for metric in metrics},
+        )
+        .reset_index()
+    )
+    layouts_df = layout_df.drop_duplicates("layout")[["layout"] + LAYOUT_COLUMNS]
+    return (
+        summary_df.sort_values("score")
+        .groupby("artifact_type", sort=False)
+        .head(1)
+        .merge(layouts_df, on="layout")
+        .sort_values("artifact_type", ignore_index=True)
+    )
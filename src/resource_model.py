@@ -0,0 +1,491 @@
+"""
+Module: resource_model.py
+
+Description:
+The `resource_model.py` module predicts the runtime, peak memory and threads of a
+pipeline step before it is executed, allowing workflow resources (e.g.
+Snakemake's `mem_mb` and `threads`) to be sized per plate instead of for the
+worst case. A log-log linear model is fitted for each dataset and process on the
+accumulated benchmark profiles, where runtime and peak memory grow as a power of
+the input's file size (and number of features when available).
+
+Benchmark profiles record the size of the plate's raw input for every step, which
+is only the actual input of the first step of each plate. Records of dependent
+steps are only used when their file size differs from the first step's.
+
+Most processes have too few records for a per-dataset fit. Predictions then use
+the process' fit pooled across datasets, and otherwise a conservative estimate
+that scales the metric per MB of input observed for the process (or for all
+processes when the process never recorded its input size) linearly with the
+file size.
+"""
+
+import math
+import pathlib
+import warnings
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .benchmark_store import BenchmarkStore, normalize_columns
+
+# benchmark store of this repository, used when no model is provided
+DEFAULT_STORE_PATH = (
+    pathlib.Path(__file__).resolve().parent.parent
+    / "all-benchmarks"
+    / "benchmark_store"
+)
+
+# predicted metrics, time_duration in seconds and peak_memory in MB
+PREDICTED_METRICS = ["time_duration", "peak_memory"]
+
+# minimum residual degrees of freedom of a fit
+MIN_DOF = 3
+
+# fits with a larger residual standard deviation (log scale) are degenerate, with
+# MIN_DOF the 90% prediction interval then spans at most about 1.8x either side
+MAX_RESIDUAL_STD = 0.25
+
+# headroom applied to the largest metric per MB of input of a ratio estimate
+RATIO_MARGIN = 1.25
+
+
+def actual_input_records(profile_df: pd.DataFrame) -> pd.DataFrame:
+    """Keeps the records whose file size is the size of the step's own input.
+
+    The first step of each plate (earliest start time) reads the plate's raw
+    input. Dependent steps recorded with the same file size as the first step
+    (e.g. normalize after aggregating a sqlite plate) are removed.
+
+    Parameters
+    ----------
+    profile_df : pd.DataFrame
+        benchmark profiles containing dataset, input_data_name, process_name,
+        start_time and file_size
+
+    Returns
+    -------
+    pd.DataFrame
+        records of steps whose file size describes their input
+    """
+    keys = ["dataset", "input_data_name"]
+    first_df = (
+        profile_df.sort_values("start_time")
+        .groupby(keys, as_index=False)
+        .head(1)[keys + ["process_name", "file_size"]]
+        .rename(columns={"process_name": "first_step", "file_size": "first_size"})
+    )
+    merged_df = profile_df.merge(first_df, on=keys, how="left")
+    keep = (merged_df["process_name"] == merged_df["first_step"]) | (
+        merged_df["file_size"] != merged_df["first_size"]
+    )
+    return profile_df.loc[keep.to_numpy()]
+
+
+@dataclass
+class _LogLinearFit:
+    """Ordinary least squares fit in log scale of a single metric"""
+
+    terms: list[str]
+    params: np.ndarray
+    xtx_inv: np.ndarray
+    residual_std: float
+    dof: int
+
+    def predict(self, values: dict, confidence: float) -> tuple[float, float, float]:
+        """Predicts a metric and its prediction interval"""
+        from scipy.stats import t
+
+        design = np.array([1.0] + [math.log(values[term]) for term in self.terms])
+        log_estimate = float(design @ self.params)
+        log_se = self.residual_std * math.sqrt(1 + design @ self.xtx_inv @ design)
+        margin = t.ppf((1 + confidence) / 2, self.dof) * log_se
+        return (
+            math.exp(log_estimate),
+            math.exp(log_estimate - margin),
+            math.exp(log_estimate + margin),
+        )
+
+
+@dataclass
+class _RatioEstimate:
+    """Metric per MB of input observed for a process"""
+
+    median: float
+    lowest: float
+    highest: float
+
+    def predict(self, file_size: float) -> tuple[float, float, float]:
+        """Scales the observed ratios with the file size, the upper bound is the
+        largest ratio with `RATIO_MARGIN` headroom"""
+        return (
+            self.median * file_size,
+            self.lowest * file_size,
+            self.highest * RATIO_MARGIN * file_size,
+        )
+
+
+@dataclass
+class ResourceModel:
+    """Per-process models of runtime, peak memory and threads fitted on benchmark
+    profiles.
+
+    For every dataset and process, and for every process benchmarked on more
+    than one dataset with all its records pooled,
+    `log(metric) = a + b * log(file_size) + c * log(n_columns)` is fitted with
+    ordinary least squares, where the number of columns is only used if it is
+    known for all the process' records and varies between them. Fits are
+    skipped with a warning when they are degenerate: the file size exponent is
+    not positive or the residual standard deviation exceeds `MAX_RESIDUAL_STD`.
+    Ratio estimates (metric per MB of input) are kept for the same groups and
+    across all processes, and are used when no fit is available.
+
+    Threads are the largest ratio of CPU time to wall time recorded for the
+    process rounded up, or 1 when no CPU time was recorded since the benchmarked
+    steps run single-threaded pandas and pycytominer code.
+
+    Attributes
+    ----------
+    min_records : int
+        minimum number of records required to fit a process, fits also require
+        `MIN_DOF` residual degrees of freedom
+    fits : dict
+        fitted models, `(dataset, process_name, metric)` mapped to the fit.
+        Pooled fits have a `None` dataset
+    ratios : dict
+        ratio estimates, `(dataset, process_name, metric)` mapped to the
+        estimate. Pooled estimates have a `None` dataset and the estimate of all
+        processes a `None` dataset and process_name
+    threads : dict
+        threads, `(dataset, process_name)` mapped to the number of threads
+    """
+
+    min_records: int = 5
+    fits: dict = field(default_factory=dict)
+    ratios: dict = field(default_factory=dict)
+    threads: dict = field(default_factory=dict)
+
+    def _fit_metric(
+        self, records_df: pd.DataFrame, metric: str, label: str
+    ) -> Optional[_LogLinearFit]:
+        """Fits a metric on the records with a known file size, None if there are
+        too few records or the fit is degenerate"""
+
+        # features are only used when known for all records and varying
+        n_columns = records_df["n_columns"]
+        terms = ["file_size"]
+        if n_columns.notna().all() and n_columns.nunique() > 1:
+            terms.append("n_columns")
+        if len(records_df) < max(self.min_records, len(terms) + 1 + MIN_DOF):
+            return None
+
+        design = np.column_stack(
+            [np.ones(len(records_df))]
+            + [np.log(records_df[term].to_numpy(np.float64)) for term in terms]
+        )
+        target = np.log(records_df[metric].to_numpy(np.float64))
+        params, *_ = np.linalg.lstsq(design, target, rcond=None)
+        dof = len(records_df) - design.shape[1]
+        residuals = target - design @ params
+        residual_std = float(np.sqrt(np.sum(residuals**2) / dof))
+
+        # degenerate fits would size resources from noise
+        if params[1] <= 0 or residual_std > MAX_RESIDUAL_STD:
+            warnings.warn(
+                f"Skipping degenerate {metric} fit of {label}: file_size exponent "
+                f"{params[1]:.3f}, residual std {residual_std:.3f}"
+            )
+            return None
+        return _LogLinearFit(
+            terms=terms,
+            params=params,
+            xtx_inv=np.linalg.pinv(design.T @ design),
+            residual_std=residual_std,
+            dof=dof,
+        )
+
+    def fit(self, profile_df: pd.DataFrame) -> "ResourceModel":
+        """Fits the models of every process found in the profile
+
+        Parameters
+        ----------
+        profile_df : pd.DataFrame
+            benchmark profiles containing dataset, input_data_name,
+            process_name, start_time, file_size (MB), time_duration and
+            peak_memory, optionally n_columns, cpu_time and wall_time
+
+        Returns
+        -------
+        ResourceModel
+            the fitted model
+
+        Raises
+        ------
+        ValueError
+            Raised if the profiles do not contain the required columns
+        """
+        self.fits, self.ratios, self.threads = {}, {}, {}
+        profile_df = normalize_columns(profile_df)
+        required = ["dataset", "input_data_name", "process_name", "start_time"]
+        missing = [
+            col
+            for col in required + ["file_size"] + PREDICTED_METRICS
+            if col not in profile_df.columns
+        ]
+        if len(missing) > 0:
+            raise ValueError(f"'profile_df' must contain the columns: {missing}")
+        for col in ["n_columns", "cpu_time", "wall_time"]:
+            if col not in profile_df.columns:
+                profile_df = profile_df.assign(**{col: np.nan})
+        profile_df = actual_input_records(profile_df)
+
+        # per dataset groups, pooled groups of processes run on several datasets
+        # and the group of all processes used by the ratio estimates
+        groups = [
+            (dataset, process_name, process_df)
+            for (dataset, process_name), process_df in profile_df.groupby(
+                ["dataset", "process_name"]
+            )
+        ]
+        groups += [
+            (None, process_name, process_df)
+            for process_name, process_df in profile_df.groupby("process_name")
+            if process_df["dataset"].nunique() > 1
+        ]
+        groups.append((None, None, profile_df))
+
+        for dataset, process_name, process_df in groups:
+            for metric in PREDICTED_METRICS:
+                records_df = process_df.loc[
+                    (process_df["file_size"] > 0) & (process_df[metric] > 0)
+                ]
+                if len(records_df) == 0:
+                    continue
+                ratios = records_df[metric] / records_df["file_size"]
+                self.ratios[(dataset, process_name, metric)] = _RatioEstimate(
+                    median=float(ratios.median()),
+                    lowest=float(ratios.min()),
+                    highest=float(ratios.max()),
+                )
+                if process_name is None:
+                    continue
+
+                label = f"'{process_name}' ({dataset or 'pooled'})"
+                fit = self._fit_metric(records_df, metric, label)
+                if fit is not None:
+                    self.fits[(dataset, process_name, metric)] = fit
+
+            if process_name is None:
+                continue
+            self.threads[(dataset, process_name)] = 1
+            parallelism = (process_df["cpu_time"] / process_df["wall_time"]).dropna()
+            if len(parallelism) > 0:
+                self.threads[(dataset, process_name)] = max(
+                    1, math.ceil(parallelism.max())
+                )
+
+        return self
+
+    @classmethod
+    def from_store(
+        cls,
+        store: Optional[BenchmarkStore] = None,
+        dataset: Optional[str | list[str]] = None,
+        min_records: Optional[int] = 5,
+    ) -> "ResourceModel":
+        """Fits the models on the profiles of a benchmark store
+
+        Parameters
+        ----------
+        store : Optional[BenchmarkStore]
+            benchmark store. Default is the store of this repository
+        dataset : Optional[str | list[str]]
+            dataset(s) used to fit the models, each dataset is fitted
+            separately and pooled with the others. Default is all datasets
+        min_records : Optional[int]
+            minimum number of records required to fit a process
+
+        Returns
+        -------
+        ResourceModel
+            the fitted model
+        """
+        store = BenchmarkStore(DEFAULT_STORE_PATH) if store is None else store
+        profile_df = store.query(
+            columns=[
+                "dataset",
+                "input_data_name",
+                "process_name",
+                "start_time",
+                "file_size",
+                "n_columns",
+                "cpu_time",
+                "wall_time",
+            ]
+            + PREDICTED_METRICS,
+            dataset=dataset,
+        )
+        return cls(min_records=min_records).fit(profile_df)
+
+    @property
+    def processes(self) -> list[tuple[str, str]]:
+        """Datasets and processes that can be predicted"""
+        return sorted(
+            (dataset, process_name)
+            for dataset, process_name in self.threads
+            if dataset is not None
+        )
+
+    def predict(
+        self,
+        process_name: str,
+        file_size: float,
+        n_features: Optional[int] = None,
+        confidence: Optional[float] = 0.9,
+        dataset: Optional[str] = None,
+    ) -> dict:
+        """Predicts the runtime, peak memory and threads of a process. Metrics
+        use the first available of the dataset's fit, the pooled fit, the
+        dataset's ratio estimate, the pooled ratio estimate and the ratio
+        estimate of all processes
+
+        Parameters
+        ----------
+        process_name : str
+            name of the process, e.g. "normalize"
+        file_size : float
+            size of the input in MB
+        n_features : Optional[int]
+            number of columns of the input. Required by models fitted with it
+        confidence : Optional[float]
+            confidence level of the prediction intervals of fitted metrics.
+            Default is 0.9
+        dataset : Optional[str]
+            dataset of the benchmarked process. Default uses the records of all
+            datasets
+
+        Returns
+        -------
+        dict
+            estimated `time_duration` (secs) and `peak_memory` (MB) with their
+            `_lower` and `_upper` bounds and the `_method` used ("fit",
+            "pooled_fit", "ratio", "pooled_ratio" or "all_processes_ratio"),
+            `mem_mb`, the upper bound of the peak memory rounded up, and
+            `threads`
+
+        Raises
+        ------
+        ValueError
+            Raised if the process was not benchmarked (for the dataset) or the
+            number of features is required but not provided
+        """
+        datasets = [fitted for fitted, name in self.processes if name == process_name]
+        if len(datasets) == 0:
+            raise ValueError(
+                f"'{process_name}' was not benchmarked. "
+                f"Available processes: {self.processes}"
+            )
+        if dataset is not None and dataset not in datasets:
+            raise ValueError(
+                f"'{process_name}' was not benchmarked for '{dataset}', "
+                f"'dataset' must be one of {datasets}"
+            )
+
+        # processes of a single dataset were not pooled
+        if dataset is None and len(datasets) == 1:
+            dataset = datasets[0]
+        sources = [
+            ("fit", self.fits, (dataset, process_name)),
+            ("pooled_fit", self.fits, (None, process_name)),
+            ("ratio", self.ratios, (dataset, process_name)),
+            ("pooled_ratio", self.ratios, (None, process_name)),
+            ("all_processes_ratio", self.ratios, (None, None)),
+        ]
+        if dataset is None:
+            sources = [
+                source for source in sources if source[0] not in ("fit", "ratio")
+            ]
+
+        prediction = {"dataset": dataset, "process_name": process_name}
+        for metric in PREDICTED_METRICS:
+            estimate = lower = upper = method = None
+            for method, models, key in sources:
+                model = models.get(key + (metric,))
+                if model is None:
+                    continue
+                if isinstance(model, _RatioEstimate):
+                    estimate, lower, upper = model.predict(file_size)
+                    break
+                if "n_columns" in model.terms and n_features is None:
+                    raise ValueError(
+                        f"'n_features' is required to predict '{process_name}'"
+                    )
+                estimate, lower, upper = model.predict(
+                    {"file_size": file_size, "n_columns": n_features}, confidence
+                )
+                break
+            else:
+                method = None
+            prediction.update(
+                {
+                    metric: estimate,
+                    f"{metric}_lower": lower,
+                    f"{metric}_upper": upper,
+                    f"{metric}_method": method,
+                }
+            )
+
+        upper_memory = prediction["peak_memory_upper"]
+        prediction["mem_mb"] = None if upper_memory is None else math.ceil(upper_memory)
+        prediction["threads"] = self.threads.get(
+            (dataset, process_name), self.threads.get((None, process_name), 1)
+        )
+        return prediction
+
+
+# model fitted on the repository's store, created on first use
+_default_model: Optional[ResourceModel] = None
+
+
+def predict_resources(
+    process_name: str,
+    file_size: float,
+    n_features: Optional[int] = None,
+    model: Optional[ResourceModel] = None,
+    confidence: Optional[float] = 0.9,
+    dataset: Optional[str] = None,
+) -> dict:
+    """Predicts the runtime, peak memory and threads of a process with prediction
+    intervals, e.g. to set Snakemake's `resources: mem_mb` and `threads` before a
+    plate is processed
+
+    Parameters
+    ----------
+    process_name : str
+        name of the process, e.g. "normalize"
+    file_size : float
+        size of the input in MB
+    n_features : Optional[int]
+        number of columns of the input, used by processes fitted with it
+    model : Optional[ResourceModel]
+        fitted model. Default is a model fitted on the repository's benchmark
+        store
+    confidence : Optional[float]
+        confidence level of the prediction intervals. Default is 0.9
+    dataset : Optional[str]
+        dataset of the benchmarked process. Default uses the records of all
+        datasets
+
+    Returns
+    -------
+    dict
+        see `ResourceModel.predict`
+    """
+    global _default_model
+    if model is None:
+        if _default_model is None:
+            _default_model = ResourceModel.from_store()
+        model = _default_model
+    return model.predict(process_name, file_size, n_features, confidence, dataset)
@@ -0,0 +1,288 @@
+"""
+Module: resource_sampler.py
+
+Description:
+The `resource_sampler.py` module contains the `ResourceSampler`, a child process
+that records the resident set size (RSS), unique set size (USS), CPU usage and I/O
+bytes of a process at a fixed interval. Memray only reports the peak memory of a
+benchmarked step, the samples show whether the peak is a short spike or a plateau.
+
+Samples are read from the `/proc` filesystem, therefore sampling is only supported
+on Linux.
+"""
+
+import multiprocessing
+import os
+import pathlib
+import time
+from multiprocessing.connection import Connection
+from multiprocessing.synchronize import Event
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# columns of the sample buffer, memory in MB and I/O in bytes
+SAMPLE_COLUMNS = [
+    "elapsed",
+    "rss",
+    "uss",
+    "cpu_percent",
+    "read_bytes",
+    "write_bytes",
+]
+
+
+def _read_cpu_time(proc_path: pathlib.Path, clock_ticks: int) -> float:
+    """Reads the user and system CPU time (seconds) of a process"""
+    try:
+        stat = (proc_path / "stat").read_text()
+    except OSError:
+        return np.nan
+
+    # the process name is wrapped in parentheses and can contain spaces
+    fields = stat[stat.rindex(")") + 2 :].split()
+    return (int(fields[11]) + int(fields[12])) / clock_ticks
+
+
+def _read_rss(proc_path: pathlib.Path, page_size: int) -> float:
+    """Reads the resident set size (MB) of a process"""
+    try:
+        statm = (proc_path / "statm").read_text().split()
+    except OSError:
+        return np.nan
+    return int(statm[1]) * page_size / 1024**2
+
+
+def _read_uss(proc_path: pathlib.Path) -> float:
+    """Reads the unique set size (MB) of a process, the private pages that would
+    be released if the process exits"""
+    uss = 0
+    try:
+        with open(proc_path / "smaps_rollup", mode="r") as stream:
+            for line in stream:
+                if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                    uss += int(line.split()[1])
+    except OSError:
+        return np.nan
+    return uss / 1024
+
+
+def _read_io(proc_path: pathlib.Path) -> tuple[float, float]:
+    """Reads the bytes read from and written to storage by a process"""
+    counters = {}
+    try:
+        with open(proc_path / "io", mode="r") as stream:
+            for line in stream:
+                name, value = line.split(":")
+                counters[name] = int(value)
+    except OSError:
+        return np.nan, np.nan
+    return counters.get("read_bytes", np.nan), counters.get("write_bytes", np.nan)
+
+
+def _sample_loop(
+    pid: int,
+    interval: float,
+    capacity: int,
+    ready: Event,
+    stop: Event,
+    connection: Connection,
+) -> None:
+    """Takes samples of a process until `stop` is set and sends them through the
+    connection. Executed in the sampler's child process"""
+    proc_path = pathlib.Path(f"/proc/{pid}")
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    buffer = np.full((capacity, len(SAMPLE_COLUMNS)), np.nan)
+    size = 0
+
+    start = time.perf_counter()
+    cpu_time, cpu_clock = _read_cpu_time(proc_path, clock_ticks), start
+    ready.set()
+    while True:
+        stopped = stop.wait(interval)
+
+        # cpu usage is computed between consecutive samples
+        now = time.perf_counter()
+        current_cpu_time = _read_cpu_time(proc_path, clock_ticks)
+        cpu_percent = (
+            (current_cpu_time - cpu_time) / (now - cpu_clock) * 100
+            if now > cpu_clock
+            else np.nan
+        )
+        cpu_time, cpu_clock = current_cpu_time, now
+
+        # the buffer doubles its capacity when full
+        if size == len(buffer):
+            grown = np.full((len(buffer) * 2, len(SAMPLE_COLUMNS)), np.nan)
+            grown[:size] = buffer
+            buffer = grown
+        buffer[size] = (
+            now - start,
+            _read_rss(proc_path, page_size),
+            _read_uss(proc_path),
+            cpu_percent,
+            *_read_io(proc_path),
+        )
+        size += 1
+        if stopped:
+            break
+
+    connection.send(buffer[:size])
+    connection.close()
+
+
+class ResourceSampler:
+    """Samples the resources used by a process from a child process.
+
+    Sampling runs in a separate process, therefore its allocations are not
+    tracked by memray and its CPU time is not included in the sampled process.
+    Samples are stored in a preallocated numpy buffer that doubles its capacity
+    when full and are sent back when sampling stops. The sampler is used as a
+    context manager, which must be entered before memray tracking starts so the
+    child process is not followed:
+
+    >>> with ResourceSampler(interval=0.05) as sampler:
+    ...     with memray.Tracker("step.bin"):
+    ...         run_step()
+    >>> samples_df = sampler.to_frame()
+
+    Parameters
+    ----------
+    interval : Optional[float]
+        seconds between samples. Default is 0.05 (50 ms)
+    pid : Optional[int]
+        id of the sampled process. Default is the current process
+    capacity : Optional[int]
+        initial number of samples that fit in the buffer
+
+    Raises
+    ------
+    ValueError
+        Raised if the interval is not positive
+    """
+
+    def __init__(
+        self,
+        interval: Optional[float] = 0.05,
+        pid: Optional[int] = None,
+        capacity: Optional[int] = 4096,
+    ) -> None:
+        if interval <= 0:
+            raise ValueError(f"'interval' must be positive. Provided: {interval}")
+
+        self.interval = interval
+        self.pid = os.getpid() if pid is None else pid
+        self.proc_path = pathlib.Path(f"/proc/{self.pid}")
+        self.capacity = capacity
+        self._samples = np.empty((0, len(SAMPLE_COLUMNS)))
+        self._process: Optional[multiprocessing.Process] = None
+        self._connection: Optional[Connection] = None
+        self._stop: Optional[Event] = None
+
+    def __enter__(self) -> "ResourceSampler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Starts sampling in a child process, previous samples are discarded.
+        Returns once the first measurement was taken"""
+        if not self.proc_path.exists():
+            raise FileNotFoundError(
+                f"Process {self.pid} cannot be sampled, /proc is not available"
+            )
+
+        # spawned processes do not inherit the threads of the sampled process
+        mp_context = multiprocessing.get_context("spawn")
+        self._samples = np.empty((0, len(SAMPLE_COLUMNS)))
+        self._connection, child_connection = mp_context.Pipe(duplex=False)
+        ready, self._stop = mp_context.Event(), mp_context.Event()
+        self._process = mp_context.Process(
+            target=_sample_loop,
+            args=(
+                self.pid,
+                self.interval,
+                self.capacity,
+                ready,
+                self._stop,
+                child_connection,
+            ),
+            daemon=True,
+        )
+        self._process.start()
+        child_connection.close()
+        ready.wait()
+
+    def stop(self) -> None:
+        """Stops sampling after taking a final sample"""
+        if self._process is None:
+            return
+        self._stop.set()
+        self._samples = self._connection.recv()
+        self._connection.close()
+        self._process.join()
+        self._process, self._connection, self._stop = None, None, None
+
+    @property
+    def samples(self) -> np.ndarray:
+        """Samples taken so far, one row per sample following `SAMPLE_COLUMNS`.
+        Samples are available once sampling stops"""
+        return self._samples
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns the samples as a DataFrame
+
+        Returns
+        -------
+        pd.DataFrame
+            one row per sample with the `SAMPLE_COLUMNS`, where elapsed is in
+            seconds since sampling started
+        """
+        return pd.DataFrame(self.samples.copy(), columns=SAMPLE_COLUMNS)
+
+
+def load_samples(
+    profile_df: pd.DataFrame,
+    benchmark_dir: str | pathlib.Path,
+    keys: Optional[list[str]] = None,
+) -> pd.DataFrame:
+    """Loads the resource samples of every benchmarked step in a profile, allowing
+    memory over time to be plotted per step
+
+    Parameters
+    ----------
+    profile_df : pd.DataFrame
+        benchmark profile containing the `samples_file` column
+    benchmark_dir : str | pathlib.Path
+        directory where the sample files are stored
+    keys : Optional[list[str]]
+        profile columns added to the samples. Default is dataset, input_data_name,
+        process_name and variant when found
+
+    Returns
+    -------
+    pd.DataFrame
+        samples of all steps, steps without samples are skipped
+    """
+    if keys is None:
+        keys = [
+            col
+            for col in ["dataset", "input_data_name", "process_name", "variant"]
+            if col in profile_df.columns
+        ]
+    benchmark_dir = pathlib.Path(benchmark_dir)
+
+    sample_dfs = []
+    for record in profile_df.dropna(subset=["samples_file"]).to_dict("records"):
+        samples_df = pd.read_parquet(benchmark_dir / record["samples_file"])
+        for key in reversed(keys):
+            samples_df.insert(0, key, record[key])
+        sample_dfs.append(samples_df)
+
+    if len(sample_dfs) == 0:
+        return pd.DataFrame(columns=keys + SAMPLE_COLUMNS)
+    return pd.concat(sample_dfs, ignore_index=True)
@@ -0,0 +1,292 @@
+"""
+Module: streaming_pipelines.py
+
+Description:
+The `streaming_pipelines.py` module contains streaming versions of the annotate and
+normalize steps of the control pipelines. Instead of loading whole plates, inputs
+are read in parquet record batches with `pyarrow` and outputs are written batch by
+batch, therefore peak memory depends on the batch size rather than the plate size.
+
+Normalization (standardize) requires two passes over the input: the first one
+computes the running mean and variance of each feature, the second one applies
+them. Feature selection requires all rows at once (e.g. correlation between
+features) and is not streamed.
+"""
+
+from functools import partial
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .benchmark_runner import BenchmarkStep, StepContext
+from .control_pipelines import JOIN_ON, SITE_RENAME, feature_select_step, load_platemap
+
+# default number of rows read at a time
+DEFAULT_BATCH_SIZE = 65_536
+
+# compartments used to identify CellProfiler features
+COMPARTMENTS = ["Cells", "Cytoplasm", "Nuclei"]
+
+
+def infer_features(columns: list[str]) -> list[str]:
+    """Identifies the CellProfiler feature columns, following pycytominer's
+    `infer_cp_features` with the default compartments
+
+    Parameters
+    ----------
+    columns : list[str]
+        column names
+
+    Returns
+    -------
+    list[str]
+        feature column names
+    """
+    prefixes = tuple(f"{compartment}_" for compartment in COMPARTMENTS)
+    return [col for col in columns if col.startswith(prefixes)]
+
+
+def infer_metadata(columns: list[str]) -> list[str]:
+    """Identifies the metadata columns, following pycytominer's
+    `infer_cp_features(metadata=True)`
+
+    Parameters
+    ----------
+    columns : list[str]
+        column names
+
+    Returns
+    -------
+    list[str]
+        metadata column names
+    """
+    return [col for col in columns if col.startswith("Metadata_")]
+
+
+def _iter_batches(
+    profiles: str | pa.Table,
+    batch_size: int,
+    columns: Optional[list[str]] = None,
+) -> Iterator[pa.RecordBatch]:
+    """Iterates over the record batches of a parquet file or of a memory-mapped
+    Arrow table"""
+    if isinstance(profiles, pa.Table):
+        table = profiles if columns is None else profiles.select(columns)
+        return iter(table.to_batches(max_chunksize=batch_size))
+    parquet_file = pq.ParquetFile(profiles)
+    return parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+
+
+def _column_names(profiles: str | pa.Table) -> list[str]:
+    """Returns the column names of a parquet file or of an Arrow table"""
+    if isinstance(profiles, pa.Table):
+        return profiles.column_names
+    return pq.ParquetFile(profiles).schema_arrow.names
+
+
+class _BatchWriter:
+    """Writes DataFrames into a parquet file one batch at a time, where all
+    batches follow the schema of the first batch"""
+
+    def __init__(self, output_file: str) -> None:
+        self.output_file = output_file
+        self.writer: Optional[pq.ParquetWriter] = None
+
+    def write(self, batch_df: pd.DataFrame) -> None:
+        if self.writer is None:
+            table = pa.Table.from_pandas(batch_df, preserve_index=False)
+            self.writer = pq.ParquetWriter(self.output_file, table.schema)
+        else:
+            table = pa.Table.from_pandas(
+                batch_df, schema=self.writer.schema, preserve_index=False
+            )
+        self.writer.write_table(table)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+def annotate_streaming_step(
+    context: StepContext,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    rename_site: bool = False,
+) -> str:
+    """Adds platemap metadata into the profiles, one record batch at a time.
+    Follows pycytominer's `annotate`: platemap columns are prefixed with
+    `Metadata_`, merged with an inner join and the `Metadata_` columns are
+    placed first.
+
+    Parameters
+    ----------
+    context : StepContext
+        step information, `profiles` must be a path to a parquet file or a
+        memory-mapped Arrow table and `info` must contain the loaded platemap,
+        see `load_platemap`
+    batch_size : int
+        number of rows processed at a time
+    rename_site : bool
+        rename the site column of each batch after annotating it, as
+        `rename_site_step` does after the control annotate step
+
+    Returns
+    -------
+    str
+        path to the annotated profiles
+    """
+
+    platemap_df = context.info["platemap"].rename(
+        columns=lambda col: col if col.startswith("Metadata_") else f"Metadata_{col}"
+    )
+
+    writer = _BatchWriter(context.output_file)
+    try:
+        for batch in _iter_batches(context.profiles, batch_size):
+            annotated_df = platemap_df.merge(
+                batch.to_pandas(),
+                left_on=JOIN_ON[0],
+                right_on=JOIN_ON[1],
+                how="inner",
+            ).drop(columns=JOIN_ON[0])
+
+            # metadata columns are placed before the other columns
+            metadata = infer_metadata(annotated_df.columns)
+            others = [col for col in annotated_df.columns if col not in metadata]
+            annotated_df = annotated_df[metadata + others]
+            if rename_site:
+                annotated_df = annotated_df.rename(columns=SITE_RENAME)
+            writer.write(annotated_df)
+    finally:
+        writer.close()
+
+    return context.output_file
+
+
+def normalize_streaming_step(
+    context: StepContext, batch_size: int = DEFAULT_BATCH_SIZE
+) -> str:
+    """Standardizes features with two passes over the input. The first pass
+    computes the running mean and population variance of each feature (missing
+    values are ignored), the second pass standardizes each record batch. As in
+    pycytominer's `normalize`, only the `Metadata_` columns and the features are
+    written.
+
+    Samples used to compute the statistics are obtained from
+    `StepContext.info["normalize_samples"]`, default is all samples.
+
+    Parameters
+    ----------
+    context : StepContext
+        step information, `profiles` must be a path to a parquet file or a
+        memory-mapped Arrow table
+    batch_size : int
+        number of rows processed at a time
+
+    Returns
+    -------
+    str
+        path to the normalized profiles
+    """
+
+    columns = _column_names(context.profiles)
+    features = infer_features(columns)
+    samples = context.info.get("normalize_samples", "all")
+
+    # first pass: only the columns required to compute the statistics are read
+    count = np.zeros(len(features))
+    mean = np.zeros(len(features))
+    m2 = np.zeros(len(features))
+    read_cols = features if samples == "all" else columns
+    for batch in _iter_batches(context.profiles, batch_size, columns=read_cols):
+        batch_df = batch.to_pandas()
+        if samples != "all":
+            batch_df = batch_df.query(samples)
+        values = batch_df[features].to_numpy(dtype=np.float64)
+
+        # merging the batch statistics into the running statistics
+        valid = ~np.isnan(values)
+        batch_count = valid.sum(axis=0)
+        batch_sum = np.where(valid, values, 0.0).sum(axis=0)
+        batch_mean = np.divide(
+            batch_sum, batch_count, out=np.zeros_like(batch_sum), where=batch_count > 0
+        )
+        batch_m2 = np.where(valid, (values - batch_mean) ** 2, 0.0).sum(axis=0)
+
+        total = count + batch_count
+        delta = batch_mean - mean
+        ratio = np.divide(
+            batch_count, total, out=np.zeros_like(batch_sum), where=total > 0
+        )
+        mean = mean + delta * ratio
+        m2 = m2 + batch_m2 + delta**2 * count * ratio
+        count = total
+
+    # features without variance are not scaled
+    std = np.sqrt(np.divide(m2, count, out=np.zeros_like(m2), where=count > 0))
+    std[std == 0] = 1.0
+
+    # second pass: standardizing and writing each batch
+    writer = _BatchWriter(context.output_file)
+    try:
+        for batch in _iter_batches(context.profiles, batch_size):
+            batch_df = batch.to_pandas()
+            values = batch_df[features].to_numpy(dtype=np.float64)
+            normalized_df = pd.DataFrame(
+                (values - mean) / std, columns=features, index=batch_df.index
+            )
+            metadata = infer_metadata(batch_df.columns)
+            writer.write(pd.concat([batch_df[metadata], normalized_df], axis=1))
+    finally:
+        writer.close()
+
+    return context.output_file
+
+
+def streaming_single_cell_steps(
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> list[BenchmarkStep]:
+    """Streaming version of the single-cell control pipeline steps, where annotate
+    and normalize are processed in record batches and the site column is renamed
+    within the annotate batches, so no step loads a whole plate before feature
+    selection. Steps are labeled with the "streaming" variant and produce the same
+    columns as the control steps, allowing both versions to be compared with
+    `compare_variants`.
+
+    Parameters
+    ----------
+    batch_size : int
+        number of rows processed at a time
+
+    Returns
+    -------
+    list[BenchmarkStep]
+        annotate -> normalize -> feature_select
+    """
+    return [
+        BenchmarkStep(
+            "annotate",
+            partial(annotate_streaming_step, batch_size=batch_size, rename_site=True),
+            output_suffix="sc_annotated",
+            variant="streaming",
+            requires_files=True,
+            prepare=load_platemap,
+        ),
+        BenchmarkStep(
+            "normalize",
+            partial(normalize_streaming_step, batch_size=batch_size),
+            depends_on="annotate",
+            output_suffix="sc_normalized",
+            variant="streaming",
+            requires_files=True,
+        ),
+        BenchmarkStep(
+            "feature_select",
+            feature_select_step,
+            depends_on="normalize",
+            output_suffix="sc_feature_selected",
+            variant="streaming",
+        ),
+    ]
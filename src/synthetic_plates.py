@@ -0,0 +1,487 @@
+"""
+Module: synthetic_plates.py
+
+Description:
+The `synthetic_plates.py` module generates synthetic single-cell plates with the
+shape of CellProfiler outputs (image metadata followed by Cells, Cytoplasm and
+Nuclei features) as parquet or sqlite files. Plates with controlled numbers of
+cells and features are swept through the pipeline steps with the
+`BenchmarkRunner`, and the time and peak memory of each step are fitted against
+the number of rows and columns, giving the empirical complexity of each step and
+the largest plate that fits within a memory limit.
+"""
+
+import itertools
+import pathlib
+import sqlite3
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .benchmark_runner import BenchmarkRunner, BenchmarkStep
+from .benchmark_store import BenchmarkStore
+
+# compartments of the generated features
+COMPARTMENTS = ["Cells", "Cytoplasm", "Nuclei"]
+
+# feature groups used to name the generated features
+FEATURE_GROUPS = ["AreaShape", "Intensity", "Granularity", "Texture", "Correlation"]
+
+
+def well_names(
+    n_well_rows: Optional[int] = 16, n_well_cols: Optional[int] = 24
+) -> list[str]:
+    """Names of the wells of a plate, e.g. A01 ... P24 for a 384-well plate
+
+    Parameters
+    ----------
+    n_well_rows : Optional[int]
+        number of well rows (letters). Default is 16
+    n_well_cols : Optional[int]
+        number of well columns (numbers). Default is 24
+
+    Returns
+    -------
+    list[str]
+        well names, row major
+    """
+    return [
+        f"{chr(ord('A') + row)}{col + 1:02d}"
+        for row in range(n_well_rows)
+        for col in range(n_well_cols)
+    ]
+
+
+def feature_names(n_features: int) -> list[str]:
+    """CellProfiler-like feature names, distributed evenly across compartments
+
+    Parameters
+    ----------
+    n_features : int
+        number of features
+
+    Returns
+    -------
+    list[str]
+        feature names, e.g. `Cells_Intensity_Feature0001`
+    """
+    return [
+        f"{COMPARTMENTS[idx % len(COMPARTMENTS)]}_"
+        f"{FEATURE_GROUPS[(idx // len(COMPARTMENTS)) % len(FEATURE_GROUPS)]}_"
+        f"Feature{idx:04d}"
+        for idx in range(n_features)
+    ]
+
+
+def _feature_batch(
+    rng: np.random.Generator, n_cells: int, loadings: np.ndarray
+) -> np.ndarray:
+    """Generates features from latent factors, therefore features are correlated
+    as CellProfiler features are. The last feature has almost no variance."""
+    n_factors = loadings.shape[0]
+    values = rng.standard_normal((n_cells, n_factors)) @ loadings
+    values += rng.standard_normal(values.shape) * 0.5
+    values[:, -1] = 1.0 + rng.standard_normal(n_cells) * 1e-6
+    return values
+
+
+def generate_plate(
+    output_path: str | pathlib.Path,
+    n_cells: int,
+    n_features: int,
+    n_well_rows: Optional[int] = 16,
+    n_well_cols: Optional[int] = 24,
+    n_sites: Optional[int] = 9,
+    output_type: Optional[str] = "parquet",
+    batch_size: Optional[int] = 100_000,
+    seed: Optional[int] = 0,
+) -> pathlib.Path:
+    """Generates a synthetic single-cell plate. Cells are generated in batches,
+    therefore plates larger than the available memory can be generated.
+
+    Parquet plates contain one row per cell with the `Image_Metadata_Plate`,
+    `Image_Metadata_Well` and `Image_Metadata_Site` columns followed by the
+    features, as the single-cell profiles used in the control pipelines. Sqlite
+    plates follow the CellProfiler layout, an `Image` table and one table per
+    compartment linked by `TableNumber`, `ImageNumber` and `ObjectNumber`.
+
+    Parameters
+    ----------
+    output_path : str | pathlib.Path
+        path of the generated plate, its stem is used as the plate name
+    n_cells : int
+        number of cells (rows)
+    n_features : int
+        number of features (columns besides the metadata)
+    n_well_rows : Optional[int]
+        number of well rows. Default is 16 (384-well plate)
+    n_well_cols : Optional[int]
+        number of well columns. Default is 24 (384-well plate)
+    n_sites : Optional[int]
+        number of imaged sites per well. Default is 9
+    output_type : Optional[str]
+        "parquet" or "sqlite". Default is "parquet"
+    batch_size : Optional[int]
+        number of cells generated at a time
+    seed : Optional[int]
+        seed of the random generator
+
+    Returns
+    -------
+    pathlib.Path
+        path to the generated plate
+
+    Raises
+    ------
+    ValueError
+        Raised if the output type is not supported or less than two features are
+        requested
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if output_type not in ["parquet", "sqlite"]:
+        raise ValueError(
+            f"'output_type' must be 'parquet' or 'sqlite'. Provided: {output_type}"
+        )
+    if n_features < 2:
+        raise ValueError(f"'n_features' must be at least 2. Provided: {n_features}")
+
+    output_path = pathlib.Path(output_path).resolve()
+    output_path.unlink(missing_ok=True)
+    plate = output_path.stem
+    rng = np.random.default_rng(seed)
+
+    # images are the (well, site) combinations, cells are assigned round robin
+    wells = well_names(n_well_rows, n_well_cols)
+    image_wells = np.repeat(wells, n_sites)
+    image_sites = np.tile(np.arange(1, n_sites + 1), len(wells))
+    features = feature_names(n_features)
+    loadings = rng.standard_normal((max(n_features // 10, 1), n_features))
+
+    writer = None
+    conn = sqlite3.connect(output_path) if output_type == "sqlite" else None
+    try:
+        if conn is not None:
+            pd.DataFrame(
+                {
+                    "TableNumber": 1,
+                    "ImageNumber": np.arange(1, len(image_wells) + 1),
+                    "Image_Metadata_Plate": plate,
+                    "Image_Metadata_Well": image_wells,
+                    "Image_Metadata_Site": image_sites,
+                }
+            ).to_sql("Image", conn, index=False)
+
+        for start in range(0, n_cells, batch_size):
+            n_batch = min(batch_size, n_cells - start)
+            cell_ids = np.arange(start, start + n_batch)
+            image_idx = cell_ids % len(image_wells)
+            values = _feature_batch(rng, n_batch, loadings)
+
+            if conn is not None:
+                ids = {
+                    "TableNumber": 1,
+                    "ImageNumber": image_idx + 1,
+                    "ObjectNumber": cell_ids // len(image_wells) + 1,
+                }
+                for compartment in COMPARTMENTS:
+                    cols = [
+                        idx
+                        for idx, name in enumerate(features)
+                        if name.startswith(f"{compartment}_")
+                    ]
+                    compartment_df = pd.DataFrame(
+                        values[:, cols], columns=[features[idx] for idx in cols]
+                    )
+                    for name, ids_values in reversed(ids.items()):
+                        compartment_df.insert(0, name, ids_values)
+                    compartment_df.to_sql(
+                        compartment, conn, index=False, if_exists="append"
+                    )
+                continue
+
+            batch_df = pd.DataFrame(values, columns=features)
+            batch_df.insert(0, "Image_Metadata_Site", image_sites[image_idx])
+            batch_df.insert(0, "Image_Metadata_Well", image_wells[image_idx])
+            batch_df.insert(0, "Image_Metadata_Plate", plate)
+            table = pa.Table.from_pandas(batch_df, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+        if conn is not None:
+            conn.commit()
+            conn.close()
+
+    return output_path
+
+
+def generate_platemap(
+    output_path: str | pathlib.Path,
+    n_well_rows: Optional[int] = 16,
+    n_well_cols: Optional[int] = 24,
+    n_treatments: Optional[int] = 4,
+) -> pathlib.Path:
+    """Generates the platemap of a synthetic plate, where treatments are assigned
+    to the wells in turn
+
+    Parameters
+    ----------
+    output_path : str | pathlib.Path
+        path of the generated csv file
+    n_well_rows : Optional[int]
+        number of well rows. Default is 16
+    n_well_cols : Optional[int]
+        number of well columns. Default is 24
+    n_treatments : Optional[int]
+        number of treatments. Default is 4
+
+    Returns
+    -------
+    pathlib.Path
+        path to the platemap
+    """
+    output_path = pathlib.Path(output_path).resolve()
+    wells = well_names(n_well_rows, n_well_cols)
+    pd.DataFrame(
+        {
+            "well_position": wells,
+            "treatment": [
+                f"treatment_{idx % n_treatments}" for idx in range(len(wells))
+            ],
+        }
+    ).to_csv(output_path, index=False)
+    return output_path
+
+
+def run_scaling_suite(
+    steps: list[BenchmarkStep],
+    n_cells: list[int],
+    n_features: list[int],
+    data_dir: str | pathlib.Path,
+    benchmark_dir: str | pathlib.Path,
+    dataset: Optional[str] = "synthetic",
+    store: Optional[BenchmarkStore] = None,
+    seed: Optional[int] = 0,
+    output_type: Optional[str] = "parquet",
+    n_well_rows: Optional[int] = 16,
+    n_well_cols: Optional[int] = 24,
+    n_sites: Optional[int] = 9,
+    **runner_kwargs,
+) -> pd.DataFrame:
+    """Generates a synthetic plate for every combination of cells and features
+    and benchmarks the steps on each plate
+
+    Parameters
+    ----------
+    steps : list[BenchmarkStep]
+        benchmarked steps, e.g. `nf1_single_cell_steps()`
+    n_cells : list[int]
+        numbers of cells (rows) of the generated plates
+    n_features : list[int]
+        numbers of features of the generated plates
+    data_dir : str | pathlib.Path
+        directory where plates, platemap and step outputs are written
+    benchmark_dir : str | pathlib.Path
+        directory where the memray captures are written
+    dataset : Optional[str]
+        dataset name of the benchmark profile. Default is "synthetic"
+    store : Optional[BenchmarkStore]
+        if provided, the benchmark profile is appended into the store
+    seed : Optional[int]
+        seed used to generate the plates
+    output_type : Optional[str]
+        "parquet" or "sqlite" plates, e.g. sqlite plates for the conversion
+        steps. Default is "parquet"
+    n_well_rows : Optional[int]
+        number of well rows of the plates and platemap. Default is 16
+    n_well_cols : Optional[int]
+        number of well columns of the plates and platemap. Default is 24
+    n_sites : Optional[int]
+        number of imaged sites per well. Default is 9
+    **runner_kwargs
+        additional `BenchmarkRunner` arguments, e.g. `repetitions`
+
+    Returns
+    -------
+    pd.DataFrame
+        benchmark profile of all plates, containing the n_rows and n_columns of
+        each plate
+    """
+
+    data_dir = pathlib.Path(data_dir).resolve()
+    plate_dir = data_dir / "plates"
+    plate_dir.mkdir(parents=True, exist_ok=True)
+    platemap_path = generate_platemap(
+        data_dir / "synthetic_platemap.csv", n_well_rows, n_well_cols
+    )
+
+    plate_info = {}
+    for cells, features in itertools.product(n_cells, n_features):
+        plate = f"synthetic_c{cells}_f{features}"
+        plate_path = generate_plate(
+            plate_dir / f"{plate}.{output_type}",
+            cells,
+            features,
+            n_well_rows=n_well_rows,
+            n_well_cols=n_well_cols,
+            n_sites=n_sites,
+            output_type=output_type,
+            seed=seed,
+        )
+        plate_info[plate] = {
+            "profile_path": str(plate_path),
+            "platemap_path": str(platemap_path),
+        }
+
+    runner = BenchmarkRunner(
+        steps,
+        dataset=dataset,
+        output_dir=data_dir / "outputs",
+        benchmark_dir=benchmark_dir,
+        **runner_kwargs,
+    )
+    return runner.run(plate_info, store=store)
+
+
+def fit_scaling(
+    profile_df: pd.DataFrame,
+    metrics: Optional[list[str]] = None,
+) -> pd.DataFrame:
+    """Fits a power law `metric = coefficient * n_rows^a * n_columns^b` for each
+    step with least squares in log scale. The exponents are the empirical
+    complexity of the step, e.g. `rows_exponent` close to 1 means the step is
+    linear in the number of cells.
+
+    Parameters
+    ----------
+    profile_df : pd.DataFrame
+        benchmark profile containing the process_name, n_rows and n_columns
+        columns
+    metrics : Optional[list[str]]
+        fitted metrics. Default is time_duration and peak_memory
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per step and metric with the coefficient, rows_exponent,
+        columns_exponent, r_squared and number of points used. Steps without
+        enough distinct plate shapes have missing exponents
+    """
+
+    metrics = ["time_duration", "peak_memory"] if metrics is None else metrics
+    records = []
+    for (process_name, metric), group in (
+        profile_df.melt(
+            id_vars=["process_name", "n_rows", "n_columns"],
+            value_vars=metrics,
+            var_name="metric",
+        )
+        .dropna()
+        .query("value > 0")
+        .groupby(["process_name", "metric"])
+    ):
+        record = {
+            "process_name": process_name,
+            "metric": metric,
+            "coefficient": np.nan,
+            "rows_exponent": np.nan,
+            "columns_exponent": np.nan,
+            "r_squared": np.nan,
+            "n_points": len(group),
+        }
+
+        # each varying dimension is fitted, constant dimensions are skipped
+        log_rows = np.log(group["n_rows"].to_numpy(dtype=np.float64))
+        log_cols = np.log(group["n_columns"].to_numpy(dtype=np.float64))
+        log_values = np.log(group["value"].to_numpy(dtype=np.float64))
+        dims = [
+            (name, values)
+            for name, values in [("rows", log_rows), ("columns", log_cols)]
+            if np.unique(values).size > 1
+        ]
+        if len(dims) == 0 or len(group) <= len(dims) + 1:
+            records.append(record)
+            continue
+
+        design = np.column_stack([np.ones(len(group))] + [values for _, values in dims])
+        params, *_ = np.linalg.lstsq(design, log_values, rcond=None)
+        residuals = log_values - design @ params
+        total = np.sum((log_values - log_values.mean()) ** 2)
+
+        record["coefficient"] = float(np.exp(params[0]))
+        for (name, _), exponent in zip(dims, params[1:]):
+            record[f"{name}_exponent"] = float(exponent)
+        record["r_squared"] = (
+            float(1 - np.sum(residuals**2) / total) if total > 0 else np.nan
+        )
+        records.append(record)
+
+    return pd.DataFrame(records)
+
+
+def predict_scaling(
+    fit_df: pd.DataFrame, n_rows: float, n_columns: float
+) -> pd.DataFrame:
+    """Predicts the metrics of each step for a plate shape from `fit_scaling`
+
+    Parameters
+    ----------
+    fit_df : pd.DataFrame
+        fitted power laws
+    n_rows : float
+        number of rows (cells) of the plate
+    n_columns : float
+        number of columns of the plate
+
+    Returns
+    -------
+    pd.DataFrame
+        process_name, metric and predicted value
+    """
+    rows_exponent = fit_df["rows_exponent"].fillna(0)
+    columns_exponent = fit_df["columns_exponent"].fillna(0)
+    return fit_df[["process_name", "metric"]].assign(
+        predicted=fit_df["coefficient"]
+        * n_rows**rows_exponent
+        * n_columns**columns_exponent
+    )
+
+
+def max_rows_within(
+    fit_df: pd.DataFrame, memory_limit: float, n_columns: float
+) -> pd.DataFrame:
+    """Computes the largest number of cells that each step can process within a
+    memory limit (e.g. the RAM of a node) from the fitted peak memory
+
+    Parameters
+    ----------
+    fit_df : pd.DataFrame
+        fitted power laws, see `fit_scaling`
+    memory_limit : float
+        memory limit in MB
+    n_columns : float
+        number of columns of the plate
+
+    Returns
+    -------
+    pd.DataFrame
+        process_name and max_rows. Steps whose memory does not grow with the rows
+        have missing values
+    """
+    memory_df = fit_df.loc[fit_df["metric"] == "peak_memory"]
+    columns_exponent = memory_df["columns_exponent"].fillna(0)
+    rows_exponent = memory_df["rows_exponent"].where(memory_df["rows_exponent"] > 0)
+    max_rows = (
+        memory_limit / (memory_df["coefficient"] * n_columns**columns_exponent)
+    ) ** (1 / rows_exponent)
+    return pd.DataFrame(
+        {
+            "process_name": memory_df["process_name"].to_numpy(),
+            "max_rows": max_rows.to_numpy(),
+        }
+    )
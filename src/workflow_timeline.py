@@ -0,0 +1,278 @@
+"""
+Module: workflow_timeline.py
+
+Description:
+The `workflow_timeline.py` module rebuilds the execution timeline of a workflow
+run from the start and end timestamps of each benchmarked step. The timeline is
+used to compute the critical path of the run, the concurrency of each step, the
+idle gaps where no step was running and the overall parallel efficiency, showing
+whether the wall time of a run is limited by the steps themselves or by how they
+were scheduled.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .benchmark_store import normalize_columns
+
+
+def build_timeline(profile_df: pd.DataFrame) -> pd.DataFrame:
+    """Creates the timeline of a workflow run, one row per executed step
+
+    Parameters
+    ----------
+    profile_df : pd.DataFrame
+        benchmark profile containing the process_name, input_data_name,
+        start_time and end_time columns
+
+    Returns
+    -------
+    pd.DataFrame
+        steps sorted by start time with the `start` and `end` offsets (secs) from
+        the start of the run and their `duration` (secs)
+    """
+    timeline_df = normalize_columns(profile_df).dropna(
+        subset=["start_time", "end_time"]
+    )
+    timeline_df = timeline_df.assign(
+        start_time=pd.to_datetime(timeline_df["start_time"]),
+        end_time=pd.to_datetime(timeline_df["end_time"]),
+    ).sort_values("start_time", ignore_index=True)
+
+    run_start = timeline_df["start_time"].min()
+    timeline_df["start"] = (timeline_df["start_time"] - run_start).dt.total_seconds()
+    timeline_df["end"] = (timeline_df["end_time"] - run_start).dt.total_seconds()
+    timeline_df["duration"] = timeline_df["end"] - timeline_df["start"]
+    return timeline_df
+
+
+def concurrency_profile(timeline_df: pd.DataFrame) -> pd.DataFrame:
+    """Computes the number of steps running over time
+
+    Parameters
+    ----------
+    timeline_df : pd.DataFrame
+        workflow timeline, see `build_timeline`
+
+    Returns
+    -------
+    pd.DataFrame
+        consecutive intervals (`start`, `end` in secs) and the number of steps
+        running within each interval (`n_running`)
+    """
+
+    # steps that end at the same time another one starts are not overlapping
+    times = np.concatenate([timeline_df["start"], timeline_df["end"]])
+    changes = np.concatenate([np.ones(len(timeline_df)), -np.ones(len(timeline_df))])
+    order = np.lexsort((changes, times))
+    times, n_running = times[order], np.cumsum(changes[order])
+
+    # keeping the last change at each time point
+    last = np.append(times[1:] != times[:-1], True)
+    times, n_running = times[last], n_running[last]
+
+    return pd.DataFrame(
+        {"start": times[:-1], "end": times[1:], "n_running": n_running[:-1]}
+    ).astype({"n_running": int})
+
+
+def idle_gaps(
+    timeline_df: pd.DataFrame, min_duration: Optional[float] = 0.0
+) -> pd.DataFrame:
+    """Finds the intervals of a run where no step was running
+
+    Parameters
+    ----------
+    timeline_df : pd.DataFrame
+        workflow timeline, see `build_timeline`
+    min_duration : Optional[float]
+        shortest gap (secs) that is reported. Default reports all gaps
+
+    Returns
+    -------
+    pd.DataFrame
+        start, end and duration (secs) of each idle gap
+    """
+    profile_df = concurrency_profile(timeline_df)
+    gaps_df = profile_df.loc[profile_df["n_running"] == 0, ["start", "end"]]
+    gaps_df = gaps_df.assign(duration=gaps_df["end"] - gaps_df["start"])
+    return gaps_df.loc[gaps_df["duration"] > min_duration].reset_index(drop=True)
+
+
+def step_concurrency(timeline_df: pd.DataFrame) -> pd.DataFrame:
+    """Summarizes how the executions of each step overlapped
+
+    Parameters
+    ----------
+    timeline_df : pd.DataFrame
+        workflow timeline, see `build_timeline`
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per step with the number of executions, the span (secs) from the
+        first start to the last end, the busy time (sum of durations), the
+        maximum number of concurrent executions and the mean concurrency (busy
+        time divided by the span)
+    """
+    records = []
+    for process_name, step_df in timeline_df.groupby("process_name", sort=False):
+        span = step_df["end"].max() - step_df["start"].min()
+        busy_time = step_df["duration"].sum()
+        records.append(
+            {
+                "process_name": process_name,
+                "n_executions": len(step_df),
+                "span": span,
+                "busy_time": busy_time,
+                "max_concurrency": concurrency_profile(step_df)["n_running"].max(),
+                "mean_concurrency": busy_time / span if span > 0 else np.nan,
+            }
+        )
+    return pd.DataFrame(records)
+
+
+def _predecessors(
+    timeline_df: pd.DataFrame, step_order: list[str]
+) -> dict[int, list[int]]:
+    """Finds the steps each step depends on: the previous step of the same input,
+    or every execution of the previous step for steps that combine all inputs"""
+    positions = {name: idx for idx, name in enumerate(step_order)}
+    predecessors = {}
+    for idx, row in timeline_df.iterrows():
+        position = positions.get(row["process_name"])
+        if position is None or position == 0:
+            predecessors[idx] = []
+            continue
+
+        previous_df = timeline_df.loc[
+            timeline_df["process_name"] == step_order[position - 1]
+        ]
+        same_input = previous_df.loc[
+            previous_df["input_data_name"] == row["input_data_name"]
+        ]
+        predecessors[idx] = list(
+            (same_input if len(same_input) > 0 else previous_df).index
+        )
+    return predecessors
+
+
+def critical_path(
+    timeline_df: pd.DataFrame, step_order: Optional[list[str]] = None
+) -> pd.DataFrame:
+    """Computes the critical path of a run, the chain of dependent steps that ends
+    with the last step to finish. Each step on the path is preceded by the
+    dependency that finished last, the time between both is the step's wait.
+
+    Parameters
+    ----------
+    timeline_df : pd.DataFrame
+        workflow timeline, see `build_timeline`
+    step_order : Optional[list[str]]
+        steps in dependency order, e.g. ["aggregate_cells", "annotate",
+        "normalize", "feature_select", "consensus"]. Default orders the steps by
+        their median start time
+
+    Returns
+    -------
+    pd.DataFrame
+        steps on the critical path in execution order with their `wait` (secs)
+        since their dependency finished, the first step waits from the start of
+        the run
+    """
+    if step_order is None:
+        step_order = list(
+            timeline_df.groupby("process_name")["start"].median().sort_values().index
+        )
+    predecessors = _predecessors(timeline_df, step_order)
+
+    # walking back from the last step to finish
+    path = [timeline_df["end"].idxmax()]
+    while len(predecessors[path[-1]]) > 0:
+        path.append(timeline_df.loc[predecessors[path[-1]], "end"].idxmax())
+    path_df = timeline_df.loc[path[::-1]]
+
+    previous_end = np.concatenate([[0.0], path_df["end"].to_numpy()[:-1]])
+    return path_df.assign(wait=path_df["start"].to_numpy() - previous_end)
+
+
+def summarize_timeline(
+    timeline_df: pd.DataFrame, step_order: Optional[list[str]] = None
+) -> dict:
+    """Summarizes the parallel efficiency of a run
+
+    Parameters
+    ----------
+    timeline_df : pd.DataFrame
+        workflow timeline, see `build_timeline`
+    step_order : Optional[list[str]]
+        steps in dependency order, see `critical_path`
+
+    Returns
+    -------
+    dict
+        makespan (secs), busy_time (sum of all durations), max_concurrency,
+        parallel_efficiency (busy time over makespan times max concurrency),
+        idle_time (no step running), the work and wait of the critical path,
+        and `sum_of_step_max`, the runtime estimated by adding the longest
+        execution of each step
+    """
+    makespan = timeline_df["end"].max() - timeline_df["start"].min()
+    busy_time = timeline_df["duration"].sum()
+    max_concurrency = int(concurrency_profile(timeline_df)["n_running"].max())
+    path_df = critical_path(timeline_df, step_order)
+
+    return {
+        "makespan": float(makespan),
+        "busy_time": float(busy_time),
+        "max_concurrency": max_concurrency,
+        "parallel_efficiency": float(busy_time / (makespan * max_concurrency)),
+        "idle_time": float(idle_gaps(timeline_df)["duration"].sum()),
+        "critical_path_work": float(path_df["duration"].sum()),
+        "critical_path_wait": float(path_df["wait"].sum()),
+        "sum_of_step_max": float(
+            timeline_df.groupby("process_name")["duration"].max().sum()
+        ),
+    }
+
+
+def plot_gantt(timeline_df: pd.DataFrame, step_order: Optional[list[str]] = None):
+    """Creates a Gantt chart of a run with one row per input, where steps on the
+    critical path are outlined
+
+    Parameters
+    ----------
+    timeline_df : pd.DataFrame
+        workflow timeline, see `build_timeline`
+    step_order : Optional[list[str]]
+        steps in dependency order, see `critical_path`
+
+    Returns
+    -------
+    plotly.graph_objects.Figure
+        Gantt chart
+    """
+    import plotly.express as px
+
+    path_index = critical_path(timeline_df, step_order).index
+    gantt_df = timeline_df.assign(critical_path=timeline_df.index.isin(path_index))
+    fig = px.timeline(
+        gantt_df,
+        x_start="start_time",
+        x_end="end_time",
+        y="input_data_name",
+        color="process_name",
+        hover_data=["duration", "critical_path"],
+    )
+    fig.update_traces(marker_line_color="black")
+    for trace in fig.data:
+        trace.marker.line.width = [
+            2 if critical else 0
+            for critical in gantt_df.loc[
+                gantt_df["process_name"] == trace.name, "critical_path"
+            ]
+        ]
+    fig.update_yaxes(autorange="reversed")
+    return fig